@@ -1,4 +1,5 @@
 import streamlit as st
+import src.precompute  # starts the background precomputation of the server
 
 st.set_page_config(
     layout="wide",
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""
+Import-time benchmark of the pages: the import header of each page (imports and lazy_import
+assignments) is run in fresh interpreters, as imported (lazy) and with every lazy module
+loaded (eager, as the pages were before the lazy imports)
+
+usage (from the repository root): python benchmarks/import_time.py [repeats]
+"""
+
+import ast
+import glob
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ['pandas', 'scipy', 'matplotlib', 'music21', 'streamlit_pdf_viewer']
+
+# run in a fresh interpreter: argv = page path, mode ('lazy' or 'eager')
+CHILD = """
+import ast, importlib, sys, time, warnings
+warnings.simplefilter('ignore')
+path, mode = sys.argv[1], sys.argv[2]
+tree = ast.parse(open(path, encoding='utf-8').read())
+header = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))
+          or (isinstance(node, ast.Assign) and isinstance(node.value, ast.Call)
+              and getattr(node.value.func, 'id', None) == 'lazy_import')]
+code = compile(ast.Module(body=header, type_ignores=[]), path, 'exec')
+start = time.perf_counter()
+namespace = {}
+exec(code, namespace)
+if mode == 'eager':
+    from src import LazyModule, loaded
+    for value in list(namespace.values()):
+        if isinstance(value, LazyModule):
+            loaded(value)
+elapsed = time.perf_counter() - start
+heavy = [m for m in %r if m in sys.modules]
+print(elapsed, ','.join(heavy))
+""" % HEAVY
+
+
+def measure(path: str, mode: str)->tuple[float, str]:
+    """Import time of the header of a page in a fresh interpreter
+
+    Args:
+        - path: path of the page
+        - mode: 'lazy' or 'eager'
+
+    Returns:
+        (seconds, heavy modules loaded)
+    """
+    output = subprocess.run([sys.executable, '-c', CHILD, path, mode], cwd=ROOT, capture_output=True,
+                            text=True, env=dict(os.environ, PYTHONPATH=ROOT), check=True).stdout
+    elapsed, _, heavy = output.strip().splitlines()[-1].partition(' ')
+    return float(elapsed), heavy
+
+
+def main(repeats: int=5):
+    """Prints the median import times of the pages
+
+    Args:
+        - repeats: number of fresh interpreters by page and mode. Defaults to 5
+    """
+    print(f"{'page':<40}{'eager (s)':>10}{'lazy (s)':>10}{'gain':>7}  heavy modules loaded (lazy)")
+    for path in sorted(glob.glob(f"{ROOT}/pages/*.py")):
+        times = {}
+        for mode in ('eager', 'lazy'):
+            runs = [measure(path, mode) for _ in range(repeats)]
+            times[mode] = statistics.median(r[0] for r in runs)
+            heavy = runs[-1][1]
+        name = os.path.basename(path)[:38]
+        print(f"{name:<40}{times['eager']:>10.3f}{times['lazy']:>10.3f}"
+              f"{1 - times['lazy'] / times['eager']:>7.0%}  {heavy or '-'}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -4,13 +4,20 @@ This module defines the streamlit application measures page
 """
 
 import streamlit as st
-from streamlit_pdf_viewer import pdf_viewer
-import pandas as pd
-from matplotlib import pyplot as plt
+from src import lazy_import, rolling, bars, score_pages
 from src.durations_analyse_tools import *
 from src.data import *
 from src.stats import *
-from src.streamlit_displays import display_tab
+from src.bootstrap import results_to_stats_with_ci
+from src.shared_cache import shared_result, result_key
+from src.page_state import PageState
+from src.precompute import SCHEDULER, next_selections
+from src.streamlit_displays import display_tab, data_table, rolling_plot_image
+
+# heavy imports, run on the code paths using them
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
+streamlit_pdf_viewer = lazy_import('streamlit_pdf_viewer')
 
 
 #############################
@@ -27,15 +34,27 @@ def config_page():
 # score
 #############################
 
-def display_score(fantasia: int):
-    """Display score pdf
+def display_score(fantasia: int, start: int, end: int):
+    """Display the systems of the score covering the selected measures (pre-rendered pages,
+    see score_pages), the whole score pdf if asked or if the pages are not rendered
     
     Args:
         - fantasia: fantasia number
+        - start: starting measure
+        - end: ending measure
     """
     
     with st.container():
-        pdf_viewer(f"{PDFS}/Fantasia{fantasia}.pdf")
+        images = None
+        if not st.toggle("whole score", key="whole_score"):
+            images = score_pages.selection_images(fantasia, start, end)
+        if images == None:
+            if not st.session_state.get("whole_score"):
+                st.info("Score pages not rendered (offline step: python -m src.score_pages), whole score displayed")
+            streamlit_pdf_viewer.pdf_viewer(f"{PDFS}/Fantasia{fantasia}.pdf")
+        else:
+            for image in images:
+                st.image(image, use_container_width=True)
 
 #############################
 # videos
@@ -64,6 +83,103 @@ def get_video_boundaries(fantasia_data: list[dict],
     video_end = float(fantasia_data[i]["onset"])/1000 +1
     return video_start, video_end
 
+
+def video_excerpt(performer: str, fantasia: int,
+                  start: int, end: int, repeated: int)->tuple[str, float, float]:
+    """Returns the video of a performance and the time boundaries of selected excerpt
+
+    Args:
+        - performer: name of the performer
+        - fantasia: fantasia number
+        - start: start bar 
+        - end: end bar
+        - repeated: bar occurence
+
+    Returns:
+        youtube url, start and end times in seconds
+    """
+    video_start, video_end = get_video_boundaries(get_all_data(performer, fantasia), start, end, repeated)
+    return f"https://www.youtube.com/watch?v={YT_ID[performer][fantasia]}", video_start, video_end
+
+#############################
+# results
+#############################
+
+def measures_results(performer: str, fantasia: int, metric: str,
+                     start: int, end: int, repeated: int)->dict:
+    """Metric values, categories and statistics of selected measures of a performance
+
+    Args:
+        - performer: name of the performer
+        - fantasia: fantasia number
+        - metric: deltaioi or deltaonset
+        - start: starting measure
+        - end: ending measure
+        - repeated: repeat number
+
+    Returns:
+        {'metric': metric values, 'data': data elements, 'results': timings,
+         'statistics': results_to_stats_with_ci of the performer,
+         'medians': (all notes, upper voice, lower voice) paper notations}
+    """
+    fantasia_data_measure = get_all_data(performer, fantasia)
+    data_measures = [m for m in fantasia_data_measure 
+                    if (m['measure']!= 'x' 
+                        and int(m['measure'])>=start 
+                        and int(m['measure'])<=end)
+                        and (int(m['repeated']))==repeated] 
+
+    data_all, monsets_all, real_onsets_all, metric_all =[], [], [], []
+    for m in range(start, end+1):
+        datafiltered= [d for d in data_measures if int(d['measure'])== m]
+        data_all.extend(datafiltered)
+        #real iois based on the onset in ms
+        iois=[float(m['ioi']) for m in datafiltered]
+        #get predicted metronomic time durations for all notes
+        metronomic_ioi= get_metronomic_ioi(datafiltered)
+        real_onsets = [float(m['onset']) for m in datafiltered]
+        real_onsets_all.extend(real_onsets)
+
+        metronomic_onsets = []
+        acc=real_onsets[0]
+        metronomic_onsets.append(acc)
+        for i in range(1, len(real_onsets)):
+            acc += metronomic_ioi[i-1]
+            metronomic_onsets.append(acc)
+        monsets_all.extend(metronomic_onsets)
+
+        if metric == "deltaioi":
+            metric_all.extend(get_delta_ioi_per_measure(iois, metronomic_ioi))
+        elif metric == "deltaonset":
+            metric_all.extend(get_delta_onset_per_measure(real_onsets, metronomic_onsets, iois))
+
+    performers_results=timings(metric, performer, metric_all, data_all)
+    # statistics computed once, with their confidence intervals
+    statistics = results_to_stats_with_ci(performers_results)[performer]
+    ### paper notations
+    medians = statistics['all'][1], statistics['u'][1], statistics['B+b'][1]
+    return {'metric': metric_all, 'data': data_all, 'results': performers_results,
+            'statistics': statistics, 'medians': medians}
+
+
+def prefetch_measures(performer: str, fantasia: int, metric: str,
+                      start: int, end: int, repeated: int):
+    """Queues the likely next selections in background: the same measures for the other metric
+    and the next performer (see measures_results)
+
+    Args:
+        - performer: name of the selected performer
+        - fantasia: selected fantasia number
+        - metric: selected metric
+        - start: starting measure
+        - end: ending measure
+        - repeated: repeat number
+    """
+    for p, m in next_selections(performer, metric):
+        SCHEDULER.submit(result_key('measures', p, m, fantasia=fantasia, measures=(start, end, repeated)),
+                         measures_results, p, fantasia, m, start, end, repeated)
+
+
 #############################
 # plots
 #############################
@@ -129,42 +245,75 @@ def display_plot(data: list , metric_data: list ,
 
 def  by_measures():
     st.header("Analyse on selected measures by performer")
-    tab_m1, tab_m2 = st.tabs(["Selected measures", "Results"])
+    tab_m1, tab_m2, tab_m3 = st.tabs(["Selected measures", "Results", "Rolling statistics"])
     with tab_m1:
         # columns layout    
         col1, col2 = st.columns(2, gap="large")
         col1.subheader("inputs")
         col2.subheader("score")
         
-        def pill_callback():
-            for key in st.session_state.keys():
-                del st.session_state[key]
+        # results invalidated only when one of their inputs changes
+        state = PageState('measures',
+                          {'results': ('performer', 'fantasia', 'metric', 'start', 'end', 'repeated'),
+                           'table': ('results',),
+                           'video': ('performer', 'fantasia', 'start', 'end', 'repeated'),
+                           'rolling': ('metric', 'fantasia', 'window'),
+                           'rolling_plot': ('rolling',)},
+                          st.session_state)
+        measures_keys = ['start', 'end', 'repeated']
+
+        def jump_callback(measure: int, repeat: int):
+            for key, value in zip(measures_keys, [measure, measure, repeat]):
+                st.session_state[state.key(key)] = value
+                state.invalidate(key)
+
+        # default measures inputs (set through session state as the jump list)
+        for key, value in zip(measures_keys, [1, 2, 0]):
+            if state.key(key) not in st.session_state:
+                st.session_state[state.key(key)] = value
                 
         with col1:
             fantasia = st.number_input("choose a fantasia", min_value=1, max_value=12, step=1, 
-                                    on_change=pill_callback)
+                                    key=state.key('fantasia'),
+                                    on_change=state.invalidate, args=('fantasia',))
             
             start = st.number_input("choose a starting measure", min_value=1, step=1, 
-                                    on_change=pill_callback)
+                                    key=state.key('start'),
+                                    on_change=state.invalidate, args=('start',))
             
             end = st.number_input("choose an ending measure", 
-                                min_value=1, step=1, value=2, 
-                                on_change=pill_callback)
+                                min_value=1, step=1, 
+                                key=state.key('end'),
+                                on_change=state.invalidate, args=('end',))
             
             repeated = st.number_input("choose a repeat if exists (0 if not)", 
-                                min_value=0, max_value=3, step=1, value=0, 
-                                on_change=pill_callback)
+                                min_value=0, max_value=3, step=1, 
+                                key=state.key('repeated'),
+                                on_change=state.invalidate, args=('repeated',))
             
             performer= st.pills("choose a performer", 
                                 [p for p in PERFORMERS], default="kuijken", 
-                                on_change=pill_callback)
+                                key=state.key('performer'),
+                                on_change=state.invalidate, args=('performer',))
             
             metric= st.pills("choose a metric", ['deltaonset', 'deltaioi'], 
                             default='deltaonset', 
-                            on_change=pill_callback)
+                            key=state.key('metric'),
+                            on_change=state.invalidate, args=('metric',))
+
+            # bars of the selected performer only (no list while a pill is deselected)
+            if performer != None and metric != None:
+                with st.expander(f"Jump to the bars with the largest mean |{metric}|"):
+                    top = bars.top_bars(bars.bar_table(), f"{metric} mean abs", k=10,
+                                        performer=performer, fantasia=fantasia)
+                    for movement, measure, repeat, value in zip(top['movement'], top['measure'],
+                                                                top['repeated'], top[f"{metric} mean abs"]):
+                        st.button(f"measure {measure} (repeat {repeat}): {value:.4f}",
+                                  key=f"jump_{performer}_{fantasia}_{movement}_{measure}_{repeat}",
+                                  on_click=jump_callback, args=(int(measure), int(repeat)))
 
         with col2:
-            display_score(fantasia)
+            display_score(fantasia, start, end)
                 
     with tab_m2:
         # columns layout    
@@ -172,77 +321,49 @@ def  by_measures():
         col3.subheader("video")
         col4.subheader("plots")
  
-        if 'performers_metric_measure_results' not in st.session_state:
-            fantasia_data_measure = get_all_data(performer, fantasia)
-            try:
-                video_start, video_end = get_video_boundaries(fantasia_data_measure, start, end, repeated)
-                video_url = f"https://www.youtube.com/watch?v={YT_ID[performer][fantasia]}"
-
-                with col3:
-                    st.video(video_url, start_time=video_start, end_time=video_end)
-                    st.warning(f"if embeded video doesn't load, watch directly on youtube __start time: {round(video_start)}s, end: {round(video_end)}s__")
-
-                data_measures = [m for m in fantasia_data_measure 
-                                if (m['measure']!= 'x' 
-                                    and int(m['measure'])>=start 
-                                    and int(m['measure'])<=end)
-                                    and (int(m['repeated']))==repeated] 
-                          
-                data_all, monsets_all, real_onsets_all, metric_all =[], [], [], []
-                for m in range(start, end+1):
-                    datafiltered= [d for d in data_measures if int(d['measure'])== m]
-                    data_all.extend(datafiltered)
-                    #real iois based on the onset in ms
-                    iois=[float(m['ioi']) for m in datafiltered]
-                    #get predicted metronomic time durations for all notes
-                    metronomic_ioi= get_metronomic_ioi(datafiltered)
-                    real_onsets = [float(m['onset']) for m in datafiltered]
-                    real_onsets_all.extend(real_onsets)
-
-                    metronomic_onsets = []
-                    acc=real_onsets[0]
-                    metronomic_onsets.append(acc)
-                    for i in range(1, len(real_onsets)):
-                        acc += metronomic_ioi[i-1]
-                        metronomic_onsets.append(acc)
-                    monsets_all.extend(metronomic_onsets)
-
-                    if metric == "deltaioi":
-                        metric_all.extend(get_delta_ioi_per_measure(iois, metronomic_ioi))
-                    elif metric == "deltaonset":
-                        metric_all.extend(get_delta_onset_per_measure(real_onsets, metronomic_onsets, iois))
-                        
-                ####### dataframe with raw data and computed metric ######################
-                dfdata = pd.DataFrame.from_dict(data_all)
-                dfdata[metric]=metric_all
-                st.session_state.dfdata_measure=dfdata
-                ######################################################################
-                
-                performers_results=timings(metric, performer, metric_all, data_all )
-                results = results_to_stats(performers_results[performer])
-                ### paper notations
-                median_global, median_upper_voice, median_lower_voice  = results['all'][1], results['u'][1], results['B+b'][1]
-
-                # display stats
-                performers_metric_measure_results=timings(metric, performer, metric_all, data_all)
-                st.session_state.performers_metric_measure_results = performers_metric_measure_results
-                statistics= results_to_stats(st.session_state.performers_metric_measure_results[performer])
-                st.session_state.statistics_measure = statistics
-                st.divider()
-                st.write("Analyse on only the first sequence of notes if measures are repeated")
-                N=len(st.session_state.statistics_measure)
-                display_tab(st.session_state.statistics_measure, metric=metric)
-                with st.expander("See data on selected measures"):
-                    st.session_state.dfdata_measure
-                with col4:
-                    display_plot(data_all, metric_all, median_global, median_upper_voice, median_lower_voice, metric=metric)
-            except:
-                st.warning("Invalid boundaries in measures or an incorrect repeat", icon="⚠️")
-                st.warning("Please check the inputs", icon="🙏")
+        try:
+            video_url, video_start, video_end = state.get('video', video_excerpt, performer, fantasia,
+                                                          start, end, repeated)
+
+            with col3:
+                st.video(video_url, start_time=video_start, end_time=video_end)
+                st.warning(f"if embeded video doesn't load, watch directly on youtube __start time: {round(video_start)}s, end: {round(video_end)}s__")
+
+            # shared by all sessions
+            key = result_key('measures', performer, metric, fantasia=fantasia, measures=(start, end, repeated))
+            shared = state.get('results', shared_result, key, measures_results,
+                               performer, fantasia, metric, start, end, repeated)
+            median_global, median_upper_voice, median_lower_voice = shared['medians']
+            prefetch_measures(performer, fantasia, metric, start, end, repeated)
+
+            # display stats
+            st.divider()
+            st.write("Analyse on only the first sequence of notes if measures are repeated")
+            display_tab(shared['statistics'], metric=metric)
+            with st.expander("See data on selected measures"):
+                st.dataframe(state.get('table', data_table, shared['data'], shared['metric'], metric))
+            with col4:
+                display_plot(shared['data'], shared['metric'], median_global, median_upper_voice, median_lower_voice, metric=metric)
+        except Exception:
+            st.warning("Invalid boundaries in measures or an incorrect repeat", icon="⚠️")
+            st.warning("Please check the inputs", icon="🙏")
+
+    with tab_m3:
+        st.write(f"Rolling median and IQR (q1-q3) of {metric} on windows of bars along fantasia {fantasia}, for all performers")
+        with st.form("form_rolling"):
+            window = st.number_input("window (number of bars)", min_value=1, max_value=32, step=1, value=4,
+                                     key=state.key('window'))
+            submitted = st.form_submit_button("Display rolling statistics")
+        if submitted or state.ready('rolling_plot'):
+            # shared by all sessions, graph rendered once by selection
+            key = result_key('rolling', metric=metric, fantasia=fantasia, window=window)
+            table = state.get('rolling', shared_result, key, rolling.corpus_rolling, metric, window,
+                              fantasias=(fantasia,))
+            st.image(state.get('rolling_plot', rolling_plot_image, table, metric), use_container_width=True)
                 
 ##############################
 # on load
 ##############################
 
 config_page()
-by_measures()
\ No newline at end of file
+by_measures()
@@ -4,12 +4,20 @@ This module defines the streamlit application movements page
 """
 
 import streamlit as st
-import pandas as pd
-from matplotlib import pyplot as plt
+from src import lazy_import, rolling
 from src.durations_analyse_tools import *
 from src.data import *
 from src.stats import *
+from src.shared_cache import performer_results, shared_result, result_key
+from src.bootstrap import results_to_stats_with_ci
+from src.page_state import PageState
+from src.precompute import prefetch_performer
 from src.streamlit_displays import *
+from src.density import densities, violin_stats
+
+# heavy imports, run on the code paths using them
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
 
 #############################
 # PAGE CONFIG
@@ -27,10 +35,11 @@ def config_page():
     
 def by_movements(): 
     st.header("Analyse by type of Movement and by performer on all the corpus")
-    # call back to update options for box plot
-    def pill_callback():
-        for key in st.session_state.keys():
-            del st.session_state[key]
+    # results invalidated only when one of their inputs changes
+    state = PageState('movements', {'results': ('performer', 'metric', 'movement_name'),
+                                    'statistics': ('results',),
+                                    'rolling': ('metric', 'movement_name', 'window'),
+                                    'rolling_plot': ('rolling',)}, st.session_state)
             
     @st.cache_data
     def convert_df(df):
@@ -41,51 +50,69 @@ def by_movements():
         performer= st.pills("choose a performer", 
                             names, 
                             default='kuijken', 
-                            on_change=pill_callback)
+                            key=state.key('performer'),
+                            on_change=state.invalidate, args=('performer',))
         
         metric= st.pills("choose a metric", 
                          ['deltaonset', 'deltaioi'], 
                          default='deltaioi', 
-                         on_change=pill_callback)
+                         key=state.key('metric'),
+                         on_change=state.invalidate, args=('metric',))
         
         movement_name=st.selectbox("choose a type of movement", 
                                    MOVEMENTS_POSITIONS.keys(), 
-                                   on_change=pill_callback)
+                                   key=state.key('movement_name'),
+                                   on_change=state.invalidate, args=('movement_name',))
     
-    if 'performers_metric_results' not in st.session_state:
-        metric_all, data_all = get_all_metric_and_data_for_one_performer(performer, metric=metric, movement_name= movement_name)
-        ####### dataframe with raw data and ioi_ratios ######################
-        dfdata = pd.DataFrame.from_dict(data_all)
-        dfdata[metric]=metric_all
-        st.session_state.dfdata=dfdata
-        ######################################################################
-    # display stats
-        performers_metric_results=timings(metric, performer, metric_all, data_all)
-        st.session_state.performers_metric_results = performers_metric_results
-        statistics= results_to_stats(st.session_state.performers_metric_results[performer])
-        st.session_state.statistics = statistics
+    # shared by all sessions
+    shared = state.get('results', performer_results, 'movements', performer, metric, movement_name=movement_name)
+    prefetch_performer('movements', performer, metric, movement_name=movement_name)
+    performers_metric_results = shared['results']
+    # confidence intervals of the displayed statistics, shared by all sessions
+    statistics = state.get('statistics', shared_result,
+                           result_key('movements/ci', performer, metric, movement_name),
+                           results_to_stats_with_ci, performers_metric_results)[performer]
     
     for f in MOVEMENTS_POSITIONS[movement_name]:
         st.write(f"Fantasia {f} -- movement(s) n°: {'-'.join([str(n) for n in MOVEMENTS_POSITIONS[movement_name][f]])}")
         
-    N=len(st.session_state.statistics)
-    display_tab(st.session_state.statistics, metric=metric)
+    N=len(statistics)
+    display_tab(statistics, metric=metric)
     
     with st.expander("See data"):
-        st.session_state.dfdata
+        st.dataframe(shared['table'])
+
+    with st.expander("Rolling median and IQR along the movements for all performers"):
+        with st.form("form_rolling"):
+            window = st.number_input("window (number of bars)", min_value=1, max_value=32, step=1, value=4,
+                                     key=state.key('window'))
+            submitted = st.form_submit_button("Display rolling statistics")
+        if submitted or state.ready('rolling_plot'):
+            # shared by all sessions, graph rendered once by selection
+            key = result_key('rolling', metric=metric, movement_name=movement_name, window=window)
+            table = state.get('rolling', shared_result, key, rolling.corpus_rolling, metric, window,
+                              movement_name=movement_name)
+            st.image(state.get('rolling_plot', rolling_plot_image, table, metric), use_container_width=True)
         
     form_fantasia = st.form("form_fantasia")
     with form_fantasia:
         options=st.multiselect(
             "Select filters:",
-            list(st.session_state.statistics.keys())
+            list(statistics.keys())
         )
-        submitted = form_fantasia.form_submit_button("Display Box plot")
+        plot_type = st.radio("Plot type", ["box plot", "violin plot"], horizontal=True)
+        submitted = form_fantasia.form_submit_button("Display plot")
         if submitted:
-            x= [st.session_state.performers_metric_results[performer][k] for k in options]
+            x= [performers_metric_results[performer][k] for k in options]
             cmap = plt.get_cmap('tab20c')
             colors = [cmap(i / (N-1)) for i in range(N)]
-            box_plot_show(x, options, colors, form_fantasia)
+            if plot_type == "box plot":
+                box_plot_show(x, options, colors, form_fantasia)
+            else:
+                curves = densities(performers_metric_results, metric,
+                                   scope=f"movement {movement_name}", categories=options)
+                vpstats = [violin_stats(x[j], curves[performer][k]) for j, k in enumerate(options)]
+                violin_plot_show(vpstats, options, colors, form_fantasia)
 
 
 ##############################
@@ -93,4 +120,4 @@ def by_movements():
 ##############################
 
 config_page()
-by_movements()
\ No newline at end of file
+by_movements()
@@ -4,12 +4,20 @@ This module defines the streamlit application fugatos page
 """
 
 import streamlit as st
-import pandas as pd
-from matplotlib import pyplot as plt
+from src import lazy_import
 from src.durations_analyse_tools import *
 from src.data import *
 from src.stats import *
+from src.shared_cache import performer_results, shared_result, result_key
+from src.bootstrap import results_to_stats_with_ci
+from src.page_state import PageState
+from src.precompute import prefetch_performer
 from src.streamlit_displays import *
+from src.density import densities, violin_stats
+
+# heavy imports, run on the code paths using them
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
 
 #############################
 # PAGE CONFIG
@@ -27,10 +35,9 @@ def config_page():
 
 def fugatos_performers():
     st.header("Analyse by performer for all fugatos movements")
-    # call back to update options for box plot
-    def pill_callback():
-        for key in st.session_state.keys():
-            del st.session_state[key]
+    # results invalidated only when one of their inputs changes
+    state = PageState('fugatos', {'results': ('performer', 'metric'), 'statistics': ('results',)},
+                      st.session_state)
             
     @st.cache_data
     def convert_df(df):
@@ -39,45 +46,47 @@ def fugatos_performers():
     with st.container(border=True):
         names = [p for p in PERFORMERS]
         performer= st.pills("choose a performer", 
-                            names, default='kuijken', on_change=pill_callback)
+                            names, default='kuijken', key=state.key('performer'),
+                            on_change=state.invalidate, args=('performer',))
         
         metric= st.pills("choose a metric", 
                          [ 'deltaonset', 'deltaioi'], 
                          default='deltaonset', 
-                         on_change=pill_callback)
+                         key=state.key('metric'),
+                         on_change=state.invalidate, args=('metric',))
     
-    if 'performers_fugatos' not in st.session_state:
-        metric_all, data_all = get_all_metric_and_data_for_one_performer(performer, metric=metric, fugato=True)
-        ####### dataframe with raw data and ioi_ratios ######################
-        dfdata = pd.DataFrame.from_dict(data_all)
-        dfdata[metric]=metric_all
-        st.session_state.dfdata=dfdata
-        ######################################################################
-    # display stats
-        performers_fugatos=timings(metric, performer, metric_all, data_all)
-        st.session_state.performers_fugatos = performers_fugatos
-
-        stats_fugatos= results_to_stats(st.session_state.performers_fugatos[performer])
-        st.session_state.stats_fugatos = stats_fugatos
+    # shared by all sessions
+    shared = state.get('results', performer_results, 'fugatos', performer, metric, fugato=True)
+    prefetch_performer('fugatos', performer, metric, fugato=True)
+    performers_fugatos = shared['results']
+    # confidence intervals of the displayed statistics, shared by all sessions
+    stats_fugatos = state.get('statistics', shared_result, result_key('fugatos/ci', performer, metric, fugato=True),
+                              results_to_stats_with_ci, performers_fugatos)[performer]
     
-    N=len(st.session_state.stats_fugatos)
-    display_tab(st.session_state.stats_fugatos, metric=metric)
+    N=len(stats_fugatos)
+    display_tab(stats_fugatos, metric=metric)
     
     with st.expander("See data"):
-        st.session_state.dfdata
+        st.dataframe(shared['table'])
         
     form_one = st.form("form_one")
     with form_one:
         options=st.multiselect(
             "Select filters:",
-            list(st.session_state.stats_fugatos.keys())
+            list(stats_fugatos.keys())
         )
-        submitted = form_one.form_submit_button("Display Box plot")
+        plot_type = st.radio("Plot type", ["box plot", "violin plot"], horizontal=True)
+        submitted = form_one.form_submit_button("Display plot")
         if submitted:
-            x= [st.session_state.performers_fugatos[performer][k] for k in options]
+            x= [performers_fugatos[performer][k] for k in options]
             cmap = plt.get_cmap('tab20c')
             colors = [cmap(i / (N-1)) for i in range(N)]
-            box_plot_show(x, options, colors, form_one)
+            if plot_type == "box plot":
+                box_plot_show(x, options, colors, form_one)
+            else:
+                curves = densities(performers_fugatos, metric, scope="fugatos", categories=options)
+                vpstats = [violin_stats(x[j], curves[performer][k]) for j, k in enumerate(options)]
+                violin_plot_show(vpstats, options, colors, form_one)
 
 
 ##############################
@@ -85,4 +94,4 @@ def fugatos_performers():
 ##############################
 
 config_page()
-fugatos_performers()
\ No newline at end of file
+fugatos_performers()
@@ -4,12 +4,21 @@ This module defines the streamlit application corpus by performer page
 """
 
 import streamlit as st
-import pandas as pd
-from matplotlib import pyplot as plt
+from src import lazy_import
 from src.durations_analyse_tools import *
 from src.data import *
 from src.stats import *
+from src.shared_cache import RESULTS, result_key, performer_results, shared_result
+from src.bootstrap import results_to_stats_with_ci
+from src.page_state import PageState
+from src.precompute import prefetch_performer
+from src.approximate import approximate_stats
 from src.streamlit_displays import *
+from src.density import densities, violin_stats
+
+# heavy imports, run on the code paths using them
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
 
 
 #############################
@@ -71,10 +80,9 @@ def fantasias_performers():
             
     with tab_f2:   
         st.header("Analyse by performer for all the corpus")
-        # call back to update options for box plot
-        def pill_callback():
-            for key in st.session_state.keys():
-                del st.session_state[key]
+        # results invalidated only when one of their inputs changes
+        state = PageState('corpus', {'results': ('performer', 'metric'), 'statistics': ('results',)},
+                          st.session_state)
                 
         @st.cache_data
         def convert_df(df):
@@ -85,48 +93,60 @@ def fantasias_performers():
             performer= st.pills("choose a performer", 
                                 names, 
                                 default='kuijken', 
-                                on_change=pill_callback)
+                                key=state.key('performer'),
+                                on_change=state.invalidate, args=('performer',))
             
             metric= st.pills("choose a metric", 
                              ['deltaonset', 'deltaioi'], 
                              default='deltaonset', 
-                             on_change=pill_callback)
+                             key=state.key('metric'),
+                             on_change=state.invalidate, args=('metric',))
         
-        if 'performers_metric_results' not in st.session_state:
-            metric_all, data_all = get_all_metric_and_data_for_one_performer(performer, metric=metric)
-            ####### dataframe with raw data and ioi_ratios ######################
-            dfdata = pd.DataFrame.from_dict(data_all)
-            dfdata[metric]=metric_all
-            st.session_state.dfdata=dfdata
-            ######################################################################
-            # display stats
-            performers_metric_results=timings(metric, performer, metric_all, data_all)
-            st.session_state.performers_metric_results = performers_metric_results
-
-            statistics= results_to_stats(st.session_state.performers_metric_results[performer])
-            st.session_state.statistics = statistics
+        # approximate statistics on a sample of measures, replaced by the exact ones when ready
+        # (unless already computed for this selection or another session)
+        preview = st.empty()
+        if not state.ready('results') and result_key('corpus', performer, metric) not in RESULTS:
+            with preview.container():
+                approximation, rate = approximate_stats(metric, [performer])
+                st.divider()
+                st.caption(f"Approximate statistics on {rate:.0%} of the measures (exact results in progress...)")
+                display_tab(approximation[performer], metric=metric)
+        # shared by all sessions
+        shared = state.get('results', performer_results, 'corpus', performer, metric)
+        prefetch_performer('corpus', performer, metric)
+        performers_metric_results = shared['results']
+        # confidence intervals of the displayed statistics, shared by all sessions
+        statistics = state.get('statistics', shared_result, result_key('corpus/ci', performer, metric),
+                               results_to_stats_with_ci, performers_metric_results)[performer]
+        preview.empty()
             
         st.divider()
-        N=len(st.session_state.statistics)
-        display_tab(st.session_state.statistics, metric=metric)
+        N=len(statistics)
+        display_tab(statistics, metric=metric)
         
         st.divider()
         with st.expander("See data"):
-            st.session_state.dfdata
+            st.dataframe(shared['table'])
         
         st.divider()   
         form_fantasia = st.form("form_fantasia")
         with form_fantasia:
             options=st.multiselect(
                 "Select filters:",
-                list(st.session_state.statistics.keys())
+                list(statistics.keys())
             )
-            submitted = form_fantasia.form_submit_button("Display Box plot")
+            plot_type = st.radio("Plot type", ["box plot", "violin plot"], horizontal=True)
+            submitted = form_fantasia.form_submit_button("Display plot")
             if submitted:
-                x= [st.session_state.performers_metric_results[performer][k] for k in options]
+                x= [performers_metric_results[performer][k] for k in options]
                 cmap = plt.get_cmap('tab20c')
                 colors = [cmap(i / (N-1)) for i in range(N)]
-                box_plot_show(x, options, colors, form_fantasia)
+                if plot_type == "box plot":
+                    box_plot_show(x, options, colors, form_fantasia)
+                else:
+                    curves = densities(performers_metric_results, metric, scope="corpus", categories=options)
+                    vpstats = [violin_stats(x[j], curves[performer][k]) for j, k in enumerate(options)]
+                    violin_plot_show(vpstats, options, colors, form_fantasia)
 
 
 ##############################
@@ -134,4 +154,4 @@ def fantasias_performers():
 ##############################
 
 config_page()
-fantasias_performers()
\ No newline at end of file
+fantasias_performers()
@@ -4,12 +4,19 @@ This module defines the streamlit application performers comparison page
 """
 
 import streamlit as st
-from matplotlib import pyplot as plt
-from matplotlib.lines import Line2D
+from src import lazy_import, significance
 from src.durations_analyse_tools import *
 from src.data import *
 from src.stats import *
-from src.streamlit_displays import ticks_positions
+from src.streamlit_displays import box_plot_show, violin_plot_show
+from src.density import densities, violin_stats
+from src.shared_cache import corpus_timings, performers_timings
+from src.page_state import PageState
+import src.precompute  # starts the background precomputation of the server
+
+# heavy imports, run on the code paths using them
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
 
 #############################
 # PAGE CONFIG
@@ -22,55 +29,144 @@ def config_page():
 
 config_page()
 
+# tests invalidated only when the timings they are computed from change
+state = PageState('comparison', {'timings/deltaioi': (), 'timings/deltaonset': (),
+                                 'tests/deltaioi': ('timings/deltaioi',),
+                                 'tests/deltaonset': ('timings/deltaonset',)}, st.session_state)
+
 
 #############################
 # multi boxplots
 #############################
 
 
-def box_plot_show(x, options, colors, form, metric='deltatioi'):
-
-    fig, axs = plt.subplots(figsize=(20,10))
-    n_labels=len(colors)*len(options)
-    tick_labels=n_labels*[' ']
-    positions=ticks_positions(len(x))
-    bplot = plt.boxplot(x, tick_labels=tick_labels,
-                            positions=positions,
-                           showmeans=True, 
-                           showfliers=False,  
-                           patch_artist=True,
-                           medianprops = dict(color = "blue", linewidth = 1.5),
-                           meanprops={"marker": "+",
-                                      "markeredgecolor": "black", 
-                                      "markersize": "5"},
-                        )
-    for i in range(len(bplot['boxes'])):
-        bplot['boxes'][i].set(facecolor = colors[i%len(colors)], linewidth=2)
-    # Add label for a group of 6 ticks
-    axs.tick_params(axis = 'x', length = 0)
-    i=0
-    for k in options:
-        pos = 3.5 + i
-        axs.text(pos, -0.02, k, ha='center',
-                    va='top', transform=axs.get_xaxis_transform(), fontsize=25)
-        i+=7
-    custom_lines = [Line2D([0], [0], color=colors[i], lw=4) for i in range(len(colors))]
-    axs.legend(custom_lines, [p[0].upper()+p[1:] for p in PERFORMERS], 
-                fontsize=21, ncols=6)
-    
-    if metric == 'deltaonset' :
-        plt.axhline(y=0, color='gray', linestyle='--')
-        ylabel="$\Delta \mathit{o}(\%)$"
-    elif metric =='deltaioi' :
-        plt.axhline(y=0, color='gray', linestyle='--')
-        ylabel="$\Delta \mathit{IOI}(\%)$"   
-    
-    axs.grid(axis='y', linestyle='--', linewidth=1)
-    axs.set_ylabel(ylabel, fontsize=30)
-    axs.tick_params(axis='y', labelsize=30) 
-    form.pyplot(plt.gcf())
+def violins_stats(results: dict[str:dict[str:list]], options: list[str], metric: str)->list[dict]:
+    """Returns violin statistics of selected categories for all performers (in %),
+    grouped by category as the box plots
+
+    Args:
+        - results: {performer : {group : metric values}} from timings function
+        - options: selected categories
+        - metric: metric name
+
+    Returns:
+        list of violin statistics
+    """
+    curves = densities(results, metric, scope='corpus', categories=options)
+    return [violin_stats(results[p][k], curves[p][k], scale=100)
+            for k in options for p in results.keys()]
+
+
+
+#############################
+# significance tests
+#############################
+
+def display_tests(results: dict[str:dict[str:list]], metric: str):
+    """Display Kruskal-Wallis and pairwise Mann-Whitney tests between performers for all categories
+
+    Args:
+        - results: {performer : {group : metric values}} from timings function
+        - metric: deltaioi or deltaonset (name of the tests in the page state)
+    """
+    with st.expander("Significance tests between performers"):
+        if st.checkbox("Compute tests", key=state.key(f"check/{metric}")):
+            if not state.ready(f"tests/{metric}"):
+                with st.spinner("Kruskal-Wallis and Mann-Whitney tests on all categories", show_time=True):
+                    state.get(f"tests/{metric}", significance.batch_tests, results)
+            tests = state.get(f"tests/{metric}", significance.batch_tests, results)
+            st.write("Kruskal-Wallis across performers, pairwise Mann-Whitney with Cliff's $\\delta$ "
+                     "(p holm: adjusted on the 15 pairs of a category, p perm: permutation test for small groups)")
+            st.dataframe(tests.style.format("{:.4f}"))
 
 
+#############################
+# progressive results
+#############################
+
+def medians_table(results: dict[str:dict[str:list]])->pd.DataFrame:
+    """Returns medians of metric values (%) by performer and category
+
+    Args:
+        - results: {performer : {group : metric values}} of the performers ready
+
+    Returns:
+        dataframe with a row by performer and a column by category
+    """
+    return pd.DataFrame({p: {k: stats[3]*100 for k, stats in results_to_stats(results[p]).items()}
+                         for p in results}).T
+
+
+def display_plots(results: dict[str:dict[str:list]], options: list[str], plot_type: str, 
+                  form, metric: str):
+    """Display box or violin plots of selected categories for the performers ready
+
+    Args:
+        - results: {performer : {group : metric values}} of the performers ready
+        - options: selected categories
+        - plot_type: "box plots" or "violin plots"
+        - form: streamlit container of the plot
+        - metric: deltaioi or deltaonset
+    """
+    cmap = plt.get_cmap('Accent')
+    colors = [cmap(i / 7) for i in range(6)]
+    performers = [p for p in PERFORMERS if p in results]
+    if plot_type == "violin plots":
+        violin_plot_show(violins_stats({p: results[p] for p in performers}, options, metric),
+                         options, colors, form, metric=metric, performers=performers)
+    else:
+        x=[]
+        for k in options:
+            x += [[e*100 for e in results[p][k]] for p in performers]
+        box_plot_show(x, options, colors, form, metric=metric, performers=performers)
+    plt.close('all')
+
+
+def performers_comparison(metric: str, form_name: str):
+    """Display the timings of the performers as each one is ready (see performers_timings):
+    medians table and submitted plots are updated at each performer, 
+    significance tests are available once all performers are ready
+
+    Args:
+        - metric: deltaioi or deltaonset
+        - form_name: key of the plots form
+    """
+    if state.ready(f"timings/{metric}"):
+        stream = state.get(f"timings/{metric}", corpus_timings, metric).items()
+    else:
+        stream = performers_timings(metric)
+    progress = st.empty()
+    medians = st.empty()
+    tests = st.container()
+    ready = dict()
+    submitted, options = False, []
+    for performer, results in stream:
+        ready[performer] = results
+        if len(ready) == 1:
+            # categories known from the first performer
+            form = st.form(form_name)
+            with form:
+                options=st.multiselect(
+                    "Select filters:",
+                    list(results.keys())
+                )
+                plot_type = st.radio("Plot type", ["box plots", "violin plots"], horizontal=True)
+                submitted = form.form_submit_button("Display plots")
+                plot = st.empty()
+        progress.progress(len(ready)/len(PERFORMERS), 
+                          text=f"{len(ready)}/{len(PERFORMERS)} performers ready (last: {performer})")
+        with medians.container():
+            st.write("Medians (%) by performer and category")
+            st.dataframe(medians_table(ready).style.format("{:.2f}"))
+        if submitted and options:
+            display_plots(ready, options, plot_type, plot, metric)
+    progress.empty()
+    if not state.ready(f"timings/{metric}"):
+        state.get(f"timings/{metric}", dict, {p: ready[p] for p in PERFORMERS})
+        st.toast('Done!', icon='🎉')
+    with tests:
+        display_tests(state.get(f"timings/{metric}", corpus_timings, metric), metric)
+
 
 #############################
 # main functions
@@ -82,29 +178,7 @@ def performers_global_deltaioi():
     """
     st.write("# Box plots  of $\Delta \mathit{IOI}(\%)$ by performers and grouped by selected categories")
     st.write("$\Delta \mathit{IOI} = \dfrac{\mathit{IOI_p}-\mathit{IOI_m}}{dur(M)}$")    
-         
-    with st.spinner("Wait for it....around 20s", show_time=True):
-        if 'all_performers_deltas_ioi' not in st.session_state:
-            all_performers_deltas_ioi=timings('deltaioi')
-            st.session_state.all_performers_deltas_ioi=all_performers_deltas_ioi
-            st.toast('Done!', icon='🎉')
-    form_all_deltas_ioi = st.form("form_all_deltas_ioi")
-    with form_all_deltas_ioi:# voir session state pour 
-        options_deltas_ioi=st.multiselect(
-            "Select filters:",
-            list(st.session_state.all_performers_deltas_ioi['kuijken'].keys())
-        )
-        submitted_deltas_ioi = form_all_deltas_ioi.form_submit_button("Display Box plots")
-        if submitted_deltas_ioi:    
-            cmap = plt.get_cmap('Accent')
-            colors = [cmap(i / 7) for i in range(6)]
-            x=[]
-            for k in options_deltas_ioi:
-                x += [[e*100 for e in st.session_state.all_performers_deltas_ioi[p][k]]
-                      for p in st.session_state.all_performers_deltas_ioi.keys()]
-            fig, ax = plt.subplots(figsize=(9, 4))
-            box_plot_show(x, options_deltas_ioi, colors,
-                          form_all_deltas_ioi, metric='deltaioi')
+    performers_comparison('deltaioi', "form_all_deltas_ioi")
 
 
 def performers_global_deltaonset():
@@ -112,29 +186,7 @@ def performers_global_deltaonset():
     """
     st.write("# Box plots  of $\Delta \mathit{o}(\%)$  by performers and grouped by selected categories")
     st.write("$\Delta \mathit{o} = \dfrac{\mathit{o_p}-\mathit{o_m}}{dur(M)}$")    
-         
-    with st.spinner("Wait for it....around 20s", show_time=True):
-        if 'all_performers_deltas_onset' not in st.session_state:
-            all_performers_deltas_onset=timings('deltaonset')
-            st.session_state.all_performers_deltas_onset=all_performers_deltas_onset
-            st.toast('Done!', icon='🎉')
-    form_all_deltas_onset = st.form("form_all_deltas_onset")
-    with form_all_deltas_onset:# voir session state pour 
-        options_deltas_onset=st.multiselect(
-            "Select filters:",
-            list(st.session_state.all_performers_deltas_onset['kuijken'].keys())
-        )
-        submitted_deltas_onset = form_all_deltas_onset.form_submit_button("Display Box plots")
-        if submitted_deltas_onset:    
-            cmap = plt.get_cmap('Accent')
-            colors = [cmap(i / 7) for i in range(6)]
-            x=[]
-            for k in options_deltas_onset:
-                x += [[e*100 for e in st.session_state.all_performers_deltas_onset[p][k]]
-                      for p in st.session_state.all_performers_deltas_onset.keys()]
-            fig, ax = plt.subplots(figsize=(9, 4))
-            box_plot_show(x, options_deltas_onset, colors, 
-                          form_all_deltas_onset, metric='deltaonset')         
+    performers_comparison('deltaonset', "form_all_deltas_onset")
             
             
 ####################
@@ -148,4 +200,4 @@ page_names_to_funcs = {
 
 select = st.sidebar.selectbox("Choose a visualisation", 
                               page_names_to_funcs.keys())
-page_names_to_funcs[select]()
\ No newline at end of file
+page_names_to_funcs[select]()
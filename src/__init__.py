@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+"""
+This package defines the analysis modules of the application. Submodules and heavy
+dependencies (pandas, scipy, matplotlib, music21, streamlit_pdf_viewer) are imported lazily:
+`from src import rolling` or `pd = lazy_import('pandas')` return a placeholder module
+which is imported at its first attribute access, so that a page only pays for the imports
+of the code paths it runs
+"""
+
+import importlib
+
+SUBMODULES = ['approximate', 'bars', 'bootstrap', 'changepoints', 'data', 'density',
+              'durations_analyse_tools', 'events', 'linear_model', 'motifs', 'music21_tools',
+              'outliers', 'page_state', 'parallel', 'patterns', 'pitches', 'precompute', 'repeats',
+              'rolling', 'score_events', 'score_pages', 'shared_cache', 'significance', 'similarity',
+              'spectral', 'stats', 'streamlit_displays', 'tensor', 'voices']
+__all__ = SUBMODULES + ['LazyModule', 'lazy_import', 'loaded']
+
+
+#####################################
+# lazy imports
+######################################
+
+class LazyModule:
+    """Placeholder of a module imported at its first attribute access, attributes being read,
+    set, deleted and listed on the module itself (patching a placeholder patches the module)
+
+    Attributes:
+        - __name__: full name of the module
+    """
+
+    def __init__(self, name: str):
+        self.__dict__['__name__'] = name
+
+    def __getattr__(self, attribute: str):
+        return getattr(loaded(self), attribute)
+
+    def __setattr__(self, attribute: str, value):
+        setattr(loaded(self), attribute, value)
+
+    def __delattr__(self, attribute: str):
+        delattr(loaded(self), attribute)
+
+    def __dir__(self)->list[str]:
+        return dir(loaded(self))
+
+    def __repr__(self)->str:
+        return f"<lazy module '{self.__dict__['__name__']}'>"
+
+
+def loaded(module):
+    """Returns the module of a placeholder, imported if needed (a module is returned as is)
+
+    Args:
+        - module: LazyModule or module
+
+    Returns:
+        module
+    """
+    if isinstance(module, LazyModule):
+        return importlib.import_module(module.__dict__['__name__'])
+    return module
+
+
+def lazy_import(name: str)->LazyModule:
+    """Returns a placeholder of a module imported at its first attribute access
+
+    Args:
+        - name: full name of the module, for instance 'matplotlib.pyplot'
+
+    Returns:
+        LazyModule
+    """
+    return LazyModule(name)
+
+
+def __getattr__(name: str)->LazyModule:
+    """Lazy access to the submodules of the package: `from src import stats` does not run stats.
+    The placeholder is kept as attribute of the package until the submodule is imported
+    (which replaces it), both reading and patching the same module
+
+    Args:
+        - name: name of a submodule
+
+    Returns:
+        LazyModule
+    """
+    if name in SUBMODULES:
+        module = globals()[name] = lazy_import(f"{__name__}.{name}")
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
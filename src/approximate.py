@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines an approximate mode of the statistics tables: whole measures are sampled
+(stratified by performer and fantasia) at a rate driven by a latency target, and the statistics
+of the sample come with bootstrap error bounds, to be displayed while the exact result is computed
+"""
+
+import time
+import numpy as np
+from src.data import *
+from src.durations_analyse_tools import get_all_metric_and_data_for_one_performer
+from src.stats import timings
+from src.bootstrap import results_to_stats_with_ci
+
+#####################################
+# parameters
+######################################
+
+# latency target of an approximate result in s
+LATENCY_TARGET = 0.5
+# share of the latency target left to the bootstrap error bounds
+CI_SHARE = 0.25
+# resamples of the error bounds (fewer than the exact tables, a fixed number for reproducible bounds)
+PREVIEW_RESAMPLES = 200
+# smallest sample rate of the measures
+MIN_RATE = 0.02
+# smoothing of the cost estimate by new observations
+COST_SMOOTHING = 0.5
+# estimated computation time of one measure (s, reading of the alignments excluded),
+# updated after each approximate computation
+COST = {'seconds_per_measure': 1.5e-3}
+
+
+#####################################
+# sampling
+######################################
+
+def measures_plan(performer: str, fantasias: list[int]=None, fugato: bool=False, movement_name: str=None,
+                  loaded: dict[int:list[dict]]=None)->list[tuple[int, int, int]]:
+    """Returns the measures performed by a performer following MEASURES_BY_PERFORMERS
+
+    Args:
+        - performer: name of the performer
+        - fantasias: fantasias numbers. Defaults to None for all fantasias
+        - fugato: True if only fugatos movements, False otherwise. Defaults to False
+        - movement_name: name of a specific movement, only the measures with notes in the movements
+                         of this name (see MOVEMENTS_POSITIONS) being kept. Defaults to None if all type movements
+        - loaded: {fantasia : data} already read by get_all_data, used to find the movements of the measures.
+                  Defaults to None to read them
+
+    Returns:
+        list of (fantasia, measure, repeated)
+    """
+    if fantasias == None:
+        fantasias = range(1, 13)
+    if movement_name != None:
+        fantasias = [f for f in fantasias if f in MOVEMENTS_POSITIONS[movement_name]]
+    plan = []
+    for fantasia in fantasias:
+        if not fugato:
+            measures_sequences = MEASURES_BY_PERFORMERS[performer][fantasia]
+        else:
+            measures_sequences = MEASURES_FUGATOS_BY_PERFORMERS[performer][fantasia]
+        for s, e, r in measures_sequences:
+            if e == None:
+                e = s
+            elif s == e == r == 0:
+                break
+            plan += [(fantasia, m, r) for m in range(s, e+1)]
+    if movement_name != None:
+        in_movement = set()
+        for fantasia in fantasias:
+            data = loaded[fantasia] if loaded != None else get_all_data(performer, fantasia)
+            # grace notes and movements separations skipped as by the exact computation
+            in_movement.update((fantasia, int(d['measure']), int(d['repeated'])) for d in data
+                               if float(d['duration']) != 0.0
+                               and int(d['movement']) in MOVEMENTS_POSITIONS[movement_name][fantasia])
+        plan = [k for k in plan if k in in_movement]
+    return plan
+
+
+def sample_rate(n_measures: int, latency: float=LATENCY_TARGET)->float:
+    """Returns the rate of measures computable within the latency target
+
+    Args:
+        - n_measures: number of measures of the selection
+        - latency: latency target in s. Defaults to LATENCY_TARGET
+
+    Returns:
+        sample rate in [MIN_RATE;1]
+    """
+    if n_measures == 0:
+        return 1.0
+    return float(np.clip(latency / (COST['seconds_per_measure'] * n_measures), MIN_RATE, 1.0))
+
+
+def sample_measures(plan: list[tuple[int, int, int]], rate: float,
+                    rng: np.random.Generator)->set[tuple[int, int, int]]:
+    """Samples whole measures at the same rate in every fantasia (at least one measure by fantasia)
+
+    Args:
+        - plan: (fantasia, measure, repeated) of a performer (see measures_plan)
+        - rate: sample rate
+        - rng: random generator
+
+    Returns:
+        set of sampled (fantasia, measure, repeated)
+    """
+    res = set()
+    for fantasia in sorted({f for f, _, _ in plan}):
+        stratum = [k for k in plan if k[0] == fantasia]
+        size = max(1, int(round(rate * len(stratum))))
+        res.update(stratum[i] for i in rng.choice(len(stratum), size=size, replace=False))
+    return res
+
+
+#####################################
+# approximate statistics
+######################################
+
+def approximate_timings(metric: str, performers: list[str]=None, fantasias: list[int]=None,
+                        fugato: bool=False, movement_name: str=None, latency: float=LATENCY_TARGET,
+                        seed: int=0)->tuple[dict[str:dict[str:list]], float]:
+    """Returns metric values for all categories on a stratified sample of measures,
+    as timings on the whole selection
+
+    Args:
+        - metric: deltaioi or deltaonset
+        - performers: names of the performers. Defaults to None for all performers
+        - fantasias: fantasias numbers. Defaults to None for all fantasias
+        - fugato: True if only fugatos movements, False otherwise. Defaults to False
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+        - latency: latency target in s. Defaults to LATENCY_TARGET
+        - seed: seed of the sample. Defaults to 0
+
+    Returns:
+        ({performer : {group : metric values}}, sample rate)
+    """
+    if performers == None:
+        performers = PERFORMERS
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    # alignments read first: fixed cost, not part of the cost of a measure
+    loaded = {p: {f: get_all_data(p, f) for f in sorted({f for f, _, _ in measures_plan(p, fantasias, fugato)})}
+              for p in performers}
+    plans = {p: measures_plan(p, fantasias, fugato, movement_name, loaded[p]) for p in performers}
+    rate = sample_rate(sum(len(plan) for plan in plans.values()), latency - (time.perf_counter() - start))
+    res = dict()
+    n_sampled, elapsed = 0, 0.0
+    for p in performers:
+        sampled = sample_measures(plans[p], rate, rng)
+        n_sampled += len(sampled)
+        start = time.perf_counter()
+        metric_data, datas = get_all_metric_and_data_for_one_performer(p, metric, fugato=fugato,
+                                                                       movement_name=movement_name,
+                                                                       measures=sampled, loaded=loaded[p])
+        res.update(timings(metric, p, metric_data, datas))
+        elapsed += time.perf_counter() - start
+    if n_sampled > 0:
+        observed = elapsed / n_sampled
+        COST['seconds_per_measure'] += COST_SMOOTHING * (observed - COST['seconds_per_measure'])
+    return res, rate
+
+
+def approximate_stats(metric: str, performers: list[str]=None, latency: float=LATENCY_TARGET,
+                      seed: int=0, **kwargs)->tuple[dict[str:dict], float]:
+    """Returns statistics with bootstrap error bounds on a stratified sample of measures
+
+    Args:
+        - metric: deltaioi or deltaonset
+        - performers: names of the performers. Defaults to None for all performers
+        - latency: latency target in s. Defaults to LATENCY_TARGET
+        - seed: seed of the sample. Defaults to 0
+        - kwargs: selection parameters of approximate_timings (fantasias, fugato, movement_name)
+
+    Returns:
+        ({performer : {key : statistics and confidence intervals}} as results_to_stats_with_ci,
+         sample rate)
+    """
+    results, rate = approximate_timings(metric, performers, latency=latency * (1 - CI_SHARE),
+                                        seed=seed, **kwargs)
+    return results_to_stats_with_ci(results, seed=seed, n_resamples=PREVIEW_RESAMPLES), rate
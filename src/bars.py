@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the materialised per-bar table of the corpus (duration, local tempo,
+summaries of Δo and ΔIOI for each performed bar) with top-k and threshold queries
+"""
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from src.events import corpus_events
+
+#####################################
+# parameters
+######################################
+
+BAR_KEY = ['performer', 'fantasia', 'movement', 'measure', 'repeated']
+METRICS = ('deltaonset', 'deltaioi')
+
+
+#####################################
+# table
+######################################
+
+@lru_cache(maxsize=32)
+def bar_table(voices: str=None, beats: tuple[str]=None, durations: tuple[float]=None)->pd.DataFrame:
+    """Materialised table with one row by performed bar of the corpus (cached, not to be modified)
+
+    Args:
+        - voices: voices of the notes summarised, for instance 'u' or 'Bbst'. Defaults to None for all notes
+        - beats: beats of the notes summarised among 'first', 'on', 'off'. Defaults to None for all
+        - durations: durations of the notes summarised in quarter notes. Defaults to None for all
+
+    Returns:
+        dataframe by (performer, fantasia, movement, measure, repeated) with columns movement_name,
+        quarters (score duration), time (ms), tempo (quarter notes per minute), notes (summarised notes)
+        and for deltaonset and deltaioi: mean, median, mean abs, max abs
+    """
+    events = corpus_events()
+    # a measure played twice with the same repeat number: first occurrence kept
+    events = events[events.groupby(BAR_KEY)['step'].transform('min') == events['step']]
+    bars = events.groupby(BAR_KEY, sort=False).agg(movement_name=('movement_name', 'first'),
+                                                    quarters=('duration', 'sum'),
+                                                    time=('ioi', 'sum'))
+    bars['tempo'] = 60000 * bars['quarters'] / bars['time']
+    notes = events[events['voice'] != '.']
+    if voices != None:
+        notes = notes[notes['voice'].isin(list(voices))]
+    if beats != None:
+        notes = notes[notes['beat'].isin(beats)]
+    if durations != None:
+        notes = notes[notes['duration'].isin(durations)]
+    groups = notes.assign(**{f"{m} abs": notes[m].abs() for m in METRICS}).groupby(BAR_KEY, sort=False)
+    bars['notes'] = groups.size()
+    for m in METRICS:
+        bars[f"{m} mean"] = groups[m].mean()
+        bars[f"{m} median"] = groups[m].median()
+        bars[f"{m} mean abs"] = groups[f"{m} abs"].mean()
+        bars[f"{m} max abs"] = groups[f"{m} abs"].max()
+    bars['notes'] = bars['notes'].fillna(0).astype(int)
+    return bars.reset_index()
+
+
+#####################################
+# queries
+######################################
+
+def select_bars(table: pd.DataFrame, performer: str=None, fantasia: int=None,
+                movement_name: str=None)->pd.DataFrame:
+    """Bars of a performer, a fantasia or a type of movement
+
+    Args:
+        - table: per-bar table (see bar_table)
+        - performer: name of the performer. Defaults to None for all performers
+        - fantasia: fantasia number. Defaults to None for all fantasias
+        - movement_name: name of a type of movement. Defaults to None for all movements
+
+    Returns:
+        selected rows
+    """
+    mask = np.ones(len(table), dtype=bool)
+    if performer != None:
+        mask &= (table['performer'] == performer).to_numpy()
+    if fantasia != None:
+        mask &= (table['fantasia'] == fantasia).to_numpy()
+    if movement_name != None:
+        mask &= (table['movement_name'] == movement_name).to_numpy()
+    return table[mask]
+
+
+def top_bars(table: pd.DataFrame, column: str='deltaonset mean abs', k: int=10,
+             largest: bool=True, **selection)->pd.DataFrame:
+    """The k bars with the largest (or smallest) values of a column, selected with argpartition
+
+    Args:
+        - table: per-bar table (see bar_table)
+        - column: column of the table. Defaults to 'deltaonset mean abs'
+        - k: number of bars. Defaults to 10
+        - largest: True for the largest values, False for the smallest. Defaults to True
+        - selection: performer, fantasia, movement_name (see select_bars)
+
+    Returns:
+        k rows sorted by the column
+    """
+    table = select_bars(table, **selection)
+    values = table[column].to_numpy(dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    values = values[valid] if largest else -values[valid]
+    k = min(k, len(valid))
+    if k == 0:
+        return table.iloc[[]]
+    best = np.argpartition(-values, k - 1)[:k]
+    best = best[np.argsort(-values[best], kind='stable')]
+    return table.iloc[valid[best]]
+
+
+def bars_above(table: pd.DataFrame, column: str='deltaonset mean abs', threshold: float=0.05,
+               **selection)->pd.DataFrame:
+    """Bars whose value of a column is above a threshold
+
+    Args:
+        - table: per-bar table (see bar_table)
+        - column: column of the table. Defaults to 'deltaonset mean abs'
+        - threshold: threshold. Defaults to 0.05
+        - selection: performer, fantasia, movement_name (see select_bars)
+
+    Returns:
+        selected rows sorted by decreasing value
+    """
+    table = select_bars(table, **selection)
+    return table[table[column].to_numpy(dtype=float) > threshold].sort_values(column, ascending=False)
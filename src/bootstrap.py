@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines bootstrap confidence intervals for the statistics of all groups
+of metric values (all performers, all categories) computed at once
+"""
+
+import numpy as np
+from src.stats import results_to_stats
+from src.parallel import run_chunks
+
+#####################################
+# parameters
+######################################
+
+# resamples drawn for each group
+N_RESAMPLES = 1000
+# number of chunks of resamples (the same for any number of workers, so that a seed gives the same intervals)
+N_CHUNKS = 16
+# resampled elements (values x resamples) below which the chunks run in the calling process
+SERIAL_ELEMENTS = 5_000_000
+# maximal number of drawn indexes held in memory at once by a worker
+BLOCK_ELEMENTS = 2_000_000
+
+
+#####################################
+# flat layout of groups
+######################################
+
+def flatten_results(results: dict[str:dict[str:list]])->tuple[np.ndarray, np.ndarray, np.ndarray, list[tuple[str, str]]]:
+    """Concatenates all groups of all performers in a single array, each group being sorted
+
+    Args:
+        - results: {performer : {group : metric values}} from timings function
+
+    Returns:
+        (values, offsets, sizes, keys) where values[offsets[i]:offsets[i]+sizes[i]] are
+        the sorted metric values of the group keys[i] = (performer, group)
+    """
+    keys = [(p, g) for p in results for g in results[p]]
+    groups = [np.sort(np.asarray(results[p][g], dtype=float)) for p, g in keys]
+    sizes = np.array([len(g) for g in groups], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+    values = np.concatenate(groups) if len(groups) > 0 else np.zeros(0)
+    return values, offsets, sizes, keys
+
+
+#####################################
+# resampling
+######################################
+
+def bootstrap_means(values: np.ndarray, offsets: np.ndarray, sizes: np.ndarray,
+                    n_resamples: int, rng: np.random.Generator)->np.ndarray:
+    """Means of bootstrap resamples of all groups, drawn with vectorised indexes
+
+    Args:
+        - values: concatenated groups values
+        - offsets: start of each group in values
+        - sizes: number of elements of each group
+        - n_resamples: number of resamples
+        - rng: numpy random generator
+
+    Returns:
+        array (n_resamples, number of groups), 0 for empty groups
+    """
+    res = np.zeros((n_resamples, len(sizes)))
+    filled = sizes > 0
+    if not filled.any():
+        return res
+    # owner group of each position in the flat layout
+    owner = np.repeat(np.flatnonzero(filled), sizes[filled])
+    starts = np.concatenate(([0], np.cumsum(sizes[filled])[:-1]))
+    block = max(1, BLOCK_ELEMENTS // len(owner))
+    for b in range(0, n_resamples, block):
+        n = min(block, n_resamples - b)
+        drawn = offsets[owner] + (rng.random((n, len(owner))) * sizes[owner]).astype(np.int64)
+        res[b:b+n, filled] = np.add.reduceat(values[drawn], starts, axis=1) / sizes[filled]
+    return res
+
+
+def bootstrap_medians(values: np.ndarray, offsets: np.ndarray, sizes: np.ndarray,
+                      n_resamples: int, rng: np.random.Generator)->np.ndarray:
+    """Medians of bootstrap resamples of all groups
+
+    Groups are sorted, so the median of a resample is given by the middle order statistics
+    of the drawn indexes: the k-th smallest of n uniform draws follows Beta(k, n-k+1),
+    and the next one is the minimum of the n-k draws above it. Only these indexes are drawn.
+
+    Args:
+        - values: concatenated sorted groups values
+        - offsets: start of each group in values
+        - sizes: number of elements of each group
+        - n_resamples: number of resamples
+        - rng: numpy random generator
+
+    Returns:
+        array (n_resamples, number of groups), 0 for empty groups
+    """
+    res = np.zeros((n_resamples, len(sizes)))
+    filled = sizes > 0
+    if not filled.any():
+        return res
+    n = sizes[filled]
+    k = (n + 1) // 2
+    u_low = rng.beta(k, n - k + 1, size=(n_resamples, len(n)))
+    # n - k == 0 only for groups of one element, whose two middle values are the same
+    u_next = u_low + (1 - u_low) * rng.beta(1, np.maximum(n - k, 1), size=(n_resamples, len(n)))
+    u_high = np.where(n % 2 == 0, u_next, u_low)
+    low = offsets[filled] + np.minimum((u_low * n).astype(np.int64), n - 1)
+    high = offsets[filled] + np.minimum((u_high * n).astype(np.int64), n - 1)
+    res[:, filled] = (values[low] + values[high]) / 2
+    return res
+
+
+def bootstrap_chunk(values: np.ndarray, offsets: np.ndarray, sizes: np.ndarray,
+                    n_resamples: int, seed: np.random.SeedSequence)->tuple[np.ndarray, np.ndarray]:
+    """Means and medians of one chunk of resamples (unit of work of the process pool)
+
+    Args:
+        - values: concatenated sorted groups values
+        - offsets: start of each group in values
+        - sizes: number of elements of each group
+        - n_resamples: number of resamples of the chunk
+        - seed: seed of the chunk
+
+    Returns:
+        (means, medians) arrays (n_resamples, number of groups)
+    """
+    rng = np.random.default_rng(seed)
+    return (bootstrap_means(values, offsets, sizes, n_resamples, rng),
+            bootstrap_medians(values, offsets, sizes, n_resamples, rng))
+
+
+#####################################
+# confidence intervals
+######################################
+
+def bootstrap_ci(results: dict[str:dict[str:list]], confidence: float=0.95,
+                 n_resamples: int=N_RESAMPLES, seed: int=0,
+                 workers: int=None)->dict[str:dict[str:tuple]]:
+    """Percentile bootstrap confidence intervals of the mean and the median for all groups
+    of all performers, deterministic for a seed (chunks of resamples in the shared process pool,
+    in the calling process for small inputs)
+
+    Args:
+        - results: {performer : {group : metric values}} from timings function
+        - confidence: confidence level. Defaults to 0.95
+        - n_resamples: number of resamples. Defaults to N_RESAMPLES
+        - seed: seed for reproducibility. Defaults to 0
+        - workers: number of processes. Defaults to None for the number of cpus
+
+    Returns:
+        {performer : {group : (mean_low, mean_high, median_low, median_high)}}
+        (0 for empty groups)
+    """
+    values, offsets, sizes, keys = flatten_results(results)
+    n_chunks = max(1, min(N_CHUNKS, n_resamples))
+    counts = [len(c) for c in np.array_split(np.arange(n_resamples), n_chunks)]
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    if len(values) * n_resamples <= SERIAL_ELEMENTS:
+        workers = 1
+    chunks = run_chunks(bootstrap_chunk,
+                        [(values, offsets, sizes, counts[i], seeds[i]) for i in range(n_chunks)],
+                        workers=workers)
+    means = np.concatenate([c[0] for c in chunks])
+    medians = np.concatenate([c[1] for c in chunks])
+    alpha = (1 - confidence) / 2
+    mean_low, mean_high = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    median_low, median_high = np.quantile(medians, [alpha, 1 - alpha], axis=0)
+    res = {p: dict() for p in results}
+    for i, (p, g) in enumerate(keys):
+        res[p][g] = (float(mean_low[i]), float(mean_high[i]),
+                     float(median_low[i]), float(median_high[i]))
+    return res
+
+
+def results_to_stats_with_ci(results: dict[str:dict[str:list]],
+                             **kwargs)->dict[str:dict]:
+    """Returns statistics with bootstrap confidence intervals from all population groups
+    of metric values for all performers
+
+    Args:
+        - results: {performer : {group : metric values}} from timings function
+        - kwargs: bootstrap_ci parameters
+
+    Returns:
+        {performer : {key : [n_elements, mean, q1, q2, q3, mini, maxi, stdev,
+                            mean_low, mean_high, median_low, median_high]}}
+    """
+    ci = bootstrap_ci(results, **kwargs)
+    stats = dict()
+    for p in results:
+        stats[p] = {k: tuple(v) + ci[p][k] for k, v in results_to_stats(results[p]).items()}
+    return stats
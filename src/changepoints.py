@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines tempo change-points detection (PELT with a linear-time Gaussian cost)
+on the per-bar tempo series of all performances
+"""
+
+import numpy as np
+import pandas as pd
+from src.data import PERFORMERS
+from src.events import performance_events
+from src.parallel import map_pool
+
+#####################################
+# parameters
+######################################
+
+# minimal number of bars of a segment of constant tempo
+MIN_SIZE = 2
+# penalty of a change-point, in units of noise variance times log(number of bars)
+PENALTY_FACTOR = 3.0
+
+
+#####################################
+# tempo series
+######################################
+
+def bars_tempi(events: pd.DataFrame)->pd.DataFrame:
+    """Returns the tempo of each bar of a performance from the sum of its IOIs
+
+    Args:
+        - events: events of a performance (see events.performance_events)
+
+    Returns:
+        dataframe with one row by bar: bar, movement, measure, repeated, quarters (score duration),
+        time (ms), tempo (quarter notes per minute)
+    """
+    bars = events.groupby('bar', sort=False).agg(movement=('movement', 'first'),
+                                                 measure=('measure', 'first'),
+                                                 repeated=('repeated', 'first'),
+                                                 quarters=('duration', 'sum'),
+                                                 time=('ioi', 'sum')).reset_index()
+    bars['tempo'] = 60000 * bars['quarters'] / bars['time']
+    return bars
+
+
+#####################################
+# PELT
+######################################
+
+def noise_variance(series: np.ndarray)->float:
+    """Robust estimate of the noise variance of a piecewise constant series,
+    from the median absolute deviation of its first differences
+
+    Args:
+        - series: values
+
+    Returns:
+        variance estimate
+    """
+    if len(series) < 3:
+        return 0.0
+    differences = np.diff(series)
+    mad = np.median(np.abs(differences - np.median(differences))) / 0.6745
+    return float(mad**2 / 2)
+
+
+def pelt(series: np.ndarray, penalty: float, min_size: int=MIN_SIZE)->list[int]:
+    """Pruned exact linear time segmentation minimising the sum of squared deviations
+    to the segments means plus a penalty by change-point
+
+    Args:
+        - series: values
+        - penalty: penalty of a change-point
+        - min_size: minimal length of a segment. Defaults to MIN_SIZE
+
+    Returns:
+        indexes starting a new segment (the first segment starting at 0 excluded)
+    """
+    n = len(series)
+    if n < 2 * min_size:
+        return []
+    s1 = np.concatenate(([0.0], np.cumsum(series)))
+    s2 = np.concatenate(([0.0], np.cumsum(series**2)))
+    best = np.full(n + 1, np.inf)
+    best[0] = -penalty
+    last = np.zeros(n + 1, dtype=np.int64)
+    candidates = np.zeros(0, dtype=np.int64)
+    for t in range(min_size, n + 1):
+        if np.isfinite(best[t - min_size]):
+            candidates = np.append(candidates, t - min_size)
+        lengths = t - candidates
+        costs = (best[candidates] + s2[t] - s2[candidates]
+                 - (s1[t] - s1[candidates])**2 / lengths)
+        i = int(np.argmin(costs + penalty))
+        best[t] = costs[i] + penalty
+        last[t] = candidates[i]
+        candidates = candidates[costs <= best[t]]
+    res = []
+    t = last[n]
+    while t > 0:
+        res.append(int(t))
+        t = last[t]
+    return res[::-1]
+
+
+#####################################
+# all performances
+######################################
+
+def performance_changepoints(performer: str, fantasia: int, penalty_factor: float=PENALTY_FACTOR,
+                             min_size: int=MIN_SIZE)->pd.DataFrame:
+    """Segments of constant tempo of each movement of a performance (unit of work of the process pool)
+
+    Args:
+        - performer: name of the performer
+        - fantasia: fantasia number
+        - penalty_factor: penalty in units of noise variance times log(number of bars).
+                          Defaults to PENALTY_FACTOR
+        - min_size: minimal number of bars of a segment. Defaults to MIN_SIZE
+
+    Returns:
+        dataframe with one row by segment: performer, fantasia, movement, start and end
+        (measure, repeated) positions, bars, tempo (mean of the segment in quarter notes per minute)
+    """
+    bars = bars_tempi(performance_events(performer, fantasia))
+    rows = []
+    # movements are the consecutive bars of the same movement in the sequences of measures performed
+    movement_starts = np.flatnonzero(np.diff(bars['movement'].to_numpy(), prepend=-1) != 0)
+    for start, end in zip(movement_starts, list(movement_starts[1:]) + [len(bars)]):
+        movement = bars.iloc[start:end]
+        # relative tempo changes: log tempo
+        series = np.log(movement['tempo'].to_numpy())
+        penalty = penalty_factor * max(noise_variance(series), 1e-6) * np.log(max(len(series), 2))
+        boundaries = [0] + pelt(series, penalty, min_size) + [len(series)]
+        for s, e in zip(boundaries[:-1], boundaries[1:]):
+            segment = movement.iloc[s:e]
+            rows.append({'performer': performer, 'fantasia': fantasia,
+                         'movement': int(segment['movement'].iloc[0]),
+                         'start': (int(segment['measure'].iloc[0]), int(segment['repeated'].iloc[0])),
+                         'end': (int(segment['measure'].iloc[-1]), int(segment['repeated'].iloc[-1])),
+                         'bars': len(segment),
+                         'tempo': float(60000 * segment['quarters'].sum() / segment['time'].sum())})
+    return pd.DataFrame(rows)
+
+
+def corpus_changepoints(performers: list[str]=None, fantasias: list[int]=None,
+                        penalty_factor: float=PENALTY_FACTOR, min_size: int=MIN_SIZE,
+                        workers: int=None)->pd.DataFrame:
+    """Segments of constant tempo of all performances, computed in a process pool
+
+    Args:
+        - performers: names of the performers. Defaults to None for all performers
+        - fantasias: fantasias numbers. Defaults to None for all fantasias
+        - penalty_factor: see performance_changepoints. Defaults to PENALTY_FACTOR
+        - min_size: minimal number of bars of a segment. Defaults to MIN_SIZE
+        - workers: number of processes. Defaults to None for the number of cpus
+
+    Returns:
+        concatenation of performance_changepoints; a change-point is the start of a segment
+        which is not the first of its movement
+    """
+    if performers == None:
+        performers = PERFORMERS
+    if fantasias == None:
+        fantasias = range(1, 13)
+    args = [(p, f, penalty_factor, min_size) for p in performers for f in fantasias]
+    return pd.concat(map_pool(performance_changepoints, args, workers=workers), ignore_index=True)
@@ -1,4 +1,5 @@
 import csv
+from src.pitches import add_pitch_columns
 
 ################
 # folders/files
@@ -358,6 +359,7 @@ def get_all_data(performer: str, fantasia: str)->list[dict[str:str]]:
         - 'movement'
         - 'measure'
         - 'repeated'
+        - 'midi', 'interval', 'voices_distance' (see pitches.add_pitch_columns)
     """
     data = []
     with open(f'{ALIGNMENTS}/{performer}/alignment_{fantasia}.csv', newline='') as csvfile:
@@ -374,6 +376,7 @@ def get_all_data(performer: str, fantasia: str)->list[dict[str:str]]:
                         'measure': row['Measure'],
                         'repeated': row['Repeated']
                         })
+    add_pitch_columns(data)
     return data
 
 
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines kernel density estimates of metric values distributions,
+computed for all groups at once by linear binning and Gaussian convolution via FFT
+"""
+
+import numpy as np
+from src.shared_cache import RESULTS
+
+#####################################
+# parameters
+######################################
+
+# number of points of each density curve
+N_POINTS = 256
+# values out of these percentiles don't stretch the grid of a category
+GRID_PERCENTILES = (0.1, 99.9)
+# grid margin on each side, in bandwidths
+GRID_MARGIN = 3
+
+
+#####################################
+# kernel density estimates
+######################################
+
+def silverman_bandwidth(values: np.ndarray)->float:
+    """Returns Silverman's rule of thumb bandwidth
+
+    Args:
+        - values: sample
+
+    Returns:
+        0.9 * min(std, IQR/1.34) * n^(-1/5), 0 if the sample is constant or empty
+    """
+    if len(values) < 2:
+        return 0.0
+    q1, q3 = np.percentile(values, [25, 75])
+    spread = min(np.std(values), (q3 - q1) / 1.34) or np.std(values)
+    return 0.9 * spread * len(values) ** (-0.2)
+
+
+def binned_kde(groups: list[np.ndarray], bounds: np.ndarray, bandwidths: np.ndarray,
+               n_points: int=N_POINTS)->tuple[np.ndarray, np.ndarray]:
+    """Gaussian kernel density estimates of several groups in one batch:
+    each group is linearly binned once on its grid, then all groups are convolved
+    with their Gaussian kernel by multiplication in the Fourier domain
+
+    Args:
+        - groups: samples
+        - bounds: (lower, upper) bounds of the grid of each group, shape (number of groups, 2)
+        - bandwidths: bandwidth of each group
+        - n_points: number of points of each grid. Defaults to N_POINTS
+
+    Returns:
+        (coords, densities) arrays (number of groups, n_points)
+    """
+    n_groups = len(groups)
+    sizes = np.array([len(g) for g in groups])
+    coords = np.linspace(bounds[:, 0], bounds[:, 1], n_points, axis=1)
+    step = (bounds[:, 1] - bounds[:, 0]) / (n_points - 1)
+    if sizes.sum() == 0:
+        return coords, np.zeros((n_groups, n_points))
+    owner = np.repeat(np.arange(n_groups), sizes)
+    values = np.concatenate(groups)
+    # linear binning: each value is shared between its two neighbouring grid points
+    position = np.clip((values - bounds[owner, 0]) / step[owner], 0, n_points - 1)
+    left = np.minimum(position.astype(np.int64), n_points - 2)
+    right_weight = position - left
+    flat = owner * n_points + left
+    counts = (np.bincount(flat, weights=1 - right_weight, minlength=n_groups * n_points)
+              + np.bincount(flat + 1, weights=right_weight, minlength=n_groups * n_points))
+    counts = counts.reshape(n_groups, n_points)
+    # zero padding avoids wrapping the tails around the grid
+    size = 1 << int(np.ceil(np.log2(2 * n_points)))
+    frequencies = np.fft.rfftfreq(size)
+    sigma = bandwidths / step
+    kernels = np.exp(-2 * (np.pi * frequencies[None, :] * sigma[:, None]) ** 2)
+    smoothed = np.fft.irfft(np.fft.rfft(counts, n=size, axis=1) * kernels, n=size, axis=1)[:, :n_points]
+    densities = np.maximum(smoothed, 0) / (np.maximum(sizes, 1) * step)[:, None]
+    return coords, densities
+
+
+def category_bounds(samples: list[np.ndarray], bandwidths: np.ndarray)->tuple[float, float]:
+    """Returns the grid bounds shared by all performers for a category
+
+    Args:
+        - samples: metric values of each performer
+        - bandwidths: bandwidths of each performer
+
+    Returns:
+        (lower, upper) bounds
+    """
+    pooled = np.concatenate(samples) if len(samples) > 0 else np.zeros(0)
+    if len(pooled) == 0:
+        return -1.0, 1.0
+    lower, upper = np.percentile(pooled, GRID_PERCENTILES)
+    margin = GRID_MARGIN * max(bandwidths.max(), 1e-6)
+    return lower - margin, upper + margin
+
+
+#####################################
+# cached densities
+######################################
+
+def density_key(scope: str, performers: tuple[str], metric: str, category: str, n_points: int)->tuple:
+    """Key of the density curves of a category in the cache of the server: the grid bounds
+    being shared by the performers, the curves depend on the set of performers
+
+    Args:
+        - scope: name of the selection the results come from
+        - performers: names of the performers
+        - metric: metric name
+        - category: category
+        - n_points: number of points of each curve
+
+    Returns:
+        key
+    """
+    return ('density', scope, tuple(sorted(performers)), metric, category, n_points)
+
+
+def densities(results: dict[str:dict[str:list]], metric: str, scope: str='corpus',
+              categories: list[str]=None, n_points: int=N_POINTS)->dict[str:dict[str:tuple]]:
+    """Returns density curves of the selected categories for all performers,
+    missing curves being computed in one batch and cached with the shared results (see shared_cache)
+
+    Args:
+        - results: {performer : {group : metric values}} from timings function
+        - metric: metric name
+        - scope: name of the selection the results come from (corpus, fugatos, a type of movement...).
+                 Defaults to 'corpus'
+        - categories: selected categories. Defaults to None for all categories
+        - n_points: number of points of each curve. Defaults to N_POINTS
+
+    Returns:
+        {performer : {category : (coords, density)}}
+    """
+    performers = list(results.keys())
+    if categories == None:
+        categories = list(results[performers[0]].keys())
+    # {category : {performer : (coords, density)}}
+    curves = {c: RESULTS.get(density_key(scope, performers, metric, c, n_points)) for c in categories}
+    missing = [c for c in categories if curves[c] == None]
+    if len(missing) > 0:
+        groups, bounds, bandwidths, keys = [], [], [], []
+        for c in missing:
+            samples = [np.asarray(results[p][c], dtype=float) for p in performers]
+            bw = np.array([silverman_bandwidth(s) for s in samples])
+            lower, upper = category_bounds(samples, bw)
+            # degenerate samples get a kernel of one grid step
+            bw = np.where(bw > 0, bw, (upper - lower) / n_points)
+            for p, s, b in zip(performers, samples, bw):
+                groups.append(s)
+                bounds.append((lower, upper))
+                bandwidths.append(b)
+                keys.append((c, p))
+        coords, dens = binned_kde(groups, np.array(bounds), np.array(bandwidths), n_points)
+        for c in missing:
+            curves[c] = dict()
+        for i, (c, p) in enumerate(keys):
+            curves[c][p] = (coords[i], dens[i])
+        for c in missing:
+            RESULTS.put(density_key(scope, performers, metric, c, n_points), curves[c])
+    return {p: {c: curves[c][p] for c in categories} for p in performers}
+
+
+def violin_stats(values: list[float], curve: tuple[np.ndarray, np.ndarray],
+                 scale: float=1.0)->dict:
+    """Returns the statistics used by matplotlib violin plots from a precomputed density curve
+
+    Args:
+        - values: metric values of the group
+        - curve: (coords, density) of the group
+        - scale: scale of the values (100 for percentages). Defaults to 1.0
+
+    Returns:
+        dictionnary with keys coords, vals, mean, median, min, max
+    """
+    coords, density = curve
+    values = np.asarray(values, dtype=float) * scale
+    if len(values) == 0:
+        values = np.zeros(1)
+    return {'coords': coords * scale, 'vals': density / scale,
+            'mean': float(np.mean(values)), 'median': float(np.median(values)),
+            'min': float(np.min(values)), 'max': float(np.max(values))}
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 from src.data import *
+from src.parallel import checkpoint
 from functools import reduce
 from fractions import Fraction
 from math import modf
@@ -535,8 +536,57 @@ def get_binary_eight_not_interleaved_indexes(data: list[dict[str:str]],
 # performances analyse
 ##########################################
 
+def get_interval_indexes(data: list[dict[str:str]], low: int, high: int=None, 
+                         direction: int=None)-> list[int]:
+    """Returns indexes of notes according to the size and the direction of their melodic interval
+    from the previous note (see pitches.add_pitch_columns)
+
+    Args:
+        - data
+        - low: smallest interval size in semitones
+        - high: largest interval size in semitones. Defaults to None for no limit
+        - direction: 1 if ascending, -1 if descending. Defaults to None for both
+
+    Returns:
+       indexes of chosen notes
+    """
+    indexes=[]
+    for i in range(len(data)):
+        if data[i].get('interval', '') == '':
+            continue
+        interval = int(data[i]['interval'])
+        if (abs(interval) >= low and (high == None or abs(interval) <= high)
+            and (direction == None or interval*direction > 0)):
+            indexes.append(i)
+    return indexes
+
+
+def get_voices_distance_indexes(data: list[dict[str:str]], low: int, high: int=None)-> list[int]:
+    """Returns indexes of notes of the upper or lower voice according to their register distance
+    to the last note of the other voice (see pitches.add_pitch_columns)
+
+    Args:
+        - data
+        - low: smallest distance in semitones
+        - high: largest distance in semitones. Defaults to None for no limit
+
+    Returns:
+       indexes of chosen notes
+    """
+    indexes=[]
+    for i in range(len(data)):
+        if data[i].get('voices_distance', '') == '':
+            continue
+        distance = abs(int(data[i]['voices_distance']))
+        if distance >= low and (high == None or distance <= high):
+            indexes.append(i)
+    return indexes
+
+
 def  get_all_metric_and_data_for_one_performer(performer:str, metric:str, 
-                                               f: int=None, fugato=False, movement_name: str=None)->tuple[list,list]:
+                                               f: int=None, fugato=False, movement_name: str=None,
+                                               measures: set[tuple[int, int, int]]=None,
+                                               loaded: dict[int:list[dict]]=None)->tuple[list,list]:
     """Returns (metric_data sequence , data sequence)
 
     Args:
@@ -545,6 +595,9 @@ def  get_all_metric_and_data_for_one_performer(performer:str, metric:str,
         - f: number of a fantasia. Defaults to None for all fantasias
         - fugato : True if only fugatos movements, False otherwise
         - movement_name : name of a specific movement. Defaults to None if all type movements
+        - measures : (fantasia, measure, repeated) selected. Defaults to None if all measures
+        - loaded : {fantasia : data} already read by get_all_data, other fantasias being skipped.
+                   Defaults to None to read all fantasias
 
     Returns:
         (metric_data, data) for all fantasias respecting the scale of a measure
@@ -556,7 +609,11 @@ def  get_all_metric_and_data_for_one_performer(performer:str, metric:str,
     else:
         f_start, f_end = f, f+1
     for fantasia in range(f_start, f_end):
-        data = get_all_data(performer, fantasia)
+        if loaded != None and fantasia not in loaded:
+            continue
+        # pause point of background computations (see parallel.background)
+        checkpoint()
+        data = loaded[fantasia] if loaded != None else get_all_data(performer, fantasia)
         # filtered grace notes and movements separations (rests not written)
         datafiltered= [d for d in data if float(d['duration'])!=0.0]
         if movement_name!=None:    
@@ -574,6 +631,8 @@ def  get_all_metric_and_data_for_one_performer(performer:str, metric:str,
             elif s==e==r==0:
                 break
             for m in range(s, e+1):
+                if measures!=None and (fantasia, m, r) not in measures:
+                    continue
                 measurefiltered = [d for d in datafiltered if (int(d['measure'])== m and int(d['repeated'])== r)]
                 if len(measurefiltered)==0:
                     continue
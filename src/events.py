@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the table of events (notes and rests) of the performances,
+following the sequences of measures performed, with positions in the bars
+and both metrics computed with vectorised operations
+"""
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from src.data import *
+
+#####################################
+# columns
+######################################
+
+# beat denominators by number of beats in a bar (see durations_analyse_tools.beat_indexes)
+BEATS_DENOMINATORS = {2: (1, 2), 3: (1, 3), 4: (1, 2, 4), 6: (1, 2), 9: (1, 3), 12: (1, 2, 4)}
+
+
+def fraction_denominators(x: np.ndarray, max_denominator: int=100)->np.ndarray:
+    """Denominators of the closest fractions of values in [0;1[ (as Fraction.limit_denominator)
+
+    Args:
+        - x: values
+        - max_denominator: largest denominator. Defaults to 100
+
+    Returns:
+        smallest denominator d such that x*d is an integer (max_denominator if none)
+    """
+    res = np.full(len(x), max_denominator)
+    for d in range(max_denominator, 0, -1):
+        scaled = x * d
+        res[np.abs(scaled - np.round(scaled)) < 1e-6] = d
+    return res
+
+
+def plan_indexes(data: pd.DataFrame, measures_sequences: tuple)->tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Indexes of events following the sequences of measures performed
+
+    Args:
+        - data: events of a performance
+        - measures_sequences: (start, end, repeated) sequences (see MEASURES_BY_PERFORMERS)
+
+    Returns:
+        (rows, bars, steps): row of each event in data, running number of its bar in the performance
+        and number of its sequence
+    """
+    groups = data.groupby(['measure', 'repeated'], sort=False).indices
+    rows, bars, steps = [], [], []
+    bar = 0
+    for i in range(len(measures_sequences)):
+        s, e, r = measures_sequences[i]
+        if e == None:
+            e = s
+        elif s == e == r == 0:
+            break
+        for m in range(s, e+1):
+            if (m, r) not in groups:
+                continue
+            rows.append(groups[(m, r)])
+            bars.append(np.full(len(groups[(m, r)]), bar))
+            steps.append(np.full(len(groups[(m, r)]), i))
+            bar += 1
+    if len(rows) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(bars), np.concatenate(steps)
+
+
+#####################################
+# events tables
+######################################
+
+def performance_events(performer: str, fantasia: int, fugato: bool=False,
+                       movement_name: str=None)->pd.DataFrame:
+    """Returns the events of one performance in the order of the sequences of measures performed
+    (grace notes and movements separations filtered), as get_all_metric_and_data_for_one_performer
+
+    Args:
+        - performer: name of the performer
+        - fantasia: fantasia number
+        - fugato: True if only fugatos movements, False otherwise. Defaults to False
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+
+    Returns:
+        dataframe with columns performer, fantasia, movement, movement_name, measure, repeated,
+        step (number of the sequence of measures), bar (running number of the bar),
+        pitchname, voice, duration, time_signature, onset, ioi, midi, interval, voices_distance
+        (nan if undefined, see pitches.add_pitch_columns), position (fraction of the bar),
+        beat ('first', 'on', 'off'), bar_ioi (bar time duration in ms), metronomic_ioi,
+        deltaioi, deltaonset
+    """
+    data = pd.DataFrame(get_all_data(performer, fantasia))
+    data = data[data['duration'].astype(float) != 0.0]
+    if movement_name != None:
+        movements = MOVEMENTS_POSITIONS[movement_name].get(fantasia, [])
+        data = data[data['movement'].astype(int).isin(movements)]
+    data = data.astype({'movement': int, 'measure': int, 'repeated': int,
+                        'duration': float, 'onset': float, 'ioi': float})
+    for c in ['midi', 'interval', 'voices_distance']:
+        data[c] = pd.to_numeric(data[c], errors='coerce')
+    if not fugato:
+        measures_sequences = MEASURES_BY_PERFORMERS[performer][fantasia]
+    else:
+        measures_sequences = MEASURES_FUGATOS_BY_PERFORMERS[performer][fantasia]
+    rows, bars, steps = plan_indexes(data, measures_sequences)
+    events = data.iloc[rows].reset_index(drop=True)
+    events.insert(0, 'performer', performer)
+    events['movement_name'] = [MOVEMENTS_NAMES_BY_FANTASIA[fantasia][m-1] for m in events['movement']]
+    events['step'] = steps
+    events['bar'] = bars
+    if len(events) == 0:
+        for c in ['position', 'beat', 'bar_ioi', 'metronomic_ioi', 'deltaioi', 'deltaonset']:
+            events[c] = []
+        return events
+    ioi = events['ioi'].to_numpy()
+    duration = events['duration'].to_numpy()
+    onset = events['onset'].to_numpy()
+    first = np.flatnonzero(np.diff(bars, prepend=-1) != 0)
+    # metronomic ioi: bar time duration shared according to score durations
+    bar_ioi = np.bincount(bars, weights=ioi)[bars]
+    bar_quarters = np.bincount(bars, weights=duration)[bars]
+    metronomic_ioi = duration * bar_ioi / bar_quarters
+    # metronomic onsets start with the first real onset of the bar
+    elapsed = np.cumsum(metronomic_ioi) - metronomic_ioi
+    metronomic_onset = onset[first][bars] + elapsed - elapsed[first][bars]
+    # positions in bars
+    quarters = np.cumsum(duration) - duration
+    signatures = events['time_signature'].str.split('/', expand=True).astype(int).to_numpy()
+    measure_quarters = (4 * signatures[:, 0] / signatures[:, 1])[first][bars]
+    beats = signatures[:, 0]
+    position = (quarters - quarters[first][bars]) / measure_quarters
+    denominators = fraction_denominators(position % 1)
+    on = np.array([d in BEATS_DENOMINATORS[b] for d, b in zip(denominators, beats)], dtype=bool)
+    events['position'] = position
+    events['beat'] = np.where(denominators == 1, 'first', np.where(on, 'on', 'off'))
+    events['bar_ioi'] = bar_ioi
+    events['metronomic_ioi'] = metronomic_ioi
+    events['deltaioi'] = (ioi - metronomic_ioi) / bar_ioi
+    events['deltaonset'] = (onset - metronomic_onset) / bar_ioi
+    return events
+
+
+@lru_cache(maxsize=32)
+def corpus_events(performers: tuple[str]=None, fantasias: tuple[int]=None,
+                  fugato: bool=False, movement_name: str=None)->pd.DataFrame:
+    """Returns the events of all selected performances (cached, not to be modified)
+
+    Args:
+        - performers: names of the performers. Defaults to None for all performers
+        - fantasias: fantasias numbers. Defaults to None for all fantasias
+        - fugato: True if only fugatos movements, False otherwise. Defaults to False
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+
+    Returns:
+        concatenation of performance_events
+    """
+    if performers == None:
+        performers = tuple(PERFORMERS)
+    if fantasias == None:
+        fantasias = tuple(range(1, 13))
+    tables = [performance_events(p, f, fugato, movement_name) for p in performers for f in fantasias]
+    return pd.concat(tables, ignore_index=True)
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines a linear model of timing deviations (ΔIOI, Δo) explained by categorical
+factors of the events (performer, voice, beat position, duration, meter, type of movement)
+and their interactions, fitted by least squares with optional robust Huber reweighting
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.stats import t as student
+from src.durations_analyse_tools import BINARY_TS, TERNARY_TS, COMPOUND_TS
+from src.events import corpus_events
+
+#####################################
+# parameters
+######################################
+
+FACTORS = ('performer', 'voice', 'beat', 'duration', 'meter', 'movement_name')
+# voices with paper notation
+VOICES = {'u': 'u', 'b': 'b', 'B': 'B', 's': 'B', 't': 'B', 'm': 'm', 'x': 'x', '.': 'rest'}
+# durations with less events are gathered in the level 'other'
+MIN_LEVEL_COUNT = 50
+# Huber tuning constant (95% efficiency for normal errors)
+HUBER_K = 1.345
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-8
+
+
+#####################################
+# design matrix
+######################################
+
+def model_frame(events: pd.DataFrame, factors: tuple[str]=FACTORS)->pd.DataFrame:
+    """Returns the categorical factors of the events as strings
+
+    Args:
+        - events: events table (see events.corpus_events)
+        - factors: factors names. Defaults to FACTORS
+
+    Returns:
+        dataframe with a column by factor
+    """
+    frame = pd.DataFrame(index=events.index)
+    for f in factors:
+        if f == 'voice':
+            frame[f] = events['voice'].map(VOICES).fillna('x')
+        elif f == 'meter':
+            ts = events['time_signature']
+            frame[f] = np.where(ts.isin(BINARY_TS), 'binary',
+                                np.where(ts.isin(TERNARY_TS), 'ternary',
+                                         np.where(ts.isin(COMPOUND_TS), 'compound', 'other')))
+        elif f == 'duration':
+            durations = events['duration'].astype(str)
+            counts = durations.value_counts()
+            frame[f] = durations.where(durations.map(counts) >= MIN_LEVEL_COUNT, 'other')
+        else:
+            frame[f] = events[f].astype(str)
+    return frame
+
+
+def design_matrix(frame: pd.DataFrame,
+                  interactions: tuple[tuple[str, str]]=())->tuple[sparse.csr_matrix, list[str]]:
+    """Sparse treatment-coded design matrix: intercept, one column by non reference level
+    of each factor (the reference being its most frequent level) and one column by pair
+    of non reference levels of each interaction
+
+    Args:
+        - frame: categorical factors (see model_frame)
+        - interactions: pairs of factors. Defaults to ()
+
+    Returns:
+        (design matrix, names of the columns)
+    """
+    n = len(frame)
+    names = ['intercept']
+    rows, cols = [np.arange(n)], [np.zeros(n, dtype=np.int64)]
+    codes = dict()
+    for f in frame.columns:
+        levels = list(frame[f].value_counts().index)
+        code = pd.Categorical(frame[f], categories=levels).codes
+        codes[f] = (code, levels)
+        selected = np.flatnonzero(code > 0)
+        rows.append(selected)
+        cols.append(len(names) + code[selected] - 1)
+        names += [f"{f}[{l}]" for l in levels[1:]]
+    for f1, f2 in interactions:
+        (c1, l1), (c2, l2) = codes[f1], codes[f2]
+        selected = np.flatnonzero((c1 > 0) & (c2 > 0))
+        pair = (c1[selected] - 1) * (len(l2) - 1) + c2[selected] - 1
+        rows.append(selected)
+        cols.append(len(names) + pair)
+        names += [f"{f1}[{a}]:{f2}[{b}]" for a in l1[1:] for b in l2[1:]]
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    x = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, len(names)))
+    # combinations of levels never observed are removed
+    used = np.flatnonzero(np.asarray(x.sum(axis=0)).ravel() > 0)
+    return x[:, used], [names[i] for i in used]
+
+
+#####################################
+# fits
+######################################
+
+def weighted_fit(x: sparse.csr_matrix, y: np.ndarray,
+                 weights: np.ndarray)->tuple[np.ndarray, np.ndarray]:
+    """Weighted least squares from the normal equations (pseudo-inverse if rank deficient)
+
+    Args:
+        - x: design matrix
+        - y: responses, shape (n, number of responses)
+        - weights: weights of the events, shape (n, number of responses)
+
+    Returns:
+        (coefficients, covariance of each response): shapes (p, responses), (responses, p, p)
+    """
+    n, p = x.shape
+    coefs = np.zeros((p, y.shape[1]))
+    covariances = np.zeros((y.shape[1], p, p))
+    for j in range(y.shape[1]):
+        xw = x.multiply(weights[:, j:j+1]).tocsr()
+        inverse = np.linalg.pinv((xw.T @ x).toarray())
+        coefs[:, j] = inverse @ (xw.T @ y[:, j])
+        residuals = y[:, j] - x @ coefs[:, j]
+        sigma2 = np.sum(weights[:, j] * residuals**2) / max(1, n - p)
+        covariances[j] = sigma2 * inverse
+    return coefs, covariances
+
+
+def huber_weights(residuals: np.ndarray)->np.ndarray:
+    """Huber weights of residuals scaled by their median absolute deviation
+
+    Args:
+        - residuals: residuals, shape (n, number of responses)
+
+    Returns:
+        weights in ]0;1]
+    """
+    mad = np.median(np.abs(residuals - np.median(residuals, axis=0)), axis=0) / 0.6745
+    scaled = np.abs(residuals) / np.where(mad > 0, mad, 1)
+    return np.where(scaled <= HUBER_K, 1.0, HUBER_K / np.maximum(scaled, 1e-12))
+
+
+def fit_timing_model(events: pd.DataFrame=None, metrics: tuple[str]=('deltaioi', 'deltaonset'),
+                     factors: tuple[str]=FACTORS, interactions: tuple[tuple[str, str]]=(),
+                     robust: bool=False, rest_filtered: bool=True)->dict[str:pd.DataFrame]:
+    """Fits the metrics of the events on categorical factors and returns coefficients tables
+
+    Args:
+        - events: events table. Defaults to None for all events of the corpus
+        - metrics: explained metrics. Defaults to ('deltaioi', 'deltaonset')
+        - factors: factors names. Defaults to FACTORS
+        - interactions: pairs of factors, for instance (('performer', 'voice'),). Defaults to ()
+        - robust: True for Huber iteratively reweighted least squares. Defaults to False
+        - rest_filtered: True if rests are removed. Defaults to True
+
+    Returns:
+        {metric : dataframe indexed by terms with columns N (events), coef, std err, t, p}
+    """
+    if events is None:
+        events = corpus_events()
+    if rest_filtered:
+        events = events[events['voice'] != '.']
+    x, names = design_matrix(model_frame(events, factors), interactions)
+    y = events[list(metrics)].to_numpy(dtype=float)
+    weights = np.ones_like(y)
+    coefs, covariances = weighted_fit(x, y, weights)
+    if robust:
+        for _ in range(MAX_ITERATIONS):
+            weights = huber_weights(y - x @ coefs)
+            previous = coefs
+            coefs, covariances = weighted_fit(x, y, weights)
+            if np.max(np.abs(coefs - previous)) < TOLERANCE:
+                break
+    counts = np.asarray(x.sum(axis=0)).ravel().astype(int)
+    df = max(1, x.shape[0] - x.shape[1])
+    res = dict()
+    for j, metric in enumerate(metrics):
+        std_err = np.sqrt(np.maximum(np.diag(covariances[j]), 0))
+        tvalues = np.divide(coefs[:, j], std_err, out=np.zeros_like(std_err), where=std_err > 0)
+        res[metric] = pd.DataFrame({'N': counts, 'coef': coefs[:, j], 'std err': std_err,
+                                    't': tvalues, 'p': 2 * student.sf(np.abs(tvalues), df)},
+                                   index=names)
+    return res
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines an index of the melodic motifs of the corpus: transposition invariant
+n-grams of intervals and score durations are hashed to posting lists of their occurrences,
+so that the timings of all recurrences of a motif are compared in bulk
+"""
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from src.events import corpus_events
+from src.pitches import pitch_numbers, REST
+
+#####################################
+# parameters
+######################################
+
+# number of notes of the indexed motifs
+MOTIF_NOTES = 4
+# durations tokens: number of divisions of a quarter note (sixteenths, triplets, thirty-seconds)
+DURATION_DIVISIONS = 48
+HASH_MULTIPLIER = np.uint64(1000003)
+
+
+#####################################
+# index
+######################################
+
+def hash_tokens(tokens: np.ndarray)->np.ndarray:
+    """Polynomial hashes of rows of integer tokens
+
+    Args:
+        - tokens: array (n, length)
+
+    Returns:
+        uint64 hashes
+    """
+    h = np.zeros(len(tokens), dtype=np.uint64)
+    for k in range(tokens.shape[1]):
+        h = h * HASH_MULTIPLIER + tokens[:, k].astype(np.uint64)
+    return h
+
+
+class MotifIndex:
+    """Interval and rhythm n-grams of the notes of the corpus with hashed posting lists
+
+    Attributes:
+        - notes: notes of the events table (rests removed)
+        - n: number of notes of the motifs
+        - starts: rows in notes of the indexed motifs (n consecutive notes without rest
+                  in one movement of a performance)
+        - tokens: array (motifs, 2n-1) of intervals then durations tokens
+        - hashes: sorted hashes of the motifs
+        - postings: rows in starts in the order of hashes
+    """
+
+    def __init__(self, events: pd.DataFrame, n: int=MOTIF_NOTES):
+        self.n = n
+        rows = np.flatnonzero((events['voice'] != '.').to_numpy() & (events['pitchname'] != '0').to_numpy())
+        self.notes = events.iloc[rows].reset_index(drop=True)
+        midi = pitch_numbers(self.notes['pitchname'].to_numpy())
+        durations = np.round(self.notes['duration'].to_numpy() * DURATION_DIVISIONS).astype(np.int64)
+        performances = (self.notes['performer'].astype(str) + '/' + self.notes['fantasia'].astype(str)
+                        + '/' + self.notes['movement'].astype(str)).to_numpy()
+        # consecutive notes: consecutive events of the same movement of a performance
+        linked = np.append((np.diff(rows) == 1) & (performances[1:] == performances[:-1]) & (midi[1:] != REST)
+                           & (midi[:-1] != REST), False)
+        count = max(0, len(rows) - n + 1)
+        valid = np.ones(count, dtype=bool)
+        for k in range(n - 1):
+            valid &= linked[k:k+count]
+        self.starts = np.flatnonzero(valid)
+        intervals = np.stack([midi[self.starts + k + 1] - midi[self.starts + k] for k in range(n - 1)], axis=1)
+        rhythm = np.stack([durations[self.starts + k] for k in range(n)], axis=1)
+        self.tokens = np.concatenate([intervals, rhythm], axis=1) if len(self.starts) \
+            else np.zeros((0, 2 * n - 1), dtype=np.int64)
+        hashes = hash_tokens(self.tokens)
+        order = np.argsort(hashes, kind='stable')
+        self.hashes = hashes[order]
+        self.postings = order
+
+    def motif_key(self, intervals: list[int], durations: list[float])->np.ndarray:
+        """Tokens of a motif
+
+        Args:
+            - intervals: n-1 melodic intervals in semitones
+            - durations: n score durations in quarter notes
+
+        Returns:
+            tokens (2n-1)
+        """
+        return np.array(list(intervals) + [round(d * DURATION_DIVISIONS) for d in durations], dtype=np.int64)
+
+    def lookup(self, intervals: list[int], durations: list[float])->np.ndarray:
+        """Rows in notes of the first note of each occurrence of a motif
+
+        Args:
+            - intervals: n-1 melodic intervals in semitones
+            - durations: n score durations in quarter notes
+
+        Returns:
+            sorted rows
+        """
+        key = self.motif_key(intervals, durations)
+        value = hash_tokens(key[None, :])[0]
+        start = np.searchsorted(self.hashes, value, side='left')
+        end = np.searchsorted(self.hashes, value, side='right')
+        candidates = self.postings[start:end]
+        # hash collisions
+        candidates = candidates[np.all(self.tokens[candidates] == key, axis=1)]
+        return np.sort(self.starts[candidates])
+
+    def recurrences(self, min_count: int=2)->pd.DataFrame:
+        """Motifs of the index sorted by decreasing number of occurrences
+
+        Args:
+            - min_count: smallest number of occurrences. Defaults to 2
+
+        Returns:
+            dataframe with columns intervals, durations (quarter notes), occurrences
+        """
+        unique, counts = np.unique(self.tokens, axis=0, return_counts=True)
+        selected = np.flatnonzero(counts >= min_count)
+        selected = selected[np.argsort(counts[selected], kind='stable')[::-1]]
+        return pd.DataFrame({'intervals': [tuple(unique[i, :self.n-1]) for i in selected],
+                             'durations': [tuple(unique[i, self.n-1:] / DURATION_DIVISIONS) for i in selected],
+                             'occurrences': counts[selected]})
+
+
+@lru_cache(maxsize=8)
+def motif_index(n: int=MOTIF_NOTES, fugato: bool=False, movement_name: str=None)->MotifIndex:
+    """Motif index of the corpus (cached)
+
+    Args:
+        - n: number of notes of the motifs. Defaults to MOTIF_NOTES
+        - fugato: True if only fugatos movements, False otherwise. Defaults to False
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+
+    Returns:
+        MotifIndex
+    """
+    return MotifIndex(corpus_events(fugato=fugato, movement_name=movement_name), n)
+
+
+#####################################
+# queries
+######################################
+
+def motif_occurrences(intervals: list[int], durations: list[float],
+                      metrics: tuple[str]=('deltaioi', 'deltaonset'),
+                      index: MotifIndex=None)->tuple[pd.DataFrame, dict[str:np.ndarray]]:
+    """Every occurrence of a motif in the corpus with the aligned metrics of its notes
+
+    Args:
+        - intervals: n-1 melodic intervals in semitones, for instance (2, 2, -4)
+        - durations: n score durations in quarter notes, for instance (0.25, 0.25, 0.25, 0.25)
+        - metrics: metrics names. Defaults to ('deltaioi', 'deltaonset')
+        - index: motif index with motifs of n notes. Defaults to None for the whole corpus
+
+    Returns:
+        (occurrences, values): dataframe of performer, fantasia, movement_name, measure, repeated,
+        position and pitchname of the first note of each occurrence, and {metric : array (occurrences, n)}
+    """
+    if index == None:
+        index = motif_index(len(durations))
+    starts = index.lookup(intervals, durations)
+    rows = starts[:, None] + np.arange(index.n)[None, :]
+    occurrences = index.notes.iloc[starts][['performer', 'fantasia', 'movement_name', 'measure',
+                                            'repeated', 'position', 'pitchname']].reset_index(drop=True)
+    values = {m: index.notes[m].to_numpy()[rows] for m in metrics}
+    return occurrences, values
@@ -1,13 +1,99 @@
 # -*- coding: utf-8 -*-
 
 """
-This module defines music21 tools to analyse a score
+This module defines music21 tools to analyse a score, parsed scores being cached
+on disk (frozen scores invalidated by the MXL modification time) and in memory
 """
 
+from __future__ import annotations
+import copy
+import os
+from functools import lru_cache
+from src import lazy_import
 from src.data import MXLS
-from music21 import converter, stream
 
-    
+# music21 imported at the first parsed score
+converter = lazy_import('music21.converter')
+stream = lazy_import('music21.stream')
+
+# folder of the frozen parsed scores
+SCORES_CACHE = "data/cache/scores"
+
+
+#############################################
+# parsed scores cache
+#############################################
+
+def frozen_score_path(n: int, mtime: float)-> str:
+    """Returns the path of the frozen parsed score of a fantasia
+
+    Args:
+        - n: fantasia number
+        - mtime: modification time of the MXL file
+
+    Returns:
+        absolute path of the pickle file (relative paths are in the music21 scratch folder)
+    """
+    return os.path.abspath(f"{SCORES_CACHE}/fantasia{n}_{int(mtime * 1000)}.p")
+
+
+@lru_cache(maxsize=12)
+def load_score(n: int, mtime: float)-> stream.Score:
+    """Returns the parsed score of a fantasia, thawed from disk if frozen, parsed and frozen otherwise
+    (frozen scores of previous versions of the MXL file being removed)
+
+    Args:
+        - n: fantasia number
+        - mtime: modification time of the MXL file (key of the caches)
+
+    Returns:
+        music21 Score (cached, not to be modified)
+    """
+    path = frozen_score_path(n, mtime)
+    if os.path.exists(path):
+        try:
+            return converter.thaw(path)
+        except Exception:
+            os.remove(path)
+    parsed: stream.Score = converter.parse(MXLS[n])
+    os.makedirs(SCORES_CACHE, exist_ok=True)
+    for f in os.listdir(SCORES_CACHE):
+        if f.startswith(f"fantasia{n}_"):
+            os.remove(f"{SCORES_CACHE}/{f}")
+    converter.freeze(parsed, fp=path)
+    return parsed
+
+
+def parsed_score(n: int)-> stream.Score:
+    """Returns the parsed score of a fantasia from the caches
+
+    Args:
+        - n: fantasia number
+
+    Returns:
+        music21 Score (cached, not to be modified)
+    """
+    return load_score(n, os.path.getmtime(MXLS[n]))
+
+
+@lru_cache(maxsize=128)
+def score_slice(n: int, mtime: float, start: int, end: int)-> stream.Score:
+    """Returns a slice of the parsed score of a fantasia (cached)
+
+    Args:
+        - n: fantasia number
+        - mtime: modification time of the MXL file (key of the caches)
+        - start: starting measure index
+        - end: last measure index
+
+    Returns:
+        music21 Score (cached, not to be modified)
+    """
+    # indicesindicesNotNumbers to avoid the same numbers in an other movement
+    # range (start, end) inclusive
+    return load_score(n, mtime).measures(start, end, indicesNotNumbers=True)
+
+
 #############################################
 # score converter
 #############################################   
@@ -20,10 +106,7 @@ def score(n: int, start: int, end: int)-> stream.Score:
         - end: last measure number
 
     Returns:
-        music21 Score
+        music21 Score (copy of the cached slice, free to be modified)
     """
-    score: stream.Score = converter.parse(MXLS[n])
-    xml_data: stream.Score = score.measures(start, end, indicesNotNumbers=True) 
-    # indicesindicesNotNumbers to avoid the same numbers in an other movement
-    # range (start, end) inclusive
+    xml_data: stream.Score = copy.deepcopy(score_slice(n, os.path.getmtime(MXLS[n]), start, end))
     return xml_data
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines a detector of suspect alignment points: the same score event is aligned
+across the performances of a fantasia and its ΔIOI is compared (robust z-scores with median/MAD)
+to the other performers and to the neighbouring events of its performance
+"""
+
+import numpy as np
+import pandas as pd
+from src.events import corpus_events
+
+#####################################
+# parameters
+######################################
+
+# events on each side of the local window
+LOCAL_WINDOW = 8
+# minimal number of performances of a score event to compare performers
+MIN_PERFORMERS = 3
+# events with both robust z-scores above the threshold are reported
+THRESHOLD = 3.5
+# MAD of a normal distribution
+MAD_SCALE = 1.4826
+# lower bound of the MAD (fraction of bar duration), avoiding infinite scores for identical values
+MIN_MAD = 0.01
+
+
+#####################################
+# robust z-scores
+######################################
+
+def score_event_keys(events: pd.DataFrame)->pd.DataFrame:
+    """Returns the score event key of the events: fantasia, measure, repeated and number of the note
+    in the measure (first occurrence kept if a measure is played twice with the same repeat number)
+
+    Args:
+        - events: events table (see events.corpus_events)
+
+    Returns:
+        events with a column note
+    """
+    events = events.copy()
+    events['note'] = events.groupby(['performer', 'fantasia', 'step', 'measure', 'repeated']).cumcount()
+    return events.drop_duplicates(['performer', 'fantasia', 'measure', 'repeated', 'note'])
+
+
+def cross_performers_z(events: pd.DataFrame, metric: str='deltaioi')->np.ndarray:
+    """Robust z-scores of the events compared to the other performances of the same score event
+
+    Args:
+        - events: events with score event keys (see score_event_keys)
+        - metric: metric name. Defaults to 'deltaioi'
+
+    Returns:
+        z-scores (nan if less than MIN_PERFORMERS performances)
+    """
+    keys = ['fantasia', 'measure', 'repeated', 'note']
+    matrix = events.set_index(keys + ['performer'])[metric].unstack('performer')
+    values = matrix.to_numpy(dtype=float)
+    counts = np.sum(~np.isnan(values), axis=1)
+    median = np.nanmedian(values, axis=1)
+    mad = MAD_SCALE * np.nanmedian(np.abs(values - median[:, None]), axis=1)
+    z = (values - median[:, None]) / np.maximum(mad, MIN_MAD)[:, None]
+    z[counts < MIN_PERFORMERS] = np.nan
+    z = pd.DataFrame(z, index=matrix.index, columns=matrix.columns).stack(future_stack=True)
+    return z.reindex(pd.MultiIndex.from_frame(events[keys + ['performer']])).to_numpy()
+
+
+def local_z(events: pd.DataFrame, metric: str='deltaioi', window: int=LOCAL_WINDOW)->np.ndarray:
+    """Robust z-scores of the events compared to their neighbours in their performance
+
+    Args:
+        - events: events table
+        - metric: metric name. Defaults to 'deltaioi'
+        - window: events on each side of the window. Defaults to LOCAL_WINDOW
+
+    Returns:
+        z-scores
+    """
+    groups = events.groupby(['performer', 'fantasia'], sort=False)[metric]
+    rolling = dict(window=2*window+1, center=True, min_periods=window+1)
+    median = groups.transform(lambda x: x.rolling(**rolling).median())
+    deviation = (events[metric] - median).abs()
+    mad = MAD_SCALE * deviation.groupby([events['performer'], events['fantasia']], sort=False).transform(
+        lambda x: x.rolling(**rolling).median())
+    return ((events[metric] - median) / np.maximum(mad, MIN_MAD)).to_numpy()
+
+
+#####################################
+# report
+######################################
+
+def suspect_alignments(events: pd.DataFrame=None, metric: str='deltaioi', threshold: float=THRESHOLD,
+                       window: int=LOCAL_WINDOW, rest_filtered: bool=True)->pd.DataFrame:
+    """Ranked report of the events whose metric is an outlier, in the same direction,
+    both across performers and in their local window
+
+    Args:
+        - events: events table. Defaults to None for all events of the corpus
+        - metric: metric name. Defaults to 'deltaioi'
+        - threshold: robust z-score threshold. Defaults to THRESHOLD
+        - window: events on each side of the local window. Defaults to LOCAL_WINDOW
+        - rest_filtered: True if rests are removed. Defaults to True
+
+    Returns:
+        dataframe with columns performer, fantasia, measure, repeated, note, pitchname, onset,
+        metric, z performers, z local, score (geometric mean of both absolute z-scores),
+        sorted by decreasing score
+    """
+    if events is None:
+        events = corpus_events()
+    if rest_filtered:
+        events = events[events['voice'] != '.']
+    events = score_event_keys(events).reset_index(drop=True)
+    events['z performers'] = cross_performers_z(events, metric)
+    events['z local'] = local_z(events, metric, window)
+    events['score'] = np.sqrt(np.abs(events['z performers'] * events['z local']))
+    # an alignment error deviates in the same direction from the other performers and from the neighbours
+    suspects = events[(events['z performers'].abs() > threshold) & (events['z local'].abs() > threshold)
+                      & (events['z performers'] * events['z local'] > 0)]
+    columns = ['performer', 'fantasia', 'measure', 'repeated', 'note', 'pitchname', 'onset', metric,
+               'z performers', 'z local', 'score']
+    return suspects[columns].sort_values('score', ascending=False).reset_index(drop=True)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the dependency graph of the state of a page: derived results are computed
+from inputs (widgets) or other results, stored in the session state with the values of the inputs
+they were computed from, and only the results depending on a changed input are invalidated
+"""
+
+from collections.abc import MutableMapping
+
+#####################################
+# dependency graph
+######################################
+
+class PageState:
+    """Inputs and derived results of a page in the session state, under keys "{page}/{name}"
+
+    Attributes:
+        - page: name of the page (namespace of its keys)
+        - dependencies: {derived result : names of the inputs and results it depends on},
+                        names which are not keys being inputs
+        - state: session state
+    """
+
+    def __init__(self, page: str, dependencies: dict[str:tuple[str]], state: MutableMapping):
+        self.page = page
+        self.dependencies = dependencies
+        self.state = state
+
+    def key(self, name: str)->str:
+        """Key of an input or a result in the session state (key of the widget of an input)
+
+        Args:
+            - name: name of an input or a result
+
+        Returns:
+            key
+        """
+        return f"{self.page}/{name}"
+
+    def inputs(self, name: str)->list[str]:
+        """Inputs a result depends on, directly or through other results
+
+        Args:
+            - name: name of a result
+
+        Returns:
+            sorted names of inputs
+        """
+        res = set()
+        for d in self.dependencies.get(name, ()):
+            if d in self.dependencies:
+                res.update(self.inputs(d))
+            else:
+                res.add(d)
+        return sorted(res)
+
+    def dependents(self, name: str)->set[str]:
+        """Results depending on an input or a result, directly or through other results
+
+        Args:
+            - name: name of an input or a result
+
+        Returns:
+            names of results
+        """
+        res = set()
+        for derived, dependencies in self.dependencies.items():
+            if name in dependencies:
+                res.add(derived)
+                res.update(self.dependents(derived))
+        return res
+
+    def stamp(self, name: str)->tuple:
+        """Current values of the inputs of a result
+
+        Args:
+            - name: name of a result
+
+        Returns:
+            values
+        """
+        return tuple(self.state.get(self.key(i)) for i in self.inputs(name))
+
+    def invalidate(self, name: str):
+        """Removes the results depending on an input or a result (widget callback)
+
+        Args:
+            - name: name of an input or a result
+        """
+        for derived in self.dependents(name):
+            if self.key(derived) in self.state:
+                del self.state[self.key(derived)]
+
+    def ready(self, name: str)->bool:
+        """True if a result is computed for the current values of its inputs
+
+        Args:
+            - name: name of a result
+
+        Returns:
+            bool
+        """
+        key = self.key(name)
+        return key in self.state and self.state[key][0] == self.stamp(name)
+
+    def get(self, name: str, func, *args, **kwargs):
+        """Returns a result, computed by func only if missing or computed for other values of its inputs
+        (the results depending on it being invalidated when it is computed again)
+
+        Args:
+            - name: name of a result
+            - func: computation of the result
+            - args, kwargs: arguments of func
+
+        Returns:
+            result
+        """
+        if not self.ready(name):
+            self.invalidate(name)
+            self.state[self.key(name)] = (self.stamp(name), func(*args, **kwargs))
+        return self.state[self.key(name)][1]
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines tools to spread independent computations over process pools. The pools are
+created once by process and number of workers, their processes being started by a server process
+(forkserver) rather than forked from the threads of the streamlit server. Background computations
+(see background) run serially and are paused between chunks while pages are waiting
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+#####################################
+# parameters
+######################################
+
+# start method of the processes of the pools
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+#####################################
+# background computations
+######################################
+
+# state of the background computation of the current thread (see background)
+BACKGROUND = threading.local()
+
+
+@contextmanager
+def background(pause=None):
+    """Context of a background computation of the current thread: pools are not used and
+    pause is called between chunks (see checkpoint)
+
+    Args:
+        - pause: function blocking while the computation has to wait. Defaults to None
+    """
+    BACKGROUND.pause = pause or (lambda: None)
+    try:
+        yield
+    finally:
+        del BACKGROUND.pause
+
+
+def in_background()->bool:
+    """True if the current thread runs a background computation (see background)
+
+    Returns:
+        bool
+    """
+    return hasattr(BACKGROUND, 'pause')
+
+
+def checkpoint():
+    """Pause point between chunks of a computation, nothing if not run in background"""
+    if in_background():
+        BACKGROUND.pause()
+
+
+#####################################
+# pools
+######################################
+
+# pools of the process: {number of workers : executor}
+POOLS = dict()
+POOLS_LOCK = threading.Lock()
+
+
+def default_workers()->int:
+    """Returns the number of processes used when not specified
+
+    Returns:
+        number of cpus
+    """
+    return os.cpu_count() or 1
+
+
+def shared_pool(workers: int)->ProcessPoolExecutor:
+    """Returns the process pool of a number of workers, created at its first use
+
+    Args:
+        - workers: number of processes
+
+    Returns:
+        executor shared by all the computations of the process
+    """
+    with POOLS_LOCK:
+        if workers not in POOLS:
+            POOLS[workers] = ProcessPoolExecutor(max_workers=workers,
+                                                 mp_context=multiprocessing.get_context(START_METHOD))
+        return POOLS[workers]
+
+
+def discard_pool(workers: int):
+    """Shuts down a broken pool, created again at its next use
+
+    Args:
+        - workers: number of processes
+    """
+    with POOLS_LOCK:
+        executor = POOLS.pop(workers, None)
+    if executor != None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+#####################################
+# runs
+######################################
+
+
+def run_chunks(func, chunks_args: list[tuple], budget: float=None, workers: int=None)->list:
+    """Runs func on each tuple of arguments, in the shared process pool if several workers (serially
+    in background), until all chunks are done or the latency budget is spent (at least one chunk is kept,
+    the chunks not started being cancelled)
+
+    Args:
+        - func: top-level function (picklable)
+        - chunks_args: arguments of each chunk
+        - budget: latency budget in s. Defaults to None for no limit
+        - workers: number of processes. Defaults to None for the number of cpus
+
+    Returns:
+        results of the finished chunks, in chunks order
+    """
+    if workers == None:
+        workers = default_workers()
+    deadline = time.monotonic() + budget if budget != None else None
+    if workers <= 1 or len(chunks_args) <= 1 or in_background():
+        done = []
+        for args in chunks_args:
+            checkpoint()
+            done.append(func(*args))
+            if deadline != None and time.monotonic() > deadline:
+                break
+        return done
+    futures = [shared_pool(workers).submit(func, *args) for args in chunks_args]
+    pending = set(futures)
+    try:
+        while pending:
+            remaining = deadline - time.monotonic() if deadline != None else None
+            if remaining != None and remaining <= 0:
+                if len(pending) < len(futures):
+                    break
+                remaining = None
+            _, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for f in pending:
+            f.cancel()
+        return [f.result() for f in futures if f.done() and not f.cancelled()]
+    except BrokenProcessPool:
+        discard_pool(workers)
+        raise
+
+
+def map_pool(func, args_list: list[tuple], workers: int=None)->list:
+    """Runs func on all tuples of arguments in the shared process pool
+
+    Args:
+        - func: top-level function (picklable)
+        - args_list: arguments of each call
+        - workers: number of processes. Defaults to None for the number of cpus
+
+    Returns:
+        results in args_list order
+    """
+    return run_chunks(func, args_list, budget=None, workers=workers)
+
+
+def imap_pool(func, args_list: list[tuple], workers: int=None):
+    """Runs func on all tuples of arguments in the shared process pool, the results being yielded
+    as they complete (the calls not started are cancelled if the iteration is stopped)
+
+    Args:
+        - func: top-level function (picklable)
+        - args_list: arguments of each call
+        - workers: number of processes. Defaults to None for the number of cpus
+
+    Yields:
+        (index in args_list, result) in completion order
+    """
+    if workers == None:
+        workers = default_workers()
+    if workers <= 1 or len(args_list) <= 1 or in_background():
+        for i, args in enumerate(args_list):
+            checkpoint()
+            yield i, func(*args)
+        return
+    futures = {shared_pool(workers).submit(func, *args): i for i, args in enumerate(args_list)}
+    try:
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    except BrokenProcessPool:
+        discard_pool(workers)
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines an index of the voice annotations of the corpus: the voices of all performances
+are encoded in one byte string with n-gram posting lists, so that voice patterns with wildcards,
+duration and position constraints are found without rescanning the data
+"""
+
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from src.events import corpus_events
+
+#####################################
+# parameters
+######################################
+
+# byte between two performances, never matched
+SEPARATOR = ord('|')
+# length of the indexed n-grams
+NGRAM = 3
+# wildcard of one event in a pattern
+WILDCARD = '?'
+# largest number of n-grams looked up for the anchor of a pattern
+MAX_EXPANSIONS = 64
+# voice annotations
+VOICES = 'xuBb.mts'
+
+
+#####################################
+# patterns
+######################################
+
+def parse_pattern(pattern: str)->list[frozenset[int]]:
+    """Parses a voice pattern: voice letters, '?' for any event (rest included),
+    '[...]' for a class of voices, for instance '[Bb]u[Bb]u'
+
+    Args:
+        - pattern: voice pattern
+
+    Returns:
+        allowed bytes of each event of the pattern
+    """
+    elements = []
+    for token in re.findall(r"\[[^\]]+\]|.", pattern):
+        if token == WILDCARD:
+            elements.append(frozenset(VOICES.encode()))
+        elif token.startswith('['):
+            elements.append(frozenset(token[1:-1].encode()))
+        else:
+            elements.append(frozenset(token.encode()))
+    return elements
+
+
+#####################################
+# index
+######################################
+
+class VoiceIndex:
+    """Byte string of the voices of all events and sorted n-gram posting lists
+
+    Attributes:
+        - events: events table, in the order of the performances
+        - codes: voices bytes with a separator after each performance
+        - rows: row in events of each byte (-1 for separators)
+        - grams: sorted n-gram codes
+        - postings: start of each n-gram in codes, in the order of grams
+    """
+
+    def __init__(self, events: pd.DataFrame):
+        self.events = events.reset_index(drop=True)
+        performances = (self.events['performer'].astype(str) + '/' + self.events['fantasia'].astype(str)).to_numpy()
+        ends = np.flatnonzero(np.append(performances[1:] != performances[:-1], True)) if len(performances) else []
+        voices = np.frombuffer(''.join(self.events['voice']).encode(), dtype=np.uint8)
+        # one separator after the last event of each performance
+        positions = np.arange(len(voices)) + np.searchsorted(ends, np.arange(len(voices)))
+        self.codes = np.full(len(voices) + len(ends), SEPARATOR, dtype=np.uint8)
+        self.codes[positions] = voices
+        self.rows = np.full(len(self.codes), -1, dtype=np.int64)
+        self.rows[positions] = np.arange(len(voices))
+        n = max(0, len(self.codes) - NGRAM + 1)
+        grams = np.zeros(n, dtype=np.int64)
+        for k in range(NGRAM):
+            grams = (grams << 8) | self.codes[k:k+n]
+        order = np.argsort(grams, kind='stable')
+        self.grams = grams[order]
+        self.postings = order
+
+    def lookup(self, gram: bytes)->np.ndarray:
+        """Positions in codes of an n-gram
+
+        Args:
+            - gram: NGRAM bytes
+
+        Returns:
+            sorted positions
+        """
+        value = int.from_bytes(gram, 'big')
+        start, end = np.searchsorted(self.grams, [value, value + 1])
+        return np.sort(self.postings[start:end])
+
+    def candidates(self, elements: list[frozenset[int]])->np.ndarray:
+        """Positions in codes where a pattern may start, from the posting lists of its most selective n-gram
+
+        Args:
+            - elements: parsed pattern (see parse_pattern)
+
+        Returns:
+            positions
+        """
+        best = None
+        for a in range(len(elements) - NGRAM + 1):
+            expansions = int(np.prod([len(e) for e in elements[a:a+NGRAM]]))
+            if expansions <= MAX_EXPANSIONS and (best == None or expansions < best[1]):
+                best = (a, expansions)
+        if best == None:
+            # short or unselective pattern: scan of its first event
+            return np.flatnonzero(np.isin(self.codes, list(elements[0])))
+        a = best[0]
+        grams = [b'']
+        for e in elements[a:a+NGRAM]:
+            grams = [g + bytes([c]) for g in grams for c in e]
+        positions = np.concatenate([self.lookup(g) for g in grams]) - a
+        return np.sort(positions[positions >= 0])
+
+    def search(self, pattern: str, durations: tuple[float]=None, beats: tuple[tuple[str]]=None,
+               time_signatures: list[str]=None, same_bar: bool=True)->np.ndarray:
+        """Rows of the events starting a voice pattern
+
+        Args:
+            - pattern: voice pattern (see parse_pattern)
+            - durations: duration of each event of the pattern (None for any). Defaults to None
+            - beats: beats of each event of the pattern among 'first', 'on', 'off' (None for any).
+                     Defaults to None
+            - time_signatures: time signatures of the first event. Defaults to None for all
+            - same_bar: True if all events of the pattern are in the same bar. Defaults to True
+
+        Returns:
+            rows in events of the first event of each match
+        """
+        elements = parse_pattern(pattern)
+        if len(elements) == 0:
+            return np.zeros(0, dtype=np.int64)
+        positions = self.candidates(elements)
+        positions = positions[positions + len(elements) <= len(self.codes)]
+        for i, allowed in enumerate(elements):
+            positions = positions[np.isin(self.codes[positions + i], list(allowed))]
+        rows = self.rows[positions]
+        # separators never match: events of a match are consecutive rows of one performance
+        columns = {'duration': durations, 'beat': beats}
+        for column, constraints in columns.items():
+            if constraints == None:
+                continue
+            values = self.events[column].to_numpy()
+            for i, c in enumerate(constraints):
+                if c == None:
+                    continue
+                rows = rows[np.isin(values[rows + i], c if isinstance(c, (tuple, list)) else [c])]
+        if time_signatures != None:
+            rows = rows[np.isin(self.events['time_signature'].to_numpy()[rows], list(time_signatures))]
+        if same_bar:
+            bars = self.events['bar'].to_numpy()
+            rows = rows[bars[rows] == bars[rows + len(elements) - 1]]
+        return rows
+
+
+@lru_cache(maxsize=8)
+def voice_index(fugato: bool=False, movement_name: str=None)->VoiceIndex:
+    """Voice index of the corpus (cached)
+
+    Args:
+        - fugato: True if only fugatos movements, False otherwise. Defaults to False
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+
+    Returns:
+        VoiceIndex
+    """
+    return VoiceIndex(corpus_events(fugato=fugato, movement_name=movement_name))
+
+
+#####################################
+# statistics
+######################################
+
+def pattern_results(patterns: list[str], metric: str='deltaonset', index: VoiceIndex=None,
+                    **constraints)->dict[str:dict[str:list]]:
+    """Metric values of each event position of the matches of voice patterns (of the same length),
+    in the format of timings (for results_to_stats)
+
+    Args:
+        - patterns: voice patterns, matches of all patterns being gathered
+        - metric: deltaioi or deltaonset. Defaults to 'deltaonset'
+        - index: voice index. Defaults to None for the whole corpus
+        - constraints: durations, beats, time_signatures, same_bar (see VoiceIndex.search)
+
+    Returns:
+        {performer : {'1st', '2nd'... event of the pattern : metric values}}
+    """
+    if index == None:
+        index = voice_index()
+    rows = np.unique(np.concatenate([index.search(p, **constraints) for p in patterns]))
+    length = len(parse_pattern(patterns[0]))
+    names = ['1st', '2nd', '3rd'] + [f"{i}th" for i in range(4, length + 1)]
+    values = index.events[metric].to_numpy()
+    performers = index.events['performer'].to_numpy()[rows]
+    res = dict()
+    for p in pd.unique(index.events['performer']):
+        selected = rows[performers == p]
+        res[p] = {names[i]: values[selected + i].tolist() for i in range(length)}
+    return res
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the conversion of the pitch names of the alignments ('A4', 'C♯5', 'B♭4', '0' for rests)
+to MIDI numbers, through a cached name-to-number table
+"""
+
+from functools import lru_cache
+import numpy as np
+
+#####################################
+# parameters
+######################################
+
+STEPS = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+ALTERATIONS = {'♯': 1, '#': 1, '♭': -1, 'b': -1, '♮': 0}
+# MIDI number of rests
+REST = -1
+
+
+#####################################
+# conversions
+######################################
+
+@lru_cache(maxsize=None)
+def name_to_midi(name: str)->int:
+    """Returns the MIDI number of a pitch name
+
+    Args:
+        - name: pitch name, for instance 'C♯5' (step, alterations, octave), '0' for rests
+
+    Returns:
+        MIDI number (60 for C4), REST for rests
+    """
+    if name in ('0', '', '.'):
+        return REST
+    alteration = sum(ALTERATIONS[c] for c in name[1:-1])
+    return 12 * (int(name[-1]) + 1) + STEPS[name[0]] + alteration
+
+
+def pitch_numbers(names: np.ndarray)->np.ndarray:
+    """Returns the MIDI numbers of a sequence of pitch names, each distinct name being converted once
+
+    Args:
+        - names: pitch names
+
+    Returns:
+        MIDI numbers
+    """
+    unique, inverse = np.unique(np.asarray(names, dtype=str), return_inverse=True)
+    return np.array([name_to_midi(n) for n in unique], dtype=np.int64)[inverse].reshape(-1) \
+        if len(unique) else np.zeros(0, dtype=np.int64)
+
+
+#####################################
+# ingest columns
+######################################
+
+def previous_indexes(selected: np.ndarray)->np.ndarray:
+    """Index of the last selected element strictly before each element
+
+    Args:
+        - selected: boolean mask
+
+    Returns:
+        indexes, -1 if none
+    """
+    last = np.maximum.accumulate(np.where(selected, np.arange(len(selected)), -1))
+    return np.concatenate(([-1], last[:-1])).astype(np.int64)
+
+
+def add_pitch_columns(data: list[dict[str:str]]):
+    """Adds to the elements of an alignment (see data.get_all_data) their MIDI pitch, melodic interval
+    from the previous note and register distance to the last note of the other voice
+    (upper 'u' / lower 'b', 'B', 's', 't'), in the same movement, grace notes and rests being skipped.
+    Values are strings as the other columns, '' if undefined
+
+    Args:
+        - data: elements of an alignment, modified in place with keys 'midi', 'interval', 'voices_distance'
+    """
+    if len(data) == 0:
+        return
+    midi = pitch_numbers([d['pitchname'] for d in data])
+    movements = np.array([d['movement'] for d in data])
+    voices = np.array([d['voice'] for d in data])
+    sounding = (midi != REST) & (np.array([float(d['duration']) for d in data]) != 0.0)
+    previous = previous_indexes(sounding)
+    has_interval = sounding & (previous >= 0) & (movements[np.maximum(previous, 0)] == movements)
+    interval = midi - midi[np.maximum(previous, 0)]
+    upper = sounding & (voices == 'u')
+    lower = sounding & np.isin(voices, ['b', 'B', 's', 't'])
+    # last note of the other voice
+    other = np.where(upper, previous_indexes(lower), np.where(lower, previous_indexes(upper), -1))
+    has_distance = (other >= 0) & (movements[np.maximum(other, 0)] == movements)
+    distance = np.where(upper, midi - midi[np.maximum(other, 0)], midi[np.maximum(other, 0)] - midi)
+    for i, d in enumerate(data):
+        d['midi'] = str(midi[i]) if sounding[i] else ''
+        d['interval'] = str(interval[i]) if has_interval[i] else ''
+        d['voices_distance'] = str(distance[i]) if has_distance[i] else ''
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the background precomputation of the shared results: a pool of threads
+runs the tasks of a priority queue into the cache of the server (see shared_cache). The results
+of all the selections of the performer pages (the default ones first) are warmed when the first
+page of the server process is run, then the likely next selections of the pages (other metric,
+next performer) are prefetched. Requests of the pages have precedence: a background task runs
+serially (no process pool, see parallel.background) and is paused between chunks while a page
+is waiting for another result
+"""
+
+import heapq
+import itertools
+import os
+import threading
+from streamlit import runtime
+from src.data import PERFORMERS, MOVEMENTS_POSITIONS
+from src.parallel import background
+from src.shared_cache import RESULTS, ResultCache, ResultKey, result_key, compute_performer_results
+
+#####################################
+# parameters
+######################################
+
+# number of background threads (environment variable PRECOMPUTE_WORKERS, 0 to disable)
+WORKERS = int(os.environ.get('PRECOMPUTE_WORKERS', 2))
+# priorities of the tasks, the smallest first
+PREFETCH = 1
+WARMUP = 2
+METRICS = ['deltaonset', 'deltaioi']
+# default selection of the performer pages
+DEFAULT_PERFORMER = 'kuijken'
+
+
+#####################################
+# scheduler
+######################################
+
+class Scheduler:
+    """Priority queue of background computations of shared results, run by a pool of threads
+
+    Attributes:
+        - cache: cache of the results
+        - workers: number of threads
+        - queue: heap of (priority, order, key, func, args, kwargs)
+        - queued: {key : priority} of the tasks in the queue
+        - done, failed: counters
+    """
+
+    def __init__(self, cache: ResultCache=RESULTS, workers: int=WORKERS):
+        self.cache = cache
+        self.workers = workers
+        self.queue = []
+        self.queued = dict()
+        self.order = itertools.count()
+        self.done, self.failed = 0, 0
+        self.condition = threading.Condition()
+        self.threads = []
+
+    def submit(self, key: ResultKey, func, *args, priority: int=PREFETCH, **kwargs)->bool:
+        """Queues the computation of a result, unless cached or already queued with a higher priority
+
+        Args:
+            - key: key of the result (see result_key)
+            - func: computation of the result
+            - args, kwargs: arguments of func
+            - priority: PREFETCH or WARMUP (smallest first). Defaults to PREFETCH
+
+        Returns:
+            True if queued
+        """
+        if key in self.cache:
+            return False
+        with self.condition:
+            if self.queued.get(key, priority + 1) <= priority:
+                return False
+            # a previous entry with a lower priority is skipped when popped
+            self.queued[key] = priority
+            heapq.heappush(self.queue, (priority, next(self.order), key, func, args, kwargs))
+            self.condition.notify()
+        return True
+
+    def start(self):
+        """Starts the threads (once)"""
+        with self.condition:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.run, name=f"precompute-{len(self.threads)}", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+
+    def next_task(self)->tuple:
+        """Waits for and removes the task with the highest priority
+
+        Returns:
+            (key, func, args, kwargs)
+        """
+        with self.condition:
+            while True:
+                self.condition.wait_for(lambda: len(self.queue) > 0)
+                priority, _, key, func, args, kwargs = heapq.heappop(self.queue)
+                if self.queued.get(key) == priority:
+                    del self.queued[key]
+                    return key, func, args, kwargs
+
+    def run(self):
+        """Loop of a thread: runs the tasks serially once no request of a page is in progress,
+        pausing them between chunks while a page is waiting (unless for the task result)"""
+        while True:
+            key, func, args, kwargs = self.next_task()
+            self.cache.wait_idle()
+            try:
+                with background(lambda: self.cache.wait_idle(key)):
+                    self.cache.get_or_compute(key, func, *args, **kwargs)
+                self.done += 1
+            except Exception:
+                # invalid selection: computed (and reported) again if requested by a page
+                self.failed += 1
+
+    def stats(self)->dict[str:int]:
+        """Counters of the scheduler
+
+        Returns:
+            {'workers', 'queued', 'done', 'failed' : value}
+        """
+        with self.condition:
+            return {'workers': len(self.threads), 'queued': len(self.queued),
+                    'done': self.done, 'failed': self.failed}
+
+
+# scheduler of the server
+SCHEDULER = Scheduler()
+
+
+#####################################
+# warmup and prefetch
+######################################
+
+def warmup_tasks()->list[tuple[ResultKey, object, tuple]]:
+    """Results of all the selections of the performer pages, the default selections first:
+    corpus of each performer for the comparison of all performers (ΔIOI), corpus, fugatos and
+    first type of movement of the default performer for the default metric of their page,
+    then corpus, fugatos and each type of movement of every performer for both metrics
+
+    Returns:
+        (key, func, args) of each result (see shared_cache.performer_results)
+    """
+    default_movement = next(iter(MOVEMENTS_POSITIONS))
+    selections = [('corpus', performer, 'deltaioi', None, False) for performer in PERFORMERS]
+    selections += [('corpus', DEFAULT_PERFORMER, 'deltaonset', None, False),
+                   ('fugatos', DEFAULT_PERFORMER, 'deltaonset', None, True),
+                   ('movements', DEFAULT_PERFORMER, 'deltaioi', default_movement, False)]
+    for metric in METRICS:
+        for performer in PERFORMERS:
+            selections += [('corpus', performer, metric, None, False), ('fugatos', performer, metric, None, True)]
+            selections += [('movements', performer, metric, movement_name, False)
+                           for movement_name in MOVEMENTS_POSITIONS]
+    tasks = dict()
+    for scope, performer, metric, movement_name, fugato in selections:
+        key = result_key(scope, performer, metric, movement_name, fugato=fugato)
+        if key not in tasks:
+            tasks[key] = (key, compute_performer_results, (performer, metric, movement_name, fugato))
+    return list(tasks.values())
+
+
+def start_precompute(scheduler: Scheduler=SCHEDULER):
+    """Starts the background threads and queues the warmup at the first call of the process
+    (import of this module by the first page run in the server), nothing if the scheduler has no workers
+
+    Args:
+        - scheduler: scheduler. Defaults to SCHEDULER
+    """
+    if scheduler.workers == 0 or scheduler.threads:
+        return
+    scheduler.start()
+    for key, func, args in warmup_tasks():
+        scheduler.submit(key, func, *args, priority=WARMUP)
+
+
+def next_selections(performer: str, metric: str)->list[tuple[str, str]]:
+    """Likely next selections of a page: the other metric, then the next performer
+
+    Args:
+        - performer: name of the selected performer
+        - metric: selected metric
+
+    Returns:
+        (performer, metric) of each selection
+    """
+    other = [m for m in METRICS if m != metric]
+    following = PERFORMERS[(PERFORMERS.index(performer) + 1) % len(PERFORMERS)]
+    return [(performer, m) for m in other] + [(following, metric)]
+
+
+def prefetch_performer(scope: str, performer: str, metric: str, movement_name: str=None,
+                       fugato: bool=False, scheduler: Scheduler=SCHEDULER):
+    """Queues the results of the likely next selections of a performer page (see next_selections)
+
+    Args:
+        - scope: page scope
+        - performer: name of the selected performer
+        - metric: selected metric
+        - movement_name: name of a type of movement. Defaults to None for all movements
+        - fugato: True if only fugatos movements. Defaults to False
+        - scheduler: scheduler. Defaults to SCHEDULER
+    """
+    for p, m in next_selections(performer, metric):
+        scheduler.submit(result_key(scope, p, m, movement_name, fugato), compute_performer_results,
+                         p, m, movement_name, fugato)
+
+
+# started by the first page run in the server process, the pages importing this module
+if runtime.exists():
+    start_precompute()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the comparison of the repeated passes (repeated 1 to 3) of measures
+with their first pass (repeated 0) for all performers: events of the passes are joined
+on the score event and timing changes are computed per note, per bar and by category
+"""
+
+import numpy as np
+import pandas as pd
+from src.events import corpus_events
+
+#####################################
+# parameters
+######################################
+
+PASS_KEY = ['performer', 'fantasia', 'measure', 'position']
+# positions in bars rounded to this number of decimals for the join
+POSITION_DECIMALS = 6
+# categories of the changes: (voices, durations, beats), None if all
+CATEGORIES = {'all': (None, None, None),
+              'b': ('b', None, None),
+              'B': ('Bst', None, None),
+              'B+b': ('Bbst', None, None),
+              'u': ('u', None, None),
+              'm': ('m', None, None),
+              'x': ('x', None, None),
+              '♩': (None, 1.0, None),
+              '♪': (None, 0.5, None),
+              '♬': (None, 0.25, None),
+              '1st beat': (None, None, ('first',)),
+              'on beat': (None, None, ('first', 'on')),
+              'off beat': (None, None, ('off',))}
+
+
+#####################################
+# joins
+######################################
+
+def repeated_notes(events: pd.DataFrame=None)->pd.DataFrame:
+    """Joins the notes of the repeated passes with the same notes (same position and pitch)
+    of the first pass of the measures
+
+    Args:
+        - events: events table. Defaults to None for all events of the corpus
+
+    Returns:
+        dataframe by note of a repeated pass: performer, fantasia, movement, measure, repeated, position,
+        pitchname, voice, duration, beat, ioi, deltaioi, deltaonset, bar_ioi of the repeated pass,
+        the same metrics of the first pass (suffix ' 0') and the changes:
+        deltaioi change, deltaonset change, ioi ratio
+    """
+    if events is None:
+        events = corpus_events()
+    notes = events[events['voice'] != '.'].copy()
+    notes['position'] = notes['position'].round(POSITION_DECIMALS)
+    # a measure played twice with the same repeat number: first occurrence kept
+    notes = notes.drop_duplicates(PASS_KEY + ['repeated'])
+    metrics = ['ioi', 'deltaioi', 'deltaonset', 'bar_ioi', 'bar']
+    first = notes[notes['repeated'] == 0][PASS_KEY + ['pitchname'] + metrics]
+    repeats = notes[notes['repeated'] > 0][PASS_KEY + ['movement', 'repeated', 'pitchname', 'voice',
+                                                      'duration', 'beat'] + metrics]
+    joined = repeats.merge(first, on=PASS_KEY + ['pitchname'], suffixes=('', ' 0'))
+    joined['deltaioi change'] = joined['deltaioi'] - joined['deltaioi 0']
+    joined['deltaonset change'] = joined['deltaonset'] - joined['deltaonset 0']
+    joined['ioi ratio'] = joined['ioi'] / joined['ioi 0']
+    return joined.sort_values(['performer', 'fantasia', 'bar']).reset_index(drop=True)
+
+
+def repeated_bars(joined: pd.DataFrame=None)->pd.DataFrame:
+    """Per-bar changes between the repeated passes and the first pass
+
+    Args:
+        - joined: joined notes (see repeated_notes). Defaults to None for all the corpus
+
+    Returns:
+        dataframe by bar of a repeated pass: performer, fantasia, movement, measure, repeated,
+        notes (joined notes), tempo ratio (bar duration of the first pass / bar duration of the repeat,
+        above 1 if faster), mean deltaioi change, mean deltaonset change
+    """
+    if joined is None:
+        joined = repeated_notes()
+    bars = joined.groupby(['performer', 'fantasia', 'measure', 'repeated'], sort=False).agg(
+        movement=('movement', 'first'), notes=('ioi', 'size'),
+        bar_ioi=('bar_ioi', 'first'), bar_ioi_0=('bar_ioi 0', 'first'),
+        deltaioi_change=('deltaioi change', 'mean'), deltaonset_change=('deltaonset change', 'mean'))
+    bars['tempo ratio'] = bars['bar_ioi_0'] / bars['bar_ioi']
+    bars = bars.rename(columns={'deltaioi_change': 'mean deltaioi change',
+                                'deltaonset_change': 'mean deltaonset change'})
+    return bars.drop(columns=['bar_ioi', 'bar_ioi_0']).reset_index()
+
+
+#####################################
+# statistics
+######################################
+
+def repeat_change_results(metric: str='deltaonset', passes: tuple[int]=(1, 2, 3),
+                          joined: pd.DataFrame=None)->dict[str:dict[str:list]]:
+    """Changes of a metric between repeated and first passes for the categories of CATEGORIES,
+    in the format of timings (for results_to_stats)
+
+    Args:
+        - metric: deltaioi or deltaonset. Defaults to 'deltaonset'
+        - passes: repeated passes compared to the first one. Defaults to (1, 2, 3)
+        - joined: joined notes (see repeated_notes). Defaults to None for all the corpus
+
+    Returns:
+        {performer : {category : metric changes}}
+    """
+    if joined is None:
+        joined = repeated_notes()
+    joined = joined[joined['repeated'].isin(passes)]
+    changes = joined[f"{metric} change"].to_numpy()
+    voices = joined['voice'].to_numpy()
+    durations = joined['duration'].to_numpy()
+    beats = joined['beat'].to_numpy()
+    performers = joined['performer'].to_numpy()
+    masks = dict()
+    for k, (v, d, b) in CATEGORIES.items():
+        mask = np.ones(len(joined), dtype=bool)
+        if v != None:
+            mask &= np.isin(voices, list(v))
+        if d != None:
+            mask &= durations == d
+        if b != None:
+            mask &= np.isin(beats, b)
+        masks[k] = mask
+    res = dict()
+    for p in pd.unique(performers):
+        selected = performers == p
+        res[p] = {k: changes[selected & mask].tolist() for k, mask in masks.items()}
+    return res
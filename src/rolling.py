@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines rolling quantiles (median, IQR) of the metrics over windows of bars
+along the sequences of measures performed, maintained in a sorted window
+instead of sorting each window
+"""
+
+import bisect
+import numpy as np
+import pandas as pd
+from src.events import corpus_events
+
+#####################################
+# sorted window
+######################################
+
+class SortedWindow:
+    """Sorted multiset of the values of a window: binary search of the position of an inserted
+    or removed value in O(log w) and k-th smallest by index in O(1), w being the number of values
+    in the window (insertions and removals shift the list in place, a memmove of at most w items)
+    """
+
+    def __init__(self):
+        self.values = []
+
+    @property
+    def count(self)->int:
+        return len(self.values)
+
+    def add(self, value: float):
+        """Inserts a value
+
+        Args:
+            - value: value entering the window
+        """
+        bisect.insort(self.values, value)
+
+    def remove(self, value: float):
+        """Removes one occurrence of a value of the window
+
+        Args:
+            - value: value leaving the window
+        """
+        del self.values[bisect.bisect_left(self.values, value)]
+
+    def kth(self, k: int)->float:
+        """Returns the k-th smallest value (0-based)
+
+        Args:
+            - k: order of the element, 0 <= k < count
+
+        Returns:
+            value
+        """
+        return self.values[k]
+
+
+def window_quantile(window: SortedWindow, q: float)->float:
+    """Quantile of the values of the window with linear interpolation (as numpy.quantile)
+
+    Args:
+        - window: sorted window
+        - q: quantile in [0;1]
+
+    Returns:
+        quantile value
+    """
+    h = (window.count - 1) * q
+    low = int(h)
+    value = window.kth(low)
+    if h > low:
+        value += (h - low) * (window.kth(low + 1) - value)
+    return float(value)
+
+
+#####################################
+# rolling quantiles
+######################################
+
+def rolling_quantiles(values: np.ndarray, bars: np.ndarray, window: int,
+                      quantiles: tuple[float]=(0.25, 0.5, 0.75))->np.ndarray:
+    """Quantiles of the values of each window of bars ending at each bar,
+    bars entering and leaving the window updating a sorted window
+
+    Args:
+        - values: metric values of the events
+        - bars: bar number of each event (non decreasing, consecutive bars)
+        - window: number of bars of the window
+        - quantiles: quantiles. Defaults to (0.25, 0.5, 0.75)
+
+    Returns:
+        array (number of bars, 1 + number of quantiles): number of events in the window, quantiles
+    """
+    if len(values) == 0:
+        return np.zeros((0, 1 + len(quantiles)))
+    values = values.tolist()
+    first_bar = bars[0]
+    n_bars = bars[-1] - first_bar + 1
+    starts = np.searchsorted(bars, np.arange(first_bar, first_bar + n_bars + 1))
+    window_values = SortedWindow()
+    res = np.full((n_bars, 1 + len(quantiles)), np.nan)
+    for b in range(n_bars):
+        for i in range(starts[b], starts[b+1]):
+            window_values.add(values[i])
+        if b >= window:
+            for i in range(starts[b-window], starts[b-window+1]):
+                window_values.remove(values[i])
+        res[b, 0] = window_values.count
+        if window_values.count > 0:
+            res[b, 1:] = [window_quantile(window_values, q) for q in quantiles]
+    return res
+
+
+def rolling_table(events: pd.DataFrame, metric: str, window: int,
+                  rest_filtered: bool=True)->pd.DataFrame:
+    """Rolling median and IQR of a metric over windows of bars of each performance,
+    windows restarting at each movement of the sequences of measures performed
+
+    Args:
+        - events: events table (see events.corpus_events)
+        - metric: deltaioi or deltaonset
+        - window: number of bars of the window
+        - rest_filtered: True if rests are removed. Defaults to True
+
+    Returns:
+        dataframe with one row by bar: performer, fantasia, movement, bar, measure, repeated,
+        n (events in the window), q1, median, q3, iqr
+    """
+    bars = events.groupby(['performer', 'fantasia', 'bar'], sort=False)[['movement', 'measure', 'repeated']].first()
+    bars = bars.reset_index()
+    if rest_filtered:
+        events = events[events['voice'] != '.']
+    values = events[metric].to_numpy(dtype=float)
+    keys = events[['performer', 'fantasia']].to_numpy()
+    tables = []
+    for (performer, fantasia), plan in bars.groupby(['performer', 'fantasia'], sort=False):
+        selected = np.flatnonzero((keys[:, 0] == performer) & (keys[:, 1] == fantasia))
+        event_bars = events['bar'].to_numpy()[selected]
+        # movements of the performance: consecutive bars of the same movement
+        segment = np.cumsum(np.diff(plan['movement'].to_numpy(), prepend=-1) != 0)
+        segment_of_bar = dict(zip(plan['bar'], segment))
+        event_segment = np.array([segment_of_bar[b] for b in event_bars], dtype=np.int64)
+        stats = np.full((len(plan), 4), np.nan)
+        stats[:, 0] = 0
+        for s in np.unique(segment):
+            in_segment = plan['bar'].to_numpy()[segment == s]
+            mask = event_segment == s
+            if not mask.any():
+                continue
+            res = rolling_quantiles(values[selected][mask], event_bars[mask], window)
+            # bars without events (rests only) keep the statistics of the window
+            offsets = np.searchsorted(plan['bar'].to_numpy(), in_segment)
+            first = event_bars[mask][0]
+            inside = (in_segment >= first) & (in_segment - first < len(res))
+            stats[offsets[inside]] = res[in_segment[inside] - first]
+        table = plan.copy()
+        table['n'] = stats[:, 0].astype(int)
+        table['q1'], table['median'], table['q3'] = stats[:, 1], stats[:, 2], stats[:, 3]
+        table['iqr'] = table['q3'] - table['q1']
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+def corpus_rolling(metric: str, window: int, fantasias: tuple[int]=None, fugato: bool=False,
+                   movement_name: str=None)->pd.DataFrame:
+    """Rolling median and IQR of a metric for all performers
+
+    Args:
+        - metric: deltaioi or deltaonset
+        - window: number of bars of the window
+        - fantasias: fantasias numbers. Defaults to None for all fantasias
+        - fugato: True if only fugatos movements, False otherwise. Defaults to False
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+
+    Returns:
+        rolling_table of the selected performances
+    """
+    return rolling_table(corpus_events(fantasias=fantasias, fugato=fugato, movement_name=movement_name),
+                         metric, window)
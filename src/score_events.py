@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the table of the events (notes and rests) of the MXL scores, extracted once
+and cached on disk, and the consistency checks of the alignments against their score with a
+banded sequence alignment on pitch and duration
+"""
+
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from src import lazy_import
+from src.data import MXLS, PERFORMERS, get_all_data
+from src.music21_tools import parsed_score
+from src.parallel import map_pool
+from src.pitches import pitch_numbers, REST
+
+# music21 imported at the first extraction
+bar = lazy_import('music21.bar')
+
+#####################################
+# parameters
+######################################
+
+# folder of the score event tables
+EVENTS_CACHE = "data/cache/score_events"
+# durations tokens: number of divisions of a quarter note (see motifs)
+DURATION_DIVISIONS = 48
+# smallest half-width of the band of the sequence alignment
+BAND = 32
+COLUMNS = ['measure', 'number', 'offset', 'duration', 'grace', 'midi', 'pitchname',
+           'time_signature', 'repeat_start', 'repeat_end']
+
+
+#####################################
+# score event tables
+######################################
+
+def extract_score_events(n: int)->pd.DataFrame:
+    """Extracts the events of the MXL score of a fantasia, tied notes being merged
+    as in the alignments
+
+    Args:
+        - n: fantasia number
+
+    Returns:
+        dataframe with columns measure (index of the measure from 1, as in the alignments),
+        number (printed measure number), offset (quarter notes from the start of the measure),
+        duration (quarter notes), grace, midi (REST for rests), pitchname, time_signature,
+        repeat_start, repeat_end (repeat barlines of the measure)
+    """
+    part = parsed_score(n).parts[0].stripTies(matchByPitch=True)
+    rows = []
+    time_signature = None
+    for i, m in enumerate(part.getElementsByClass('Measure')):
+        if m.timeSignature != None:
+            time_signature = m.timeSignature.ratioString
+        elif time_signature == None:
+            time_signature = m.getContextByClass('TimeSignature').ratioString
+        repeat_start = isinstance(m.leftBarline, bar.Repeat) and m.leftBarline.direction == 'start'
+        repeat_end = isinstance(m.rightBarline, bar.Repeat) and m.rightBarline.direction == 'end'
+        for e in m.recurse().notesAndRests:
+            if e.isChord:
+                # highest note of a chord
+                e = e.notes[-1]
+            rows.append((i + 1, m.number, float(e.getOffsetInHierarchy(m)), float(e.quarterLength),
+                         e.duration.isGrace, REST if e.isRest else e.pitch.midi,
+                         '0' if e.isRest else e.nameWithOctave, time_signature, repeat_start, repeat_end))
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def score_events_path(n: int, mtime: float)-> str:
+    """Returns the path of the cached event table of a fantasia
+
+    Args:
+        - n: fantasia number
+        - mtime: modification time of the MXL file
+
+    Returns:
+        path of the pickle file
+    """
+    return f"{EVENTS_CACHE}/fantasia{n}_{int(mtime * 1000)}.pkl"
+
+
+@lru_cache(maxsize=12)
+def load_score_events(n: int, mtime: float)->pd.DataFrame:
+    """Returns the event table of a fantasia, read from disk if cached, extracted and cached otherwise
+    (tables of previous versions of the MXL file being removed)
+
+    Args:
+        - n: fantasia number
+        - mtime: modification time of the MXL file (key of the caches)
+
+    Returns:
+        event table (cached, not to be modified), see extract_score_events
+    """
+    path = score_events_path(n, mtime)
+    if os.path.exists(path):
+        try:
+            return pd.read_pickle(path)
+        except Exception:
+            os.remove(path)
+    events = extract_score_events(n)
+    os.makedirs(EVENTS_CACHE, exist_ok=True)
+    for f in os.listdir(EVENTS_CACHE):
+        if f.startswith(f"fantasia{n}_"):
+            os.remove(f"{EVENTS_CACHE}/{f}")
+    events.to_pickle(path)
+    return events
+
+
+def score_events(n: int)->pd.DataFrame:
+    """Returns the event table of a fantasia from the caches
+
+    Args:
+        - n: fantasia number
+
+    Returns:
+        event table (cached, not to be modified), see extract_score_events
+    """
+    return load_score_events(n, os.path.getmtime(MXLS[n]))
+
+
+#####################################
+# sequence alignment
+######################################
+
+def banded_alignment(a: np.ndarray, b: np.ndarray, band: int=BAND)->list[tuple[int, int]]:
+    """Edit-distance alignment of two sequences of tokens, restricted to a band around the diagonal.
+    Each row of the dynamic programming is vectorised: insertions along a row are a running
+    minimum of (cost - column) + column
+
+    Args:
+        - a: tokens (n, k) of the first sequence
+        - b: tokens (m, k) of the second sequence
+        - band: half-width of the band, widened to the difference of lengths. Defaults to BAND
+
+    Returns:
+        aligned pairs (i, j) in order, i = -1 for an element of b only, j = -1 for an element of a only
+    """
+    n, m = len(a), len(b)
+    # common prefix and suffix: aligned without dynamic programming
+    length = min(n, m)
+    equal = np.all(a[:length] == b[:length], axis=1)
+    prefix = int(np.argmin(equal)) if not np.all(equal) else length
+    equal = np.all(a[n-length:][::-1] == b[m-length:][::-1], axis=1)[:length - prefix]
+    suffix = int(np.argmin(equal)) if not np.all(equal) else len(equal)
+    head = [(i, i) for i in range(prefix)]
+    tail = [(n - suffix + k, m - suffix + k) for k in range(suffix)]
+    a, b = a[prefix:n-suffix], b[prefix:m-suffix]
+    n, m = len(a), len(b)
+    if n == 0 or m == 0:
+        middle = [(prefix + i, -1) for i in range(n)] + [(-1, prefix + j) for j in range(m)]
+        return head + middle + tail
+    band = max(band, abs(n - m) + 1)
+    big = n + m + 1
+    cost = np.full((n + 1, m + 1), big, dtype=np.int32)
+    cost[0, :min(m, band) + 1] = np.arange(min(m, band) + 1)
+    columns = np.arange(m + 1)
+    for i in range(1, n + 1):
+        center = i * m // n
+        lo, hi = max(0, center - band), min(m, center + band)
+        j = columns[lo:hi+1]
+        previous = cost[i-1]
+        row = previous[lo:hi+1] + 1
+        inner = j >= 1
+        different = np.any(a[i-1] != b[j[inner] - 1], axis=1)
+        row[inner] = np.minimum(row[inner], previous[j[inner] - 1] + different)
+        row = np.minimum.accumulate(row - j) + j
+        cost[i, lo:hi+1] = np.minimum(row, big)
+    # traceback
+    pairs = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and cost[i, j] == cost[i-1, j-1] + np.any(a[i-1] != b[j-1]):
+            pairs.append((prefix + i - 1, prefix + j - 1))
+            i, j = i - 1, j - 1
+        elif i > 0 and cost[i, j] == cost[i-1, j] + 1:
+            pairs.append((prefix + i - 1, -1))
+            i -= 1
+        else:
+            pairs.append((-1, prefix + j - 1))
+            j -= 1
+    return head + pairs[::-1] + tail
+
+
+#####################################
+# consistency checks
+######################################
+
+def alignment_table(performer: str, fantasia: int)->pd.DataFrame:
+    """Events of an alignment with their row in the csv file, movements separators being removed
+
+    Args:
+        - performer: name of the performer
+        - fantasia: fantasia number
+
+    Returns:
+        dataframe with columns row, pitchname, midi, duration, time_signature, measure, repeated
+    """
+    data = pd.DataFrame(get_all_data(performer, fantasia))
+    data.insert(0, 'row', np.arange(len(data)))
+    data = data[data['movement'] != 'x']
+    return pd.DataFrame({'row': data['row'].to_numpy(),
+                         'pitchname': data['pitchname'].to_numpy(),
+                         'midi': pitch_numbers(data['pitchname'].to_numpy()),
+                         'duration': data['duration'].astype(float).to_numpy(),
+                         'time_signature': data['time_signature'].to_numpy(),
+                         'measure': data['measure'].astype(int).to_numpy(),
+                         'repeated': data['repeated'].astype(int).to_numpy()})
+
+
+def tokens(midi: np.ndarray, duration: np.ndarray)->np.ndarray:
+    """Tokens of a sequence of events for the alignment
+
+    Args:
+        - midi: MIDI numbers (REST for rests)
+        - duration: durations in quarter notes
+
+    Returns:
+        array (events, 2) of pitch and duration tokens
+    """
+    return np.stack([np.asarray(midi, dtype=np.int64),
+                     np.round(np.asarray(duration, dtype=float) * DURATION_DIVISIONS).astype(np.int64)], axis=1)
+
+
+def check_alignment(performer: str, fantasia: int, band: int=BAND)->pd.DataFrame:
+    """Checks an alignment against its score: for each repeat number, the events of the alignment
+    (sorted by measure) are aligned with the events of the same measures of the score
+
+    Args:
+        - performer: name of the performer
+        - fantasia: fantasia number
+        - band: half-width of the band of the sequence alignment. Defaults to BAND
+
+    Returns:
+        dataframe of the differences with columns performer, fantasia, repeated, kind ('inserted':
+        event of the alignment only, 'missing': event of the score only, 'mislabelled'), field
+        ('pitch', 'duration', 'measure', 'time signature', '' for inserted and missing events),
+        measure, row (row of the alignment csv file, -1 for missing events), alignment and score values
+    """
+    score = score_events(fantasia)
+    performance = alignment_table(performer, fantasia)
+    score_tokens = tokens(score['midi'], score['duration'])
+    # compared column and displayed column of each field
+    fields = {'pitch': ('midi', 'pitchname'), 'duration': ('duration', 'duration'),
+              'measure': ('measure', 'measure'), 'time signature': ('time_signature', 'time_signature')}
+    differences = []
+    for r in np.unique(performance['repeated']):
+        played = performance[performance['repeated'] == r].sort_values('measure', kind='stable')
+        expected = score[score['measure'].isin(played['measure'])]
+        pairs = np.array(banded_alignment(tokens(played['midi'], played['duration']),
+                                          score_tokens[expected.index], band), dtype=np.int64).reshape(-1, 2)
+        inserted, missing = pairs[:, 1] < 0, pairs[:, 0] < 0
+        for i in pairs[inserted, 0]:
+            e = played.iloc[i]
+            differences.append((r, 'inserted', '', e['measure'], e['row'], f"{e['pitchname']} {e['duration']}", ''))
+        for j in pairs[missing, 1]:
+            e = expected.iloc[j]
+            differences.append((r, 'missing', '', e['measure'], -1, '', f"{e['pitchname']} {e['duration']}"))
+        matched = pairs[~inserted & ~missing]
+        left, right = played.iloc[matched[:, 0]], expected.iloc[matched[:, 1]]
+        for field, (compared, displayed) in fields.items():
+            different = np.flatnonzero(left[compared].to_numpy() != right[compared].to_numpy())
+            for k in different:
+                differences.append((r, 'mislabelled', field, right['measure'].iat[k], left['row'].iat[k],
+                                    str(left[displayed].iat[k]), str(right[displayed].iat[k])))
+    report = pd.DataFrame(differences, columns=['repeated', 'kind', 'field', 'measure', 'row',
+                                                'alignment', 'score'])
+    report.insert(0, 'fantasia', fantasia)
+    report.insert(0, 'performer', performer)
+    return report.sort_values(['repeated', 'measure', 'row'], kind='stable').reset_index(drop=True)
+
+
+def check_corpus(performers: list[str]=None, fantasias: list[int]=None, band: int=BAND,
+                 workers: int=None)->pd.DataFrame:
+    """Checks all alignments against their score, in a process pool
+
+    Args:
+        - performers: names of the performers. Defaults to None for all performers
+        - fantasias: fantasias numbers. Defaults to None for all fantasias
+        - band: half-width of the band of the sequence alignment. Defaults to BAND
+        - workers: number of processes. Defaults to None for the number of cpus
+
+    Returns:
+        concatenation of check_alignment
+    """
+    if performers == None:
+        performers = PERFORMERS
+    if fantasias == None:
+        fantasias = range(1, 13)
+    # event tables extracted once before the pool
+    for f in fantasias:
+        score_events(f)
+    args = [(p, f, band) for p in performers for f in fantasias]
+    return pd.concat(map_pool(check_alignment, args, workers=workers), ignore_index=True)
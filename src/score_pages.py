@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the pre-rendered images of the pages of the scores and the index of the
+measures (page and vertical bounding box of their system), so that only the parts of the score
+covering selected measures are sent to the browser. Systems and pages breaks are read from the
+MXL layout (exported with the PDF), systems positions from the measures numbers of the PDF.
+Rendering is an offline step needing the optional dependency pypdfium2: python -m src.score_pages
+"""
+
+from __future__ import annotations
+import importlib.util
+import io
+import os
+import shutil
+import sys
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from src import lazy_import
+from src.data import MXLS, PDFS
+from src.music21_tools import parsed_score
+
+# optional dependency, imported at the first rendering
+pdfium = lazy_import('pypdfium2')
+Image = lazy_import('PIL.Image')
+
+#####################################
+# parameters
+######################################
+
+# folder of the pages images and measures indexes
+PAGES_CACHE = "data/cache/score_pages"
+# rendering scale (1 for 72 dpi)
+SCALE = 2.0
+# largest abscissa (pt) of the measures numbers printed at the start of systems
+NUMBERS_MARGIN = 60.0
+# space (pt) kept above the measure number of a system
+TOP_PADDING = 4.0
+
+
+#####################################
+# layout
+######################################
+
+def has_renderer()->bool:
+    """True if the optional dependency pypdfium2 is installed
+
+    Returns:
+        bool
+    """
+    return importlib.util.find_spec('pypdfium2') != None
+
+
+def systems_layout(n: int)->pd.DataFrame:
+    """Page and system of each measure of a fantasia, from the layout of the MXL score
+
+    Args:
+        - n: fantasia number
+
+    Returns:
+        dataframe with columns measure (index from 1), number (printed measure number),
+        page (from 1), system (from 1 in its page)
+    """
+    rows = []
+    page, system = 1, 0
+    for i, m in enumerate(parsed_score(n).parts[0].getElementsByClass('Measure')):
+        if any(l.isNew for l in m.getElementsByClass('PageLayout')):
+            page, system = page + 1, 1
+        elif i == 0 or any(l.isNew for l in m.getElementsByClass('SystemLayout')):
+            system += 1
+        rows.append((i + 1, m.number, page, system))
+    return pd.DataFrame(rows, columns=['measure', 'number', 'page', 'system'])
+
+
+def printed_numbers(document)->list[dict[str:float]]:
+    """Measures numbers printed in the left margin of each page of a PDF
+
+    Args:
+        - document: pypdfium2 PdfDocument
+
+    Returns:
+        for each page {number : top ordinate (pt, from the bottom of the page)}
+    """
+    res = []
+    for page in document:
+        text = page.get_textpage()
+        digits = {}
+        for i in range(text.count_chars()):
+            c = text.get_text_range(i, 1)
+            left, bottom, right, top = text.get_charbox(i)
+            if c.isdigit() and left < NUMBERS_MARGIN:
+                digits.setdefault(round(top), []).append((left, c))
+        res.append({int(''.join(c for _, c in sorted(d))): float(top) for top, d in digits.items()})
+    return res
+
+
+def measures_boxes(layout: pd.DataFrame, numbers: list[dict[str:float]], height: float)->pd.DataFrame:
+    """Vertical bounding boxes of the systems of the measures. Systems without printed number
+    (first system, start of movements) are placed one median system spacing above the next system
+    of their page (or below the previous one), whole pages being kept if no system is numbered
+
+    Args:
+        - layout: pages and systems of the measures (see systems_layout)
+        - numbers: printed measures numbers positions (see printed_numbers)
+        - height: height of the pages (pt)
+
+    Returns:
+        layout with columns top and bottom (fractions of the page height from its top)
+    """
+    firsts = layout.groupby(['page', 'system'], sort=False).first().reset_index()
+    pages = firsts['page'].to_numpy()
+    y = np.array([numbers[p - 1].get(number, np.nan) + TOP_PADDING
+                  for p, number in zip(pages, firsts['number'])])
+    same_page = pages[1:] == pages[:-1]
+    spacings = (y[:-1] - y[1:])[same_page & ~np.isnan(y[:-1]) & ~np.isnan(y[1:])]
+    spacing = float(np.median(spacings)) if len(spacings) else height / 8
+    for i in range(len(y) - 2, -1, -1):
+        if np.isnan(y[i]) and same_page[i]:
+            y[i] = y[i + 1] + spacing
+    for i in range(1, len(y)):
+        if np.isnan(y[i]) and same_page[i - 1]:
+            y[i] = y[i - 1] - spacing
+    bottom = np.append(np.where(same_page, y[1:], y[:-1] - spacing), y[-1] - spacing)
+    unknown = np.isnan(y)
+    firsts['top'] = np.where(unknown, 0.0, np.clip(1 - y / height, 0, 1))
+    firsts['bottom'] = np.where(unknown, 1.0, np.clip(1 - bottom / height, 0, 1))
+    return layout.merge(firsts[['page', 'system', 'top', 'bottom']], on=['page', 'system'])
+
+
+#####################################
+# cache
+######################################
+
+def pages_folder(n: int)->str:
+    """Returns the cache folder of a fantasia, named after the modification times of its PDF and MXL
+
+    Args:
+        - n: fantasia number
+
+    Returns:
+        path of the folder
+    """
+    pdf, mxl = os.path.getmtime(f"{PDFS}/Fantasia{n}.pdf"), os.path.getmtime(MXLS[n])
+    return f"{PAGES_CACHE}/fantasia{n}_{int(pdf * 1000)}_{int(mxl * 1000)}"
+
+
+def build_score_pages(n: int, scale: float=SCALE)->str:
+    """Renders the pages of the PDF score of a fantasia to grayscale PNG images and saves
+    the index of its measures (folders of previous versions being removed). Needs pypdfium2
+
+    Args:
+        - n: fantasia number
+        - scale: rendering scale (1 for 72 dpi). Defaults to SCALE
+
+    Returns:
+        cache folder with index.pkl and page_1.png, page_2.png...
+    """
+    folder = pages_folder(n)
+    document = pdfium.PdfDocument(f"{PDFS}/Fantasia{n}.pdf")
+    index = measures_boxes(systems_layout(n), printed_numbers(document), document[0].get_size()[1])
+    if os.path.isdir(PAGES_CACHE):
+        for f in os.listdir(PAGES_CACHE):
+            if f.startswith(f"fantasia{n}_"):
+                shutil.rmtree(f"{PAGES_CACHE}/{f}")
+    os.makedirs(folder)
+    for i, page in enumerate(document):
+        page.render(scale=scale, grayscale=True).to_pil().convert('L').save(f"{folder}/page_{i+1}.png",
+                                                                            optimize=True)
+    index.to_pickle(f"{folder}/index.pkl")
+    return folder
+
+
+@lru_cache(maxsize=12)
+def load_measures_index(folder: str)->pd.DataFrame:
+    """Returns the index of the measures of a cache folder (cached)
+
+    Args:
+        - folder: cache folder (see pages_folder)
+
+    Returns:
+        dataframe with columns measure, number, page, system, top, bottom (see measures_boxes)
+    """
+    return pd.read_pickle(f"{folder}/index.pkl")
+
+
+def measures_index(n: int)->pd.DataFrame:
+    """Returns the index of the measures of a fantasia if its pages are rendered
+    (never rendered at request time, see the offline step of the module)
+
+    Args:
+        - n: fantasia number
+
+    Returns:
+        dataframe with columns measure, number, page, system, top, bottom (see measures_boxes),
+        None if the pages are not rendered
+    """
+    folder = pages_folder(n)
+    if not os.path.exists(f"{folder}/index.pkl"):
+        return None
+    return load_measures_index(folder)
+
+
+#####################################
+# selection
+######################################
+
+def selection_boxes(index: pd.DataFrame, start: int, end: int)->list[tuple[int, float, float]]:
+    """Parts of pages covering a range of measures
+
+    Args:
+        - index: index of the measures (see measures_index)
+        - start: starting measure index
+        - end: last measure index
+
+    Returns:
+        (page, top, bottom) for each page, top and bottom being fractions of the page height
+    """
+    rows = index[(index['measure'] >= min(start, end)) & (index['measure'] <= max(start, end))]
+    if len(rows) == 0:
+        rows = index.iloc[[-1]]
+    return [(int(p), float(g['top'].min()), float(g['bottom'].max())) for p, g in rows.groupby('page')]
+
+
+@lru_cache(maxsize=128)
+def page_image(folder: str, page: int, top: float=0.0, bottom: float=1.0)->bytes:
+    """Returns the PNG image of a vertical part of a rendered page (cached by cache folder,
+    named after the modification times of the PDF and the MXL)
+
+    Args:
+        - folder: cache folder (see pages_folder)
+        - page: page number (from 1)
+        - top: top of the part (fraction of the page height). Defaults to 0.0
+        - bottom: bottom of the part (fraction of the page height). Defaults to 1.0
+
+    Returns:
+        PNG bytes
+    """
+    image = Image.open(f"{folder}/page_{page}.png")
+    image = image.crop((0, int(top * image.height), image.width, int(np.ceil(bottom * image.height))))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def selection_images(n: int, start: int, end: int)->list[bytes]:
+    """Returns the images of the systems covering a range of measures of a fantasia
+
+    Args:
+        - n: fantasia number
+        - start: starting measure index
+        - end: last measure index
+
+    Returns:
+        PNG bytes for each page, None if the pages are not rendered
+    """
+    index = measures_index(n)
+    if index is None:
+        return None
+    folder = pages_folder(n)
+    return [page_image(folder, *box) for box in selection_boxes(index, start, end)]
+
+
+if __name__ == '__main__':
+    # offline step: python -m src.score_pages [fantasia numbers], all fantasias by default
+    if not has_renderer():
+        sys.exit("pypdfium2 is needed to render the scores (extra score-pages)")
+    for fantasia in [int(a) for a in sys.argv[1:]] or MXLS:
+        print(build_score_pages(fantasia))
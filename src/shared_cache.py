@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the cache of results shared by all the sessions of the server (the modules
+being imported once by process): results are kept in memory with an estimate of their size
+and the least recently used ones are evicted beyond a memory budget. Identical selections
+from any session are computed once, concurrent requests waiting for the first computation
+"""
+
+import os
+import sys
+import threading
+from collections import Counter, OrderedDict, namedtuple
+from contextlib import contextmanager
+from src import lazy_import
+from src.data import *
+from src.durations_analyse_tools import get_all_metric_and_data_for_one_performer
+from src.stats import timings, results_to_stats
+from src.parallel import imap_pool
+
+# heavy imports, run on the code paths using them
+pd = lazy_import('pandas')
+
+#####################################
+# parameters
+######################################
+
+# memory budget of the shared results in bytes (environment variable RESULTS_CACHE_MB)
+MAX_BYTES = int(os.environ.get('RESULTS_CACHE_MB', 1024)) * 2**20
+# estimated size of a python float or int in a list
+NUMBER_BYTES = sys.getsizeof(1.0)
+
+# key of a shared result
+ResultKey = namedtuple('ResultKey', ['scope', 'performer', 'metric', 'movement_name', 'fugato',
+                                     'fantasia', 'measures', 'window'])
+
+
+def result_key(scope: str, performer: str=None, metric: str=None, movement_name: str=None,
+               fugato: bool=False, fantasia: int=None, measures: tuple[int, int, int]=None,
+               window: int=None)->ResultKey:
+    """Key of a shared result
+
+    Args:
+        - scope: page scope, for instance 'measures', 'movements', 'fugatos', 'corpus'
+        - performer: name of the performer. Defaults to None for all performers
+        - metric: deltaioi or deltaonset. Defaults to None
+        - movement_name: name of a type of movement. Defaults to None for all movements
+        - fugato: True if only fugatos movements. Defaults to False
+        - fantasia: fantasia number. Defaults to None for all fantasias
+        - measures: (start, end, repeated). Defaults to None for all measures
+        - window: number of bars of rolling windows. Defaults to None
+
+    Returns:
+        ResultKey
+    """
+    return ResultKey(scope, performer, metric, movement_name, fugato, fantasia, measures, window)
+
+
+#####################################
+# memory accounting
+######################################
+
+def estimated_size(value, seen: set=None)->int:
+    """Estimated memory size of a result (containers, numbers, strings, numpy arrays, dataframes),
+    lists of numbers being estimated from their length, shared objects counted once
+    (results are expected to hold their large tables as dataframes, see compute_performer_results)
+
+    Args:
+        - value: result
+        - seen: ids of the objects already counted. Defaults to None
+
+    Returns:
+        size in bytes
+    """
+    if seen == None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if hasattr(value, 'memory_usage') and hasattr(value, 'columns'):
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimated_size(k, seen) + estimated_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        if all(isinstance(v, (int, float)) for v in value):
+            size += NUMBER_BYTES * len(value)
+        else:
+            size += sum(estimated_size(v, seen) for v in value)
+    return size
+
+
+#####################################
+# cache
+######################################
+
+class ResultCache:
+    """Thread-safe least recently used cache of results with a memory budget
+
+    Attributes:
+        - max_bytes: memory budget
+        - entries: {key : (result, size)} from the least to the most recently used
+        - used: total size of the entries
+        - hits, misses, evictions: counters
+        - foreground: number of requests of pages in progress (background computations waiting for none)
+        - waiters: {key : number of requests waiting for the result being computed}
+    """
+
+    def __init__(self, max_bytes: int=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.used = 0
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        self.lock = threading.Lock()
+        # computations in progress: {key : event set when done}
+        self.pending = dict()
+        self.foreground = 0
+        self.waiters = Counter()
+        self.idle = threading.Condition(self.lock)
+
+    def __contains__(self, key)->bool:
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key, default=None):
+        """Returns a result, marked as recently used
+
+        Args:
+            - key: key of the result
+            - default: returned if the result is not cached. Defaults to None
+
+        Returns:
+            result
+        """
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key, value):
+        """Stores a result, evicting the least recently used ones beyond the memory budget
+        (results larger than the budget are not stored)
+
+        Args:
+            - key: key of the result
+            - value: result (shared by all sessions, not to be modified)
+        """
+        size = estimated_size(value)
+        with self.lock:
+            if key in self.entries:
+                self.used -= self.entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.used += size
+            while self.used > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.used -= evicted
+                self.evictions += 1
+
+    def computing(self, key)->bool:
+        """True if a result is being computed
+
+        Args:
+            - key: key of the result
+
+        Returns:
+            bool
+        """
+        with self.lock:
+            return key in self.pending
+
+    def reserve(self, key)->bool:
+        """Registers the computation of a result outside of get_or_compute, the requests of the
+        result waiting for it until released
+
+        Args:
+            - key: key of the result
+
+        Returns:
+            True if reserved, False if the result is cached or already being computed
+        """
+        with self.lock:
+            if key in self.entries or key in self.pending:
+                return False
+            self.misses += 1
+            self.pending[key] = threading.Event()
+            return True
+
+    def release(self, key):
+        """Ends the computation of a result (nothing if not being computed), waking up its requests
+
+        Args:
+            - key: key of the result
+        """
+        with self.lock:
+            event = self.pending.pop(key, None)
+        if event != None:
+            event.set()
+
+    def get_or_compute(self, key, func, *args, **kwargs):
+        """Returns a cached result, computed by func if missing. A result requested by several
+        sessions at the same time is computed once, the others waiting for it
+
+        Args:
+            - key: key of the result
+            - func: computation of the result
+            - args, kwargs: arguments of func
+
+        Returns:
+            result (shared by all sessions, not to be modified)
+        """
+        while True:
+            with self.lock:
+                if key in self.entries:
+                    self.hits += 1
+                    self.entries.move_to_end(key)
+                    return self.entries[key][0]
+                event = self.pending.get(key)
+                if event == None:
+                    self.misses += 1
+                    event = self.pending[key] = threading.Event()
+                    break
+                # a background computation of the result is not paused (see wait_idle)
+                self.waiters[key] += 1
+                self.idle.notify_all()
+            event.wait()
+            # if the computation failed (or was not stored), computed by the next request
+            with self.lock:
+                self.waiters[key] -= 1
+                if self.waiters[key] == 0:
+                    del self.waiters[key]
+                if key not in self.entries:
+                    return func(*args, **kwargs)
+        try:
+            value = func(*args, **kwargs)
+            self.put(key, value)
+            return value
+        finally:
+            self.release(key)
+
+    @contextmanager
+    def foreground_request(self):
+        """Context of a request of a page, during which background computations do not start"""
+        with self.lock:
+            self.foreground += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.foreground -= 1
+                if self.foreground == 0:
+                    self.idle.notify_all()
+
+    def wait_idle(self, key=None):
+        """Waits until no request of a page is in progress, or until a request is waiting for
+        the result being computed by the caller
+
+        Args:
+            - key: key of the result being computed. Defaults to None
+        """
+        with self.lock:
+            self.idle.wait_for(lambda: self.foreground == 0 or self.waiters[key] > 0)
+
+    def clear(self):
+        """Removes all results"""
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+    def stats(self)->dict[str:int]:
+        """Counters of the cache
+
+        Returns:
+            {'entries', 'bytes', 'max_bytes', 'hits', 'misses', 'evictions' : value}
+        """
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.used, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+# cache of the server
+RESULTS = ResultCache()
+
+
+#####################################
+# shared results of the pages
+######################################
+
+def shared_result(key: ResultKey, func, *args, **kwargs):
+    """Result of the server cache for a page, computed by func if missing (see ResultCache.get_or_compute),
+    background computations being paused until it is returned
+
+    Args:
+        - key: key of the result (see result_key)
+        - func: computation of the result
+        - args, kwargs: arguments of func
+
+    Returns:
+        result (shared by all sessions, not to be modified)
+    """
+    with RESULTS.foreground_request():
+        return RESULTS.get_or_compute(key, func, *args, **kwargs)
+
+
+def compute_performer_results(performer: str, metric: str, movement_name: str=None,
+                              fugato: bool=False)->dict:
+    """Metric values, categories and statistics of a performer on the whole corpus,
+    a type of movement or the fugatos
+
+    Args:
+        - performer: name of the performer
+        - metric: deltaioi or deltaonset
+        - movement_name: name of a type of movement. Defaults to None for all movements
+        - fugato: True if only fugatos movements. Defaults to False
+
+    Returns:
+        {'table': dataframe of the data elements with the metric column (text columns as categories),
+         'results': timings, 'statistics': results_to_stats of the performer}
+        (confidence intervals being computed by the pages displaying them)
+    """
+    metric_all, data_all = get_all_metric_and_data_for_one_performer(performer, metric=metric,
+                                                                     movement_name=movement_name,
+                                                                     fugato=fugato)
+    results = timings(metric, performer, metric_all, data_all)
+    table = pd.DataFrame.from_dict(data_all)
+    table[metric] = metric_all
+    table = table.astype({c: 'category' for c in table.columns if table[c].dtype == object})
+    return {'table': table, 'results': results, 'statistics': results_to_stats(results[performer])}
+
+
+def performer_results(scope: str, performer: str, metric: str, movement_name: str=None,
+                      fugato: bool=False)->dict:
+    """Shared results of a performer (see compute_performer_results)
+
+    Args:
+        - scope: page scope
+        - performer: name of the performer
+        - metric: deltaioi or deltaonset
+        - movement_name: name of a type of movement. Defaults to None for all movements
+        - fugato: True if only fugatos movements. Defaults to False
+
+    Returns:
+        results (shared by all sessions, not to be modified)
+    """
+    key = result_key(scope, performer, metric, movement_name, fugato)
+    return shared_result(key, compute_performer_results, performer, metric, movement_name, fugato)
+
+
+def performers_timings(metric: str, workers: int=None):
+    """Shared timings of each performer on the whole corpus (results of the scope 'corpus'), yielded
+    as soon as each one is ready: cached performers first, then the missing ones computed in a
+    process pool (reserved in the cache, so that other requests wait for them), the ones being
+    computed by another session or in background being waited for last. Background computations
+    are paused while a result is computed, not while the caller handles a yielded one
+
+    Args:
+        - metric: deltaioi or deltaonset
+        - workers: number of processes. Defaults to None for the number of cpus
+
+    Yields:
+        (performer, {group : metric values}) (shared by all sessions, not to be modified)
+    """
+    keys = {p: result_key('corpus', p, metric) for p in PERFORMERS}
+    missing = []
+    for p in PERFORMERS:
+        value = RESULTS.get(keys[p])
+        if value == None:
+            missing.append(p)
+        else:
+            yield p, value['results'][p]
+    todo = [p for p in missing if RESULTS.reserve(keys[p])]
+    computing = [p for p in missing if p not in todo]
+    pool = imap_pool(compute_performer_results, [(p, metric) for p in todo], workers=workers)
+    try:
+        while True:
+            with RESULTS.foreground_request():
+                i, value = next(pool, (None, None))
+                if i == None:
+                    break
+                RESULTS.put(keys[todo[i]], value)
+                RESULTS.release(keys[todo[i]])
+            yield todo[i], value['results'][todo[i]]
+    finally:
+        pool.close()
+        # failed or stopped: the requests of the remaining ones compute them
+        for p in todo:
+            RESULTS.release(keys[p])
+    for p in computing:
+        value = shared_result(keys[p], compute_performer_results, p, metric)
+        yield p, value['results'][p]
+
+
+def corpus_timings(metric: str)->dict[str:dict[str:list]]:
+    """Shared timings of all performers on the whole corpus (see performers_timings)
+
+    Args:
+        - metric: deltaioi or deltaonset
+
+    Returns:
+        {performer : {group : metric values}} (shared by all sessions, not to be modified)
+    """
+    ready = dict(performers_timings(metric))
+    return {p: ready[p] for p in PERFORMERS}
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines batch nonparametric tests between performers for all categories:
+Kruskal-Wallis across all performers, pairwise Mann-Whitney with Cliff's delta,
+and their permutation variants
+"""
+
+from itertools import combinations
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata, chi2, norm
+from src.parallel import run_chunks
+
+#####################################
+# parameters
+######################################
+
+# permutations drawn for the permutation variants of the tests
+N_PERMUTATIONS = 1000
+# permutation p-values only for pooled groups up to this size (asymptotic p-values are accurate beyond)
+PERMUTATION_MAX_SIZE = 5000
+# maximal number of permuted labels held in memory at once by a worker
+BLOCK_ELEMENTS = 2_000_000
+# permuted labels (all categories) below which the categories are tested in the calling process
+SERIAL_ELEMENTS = 5_000_000
+
+
+#####################################
+# statistics
+######################################
+
+def tie_correction(ranks: np.ndarray)->float:
+    """Returns the tie correction factor of a ranked sample
+
+    Args:
+        - ranks: average ranks of the pooled sample
+
+    Returns:
+        1 - sum(t^3 - t)/(N^3 - N) with t the sizes of the groups of ties
+    """
+    n = len(ranks)
+    if n < 2:
+        return 1.0
+    _, t = np.unique(ranks, return_counts=True)
+    return 1.0 - float(np.sum(t**3 - t)) / (n**3 - n)
+
+
+def kruskal_h(rank_sums: np.ndarray, sizes: np.ndarray, correction: float)->np.ndarray:
+    """Kruskal-Wallis H statistic from the rank sums of each sample (vectorised on the last axis)
+
+    Args:
+        - rank_sums: sums of ranks of each sample, shape (..., number of samples)
+        - sizes: number of elements of each sample
+        - correction: tie correction factor
+
+    Returns:
+        H statistic(s)
+    """
+    n = sizes.sum()
+    filled = sizes > 0
+    h = 12.0 / (n * (n + 1)) * np.sum(rank_sums[..., filled]**2 / sizes[filled], axis=-1) - 3 * (n + 1)
+    return h / correction if correction > 0 else np.zeros_like(h)
+
+
+def mann_whitney(x: np.ndarray, y: np.ndarray)->tuple[float, float, float]:
+    """Mann-Whitney U test (asymptotic with tie correction) and Cliff's delta, from sorted comparisons
+
+    Args:
+        - x: first sample
+        - y: second sample
+
+    Returns:
+        (U of x, two-sided p-value, Cliff's delta = P(x>y) - P(x<y))
+    """
+    n1, n2 = len(x), len(y)
+    if n1 == 0 or n2 == 0:
+        return np.nan, np.nan, np.nan
+    ys = np.sort(y)
+    below = np.searchsorted(ys, x, side='left')
+    above = np.searchsorted(ys, x, side='right')
+    u = float(np.sum(below) + 0.5 * np.sum(above - below))
+    delta = 2 * u / (n1 * n2) - 1
+    correction = tie_correction(rankdata(np.concatenate((x, y))))
+    sigma = np.sqrt(n1 * n2 * (n1 + n2 + 1) / 12.0 * correction)
+    if sigma == 0:
+        return u, 1.0, delta
+    z = (abs(u - n1 * n2 / 2) - 0.5) / sigma
+    return u, float(min(1.0, 2 * norm.sf(max(z, 0)))), delta
+
+
+def holm(pvalues: np.ndarray)->np.ndarray:
+    """Holm-Bonferroni adjustment of a family of p-values (nan ignored)
+
+    Args:
+        - pvalues: p-values
+
+    Returns:
+        adjusted p-values
+    """
+    res = np.full(len(pvalues), np.nan)
+    valid = np.flatnonzero(~np.isnan(pvalues))
+    order = valid[np.argsort(pvalues[valid])]
+    m = len(order)
+    adjusted = np.minimum(1.0, np.maximum.accumulate((m - np.arange(m)) * pvalues[order]))
+    res[order] = adjusted
+    return res
+
+
+#####################################
+# permutations
+######################################
+
+def permuted_rank_sums(ranks: np.ndarray, labels: np.ndarray, n_samples: int,
+                       n_permutations: int, seed: np.random.SeedSequence)->np.ndarray:
+    """Rank sums of each sample under random permutations of the labels
+    (unit of work of the process pool)
+
+    Args:
+        - ranks: ranks of the pooled sample
+        - labels: sample number of each element
+        - n_samples: number of samples
+        - n_permutations: number of permutations
+        - seed: seed of the chunk
+
+    Returns:
+        array (n_permutations, n_samples)
+    """
+    rng = np.random.default_rng(seed)
+    res = np.zeros((n_permutations, n_samples))
+    block = max(1, BLOCK_ELEMENTS // max(1, len(labels)))
+    for b in range(0, n_permutations, block):
+        n = min(block, n_permutations - b)
+        permuted = rng.permuted(np.broadcast_to(labels, (n, len(labels))), axis=1)
+        flat = (np.arange(n)[:, None] * n_samples + permuted).ravel()
+        res[b:b+n] = np.bincount(flat, weights=np.broadcast_to(ranks, (n, len(ranks))).ravel(),
+                                 minlength=n * n_samples).reshape(n, n_samples)
+    return res
+
+
+def permutation_pvalue(observed: float, permuted: np.ndarray)->float:
+    """Returns the permutation p-value of a statistic (larger is more extreme)
+
+    Args:
+        - observed: observed statistic
+        - permuted: statistic under permutations
+
+    Returns:
+        (1 + number of permuted >= observed) / (1 + number of permutations)
+    """
+    return (1 + float(np.sum(permuted >= observed - 1e-12))) / (1 + len(permuted))
+
+
+#####################################
+# batch tests
+######################################
+
+def category_tests(samples: list[np.ndarray], names: list[str], permutations: bool,
+                   n_permutations: int, seed: np.random.SeedSequence)->dict[tuple[str, str]:float]:
+    """Kruskal-Wallis and pairwise Mann-Whitney tests for one category
+    (unit of work of the process pool)
+
+    Args:
+        - samples: metric values of each performer
+        - names: performers names
+        - permutations: True to compute permutation p-values
+        - n_permutations: number of permutations
+        - seed: seed of the category
+
+    Returns:
+        {(test, statistic) : value}
+    """
+    res = dict()
+    sizes = np.array([len(s) for s in samples])
+    labels = np.repeat(np.arange(len(samples)), sizes)
+    pooled = np.concatenate(samples) if sizes.sum() > 0 else np.zeros(0)
+    permutations = permutations and 0 < len(pooled) <= PERMUTATION_MAX_SIZE
+    pair_seeds, kw_seed = seed.spawn(2)
+    # Kruskal-Wallis on all performers
+    if (sizes > 0).sum() >= 2:
+        ranks = rankdata(pooled)
+        correction = tie_correction(ranks)
+        rank_sums = np.bincount(labels, weights=ranks, minlength=len(samples))
+        h = float(kruskal_h(rank_sums, sizes, correction))
+        res[('kruskal', 'H')] = h
+        res[('kruskal', 'p')] = float(chi2.sf(h, (sizes > 0).sum() - 1))
+        if permutations:
+            permuted = permuted_rank_sums(ranks, labels, len(samples), n_permutations, kw_seed)
+            res[('kruskal', 'p perm')] = permutation_pvalue(h, kruskal_h(permuted, sizes, correction))
+        else:
+            res[('kruskal', 'p perm')] = np.nan
+    else:
+        res[('kruskal', 'H')] = res[('kruskal', 'p')] = res[('kruskal', 'p perm')] = np.nan
+    # Mann-Whitney on all pairs of performers
+    pairs = list(combinations(range(len(samples)), 2))
+    seeds = pair_seeds.spawn(len(pairs))
+    tests = []
+    for (i, j), pair_seed in zip(pairs, seeds):
+        u, p, delta = mann_whitney(samples[i], samples[j])
+        p_perm = np.nan
+        if permutations and sizes[i] > 0 and sizes[j] > 0:
+            ranks = rankdata(np.concatenate((samples[i], samples[j])))
+            labels_pair = np.repeat([0, 1], [sizes[i], sizes[j]])
+            permuted = permuted_rank_sums(ranks, labels_pair, 2, n_permutations, pair_seed)[:, 0]
+            # two-sided: distance of the rank sum of the first sample to its expectation
+            expected = sizes[i] * (sizes[i] + sizes[j] + 1) / 2
+            observed = abs(u + sizes[i] * (sizes[i] + 1) / 2 - expected)
+            p_perm = permutation_pvalue(observed, np.abs(permuted - expected))
+        tests.append((delta, p, p_perm))
+    adjusted = holm(np.array([t[1] for t in tests], dtype=float))
+    for (i, j), (delta, p, p_perm), p_holm in zip(pairs, tests, adjusted):
+        pair = f"{names[i]}/{names[j]}"
+        res[(pair, 'delta')] = delta
+        res[(pair, 'p')] = p
+        res[(pair, 'p holm')] = p_holm
+        res[(pair, 'p perm')] = p_perm
+    return res
+
+
+def batch_tests(results: dict[str:dict[str:list]], permutations: bool=True,
+                n_permutations: int=N_PERMUTATIONS, seed: int=0,
+                workers: int=None)->pd.DataFrame:
+    """Kruskal-Wallis across performers and pairwise Mann-Whitney with Cliff's delta
+    for every category, categories being spread over the shared process pool
+    (in the calling process for small inputs or in background, see parallel.run_chunks)
+
+    Args:
+        - results: {performer : {group : metric values}} from timings function
+        - permutations: True to compute permutation p-values. Defaults to True
+        - n_permutations: number of permutations. Defaults to N_PERMUTATIONS
+        - seed: seed for reproducibility. Defaults to 0
+        - workers: number of processes. Defaults to None for the number of cpus
+
+    Returns:
+        results matrix of the metric: one row by category,
+        columns (test, statistic) with test 'kruskal' or a pair 'performer1/performer2'
+        and statistic 'H', 'delta', 'p', 'p holm' (pairs adjusted by category) or 'p perm'
+    """
+    names = list(results.keys())
+    categories = list(results[names[0]].keys())
+    seeds = np.random.SeedSequence(seed).spawn(len(categories))
+    args = [([np.asarray(results[p][c], dtype=float) for p in names], names,
+             permutations, n_permutations, seeds[i])
+            for i, c in enumerate(categories)]
+    # permutations only for small categories (see category_tests), the asymptotic tests being cheap
+    sizes = [sum(len(results[p][c]) for p in names) for c in categories]
+    permuted = sum(n for n in sizes if n <= PERMUTATION_MAX_SIZE) * n_permutations if permutations else 0
+    if permuted <= SERIAL_ELEMENTS:
+        workers = 1
+    rows = run_chunks(category_tests, args, workers=workers)
+    tab = pd.DataFrame(rows, index=categories)
+    tab.columns = pd.MultiIndex.from_tuples(tab.columns)
+    return tab
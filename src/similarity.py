@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines distances between performers from per-bar tempo and Δo profiles
+of their performances (Euclidean on bars aligned by measure and repeat, banded dynamic time
+warping for different repeat structures) and hierarchical clusterings of the performers
+"""
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import linkage
+from scipy.spatial.distance import squareform
+from src.data import PERFORMERS, MOVEMENTS_POSITIONS
+from src.events import corpus_events
+from src.changepoints import bars_tempi
+
+#####################################
+# parameters
+######################################
+
+PROFILE_FEATURES = ('tempo', 'deltaonset')
+# half width of the DTW band as a fraction of the longest sequence, and its minimum in bars
+BAND = 0.1
+MIN_BAND = 4
+
+
+#####################################
+# profiles
+######################################
+
+def bar_profiles(fantasia: int, movement_name: str=None)->dict[str:pd.DataFrame]:
+    """Per-bar profiles of the performances of a fantasia: centred log tempo and mean Δo
+    of the notes, each feature scaled by its standard deviation over all performances
+
+    Args:
+        - fantasia: fantasia number
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+
+    Returns:
+        {performer : dataframe by bar in performance order with columns measure, repeated,
+                     tempo, deltaonset}
+    """
+    events = corpus_events(fantasias=(fantasia,), movement_name=movement_name)
+    profiles = dict()
+    for performer, performance in events.groupby('performer', sort=False):
+        bars = bars_tempi(performance)
+        notes = performance[performance['voice'] != '.']
+        profile = bars[['bar', 'measure', 'repeated']].copy()
+        log_tempo = np.log(bars['tempo'].to_numpy())
+        profile['tempo'] = log_tempo - log_tempo.mean()
+        profile['deltaonset'] = profile['bar'].map(notes.groupby('bar')['deltaonset'].mean()).fillna(0.0)
+        profiles[performer] = profile.drop(columns='bar')
+    if len(profiles) > 0:
+        pooled = pd.concat(profiles.values())
+        for f in PROFILE_FEATURES:
+            scale = pooled[f].std()
+            for p in profiles:
+                profiles[p][f] = profiles[p][f] / (scale if scale > 0 else 1.0)
+    return profiles
+
+
+#####################################
+# distances
+######################################
+
+def euclidean_distances(profiles: dict[str:pd.DataFrame])->np.ndarray:
+    """Root mean square differences of the profiles on their common bars (measure, repeated)
+
+    Args:
+        - profiles: per-bar profiles (see bar_profiles)
+
+    Returns:
+        array performers x performers (nan without common bars)
+    """
+    performers = list(profiles)
+    keys = pd.MultiIndex.from_frame(pd.concat(profiles.values())[['measure', 'repeated']].drop_duplicates())
+    grid = np.full((len(performers), len(keys), len(PROFILE_FEATURES)), np.nan)
+    for i, p in enumerate(performers):
+        columns = keys.get_indexer(pd.MultiIndex.from_frame(profiles[p][['measure', 'repeated']]))
+        grid[i, columns] = profiles[p][list(PROFILE_FEATURES)].to_numpy()
+    squares = np.sum((grid[:, None] - grid[None, :])**2, axis=-1)
+    common = ~np.isnan(squares)
+    res = np.full(squares.shape[:2], np.nan)
+    has_common = common.any(axis=-1)
+    res[has_common] = np.sqrt(np.nanmean(squares[has_common], axis=-1))
+    return res
+
+
+def dtw_distance(a: np.ndarray, b: np.ndarray, band: float=BAND, min_band: int=MIN_BAND)->float:
+    """Dynamic time warping distance in a Sakoe-Chiba band, cells of each anti-diagonal
+    being computed at once
+
+    Args:
+        - a: sequence (n, features)
+        - b: sequence (m, features)
+        - band: half width of the band as a fraction of the longest sequence. Defaults to BAND
+        - min_band: minimal half width of the band in bars. Defaults to MIN_BAND
+
+    Returns:
+        cumulated cost of the best path divided by n + m
+    """
+    n, m = len(a), len(b)
+    if n == 0 or m == 0:
+        return np.nan
+    cost = np.sqrt(np.sum((a[:, None, :] - b[None, :, :])**2, axis=-1))
+    width = max(min_band, band * max(n, m))
+    d = np.full((n + 1, m + 1), np.inf)
+    d[0, 0] = 0.0
+    for k in range(2, n + m + 1):
+        i = np.arange(max(1, k - m), min(n, k - 1) + 1)
+        j = k - i
+        # band around the diagonal from (0, 0) to (n, m)
+        inside = np.abs(i * m / n - j) <= width
+        i, j = i[inside], j[inside]
+        d[i, j] = cost[i-1, j-1] + np.minimum(np.minimum(d[i-1, j], d[i, j-1]), d[i-1, j-1])
+    return float(d[n, m] / (n + m))
+
+
+def dtw_distances(profiles: dict[str:pd.DataFrame], band: float=BAND)->np.ndarray:
+    """DTW distances of the profiles in performance order (repeats included)
+
+    Args:
+        - profiles: per-bar profiles (see bar_profiles)
+        - band: half width of the band as a fraction of the longest sequence. Defaults to BAND
+
+    Returns:
+        array performers x performers
+    """
+    sequences = [profiles[p][list(PROFILE_FEATURES)].to_numpy() for p in profiles]
+    res = np.zeros((len(sequences), len(sequences)))
+    for i in range(len(sequences)):
+        for j in range(i + 1, len(sequences)):
+            res[i, j] = res[j, i] = dtw_distance(sequences[i], sequences[j], band)
+    return res
+
+
+@lru_cache(maxsize=128)
+def distance_matrix(fantasias: tuple[int]=None, movement_name: str=None,
+                    method: str='dtw')->pd.DataFrame:
+    """Distances between performers averaged over fantasias (cached, not to be modified)
+
+    Args:
+        - fantasias: fantasias numbers. Defaults to None for all fantasias
+                     (with movement_name, the fantasias including this type of movement)
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+        - method: 'euclidean' or 'dtw'. Defaults to 'dtw'
+
+    Returns:
+        dataframe performers x performers
+    """
+    if fantasias == None:
+        fantasias = tuple(MOVEMENTS_POSITIONS[movement_name]) if movement_name != None else tuple(range(1, 13))
+    matrices = []
+    for f in fantasias:
+        profiles = bar_profiles(f, movement_name)
+        if len(profiles) == 0:
+            continue
+        distances = euclidean_distances(profiles) if method == 'euclidean' else dtw_distances(profiles)
+        indexes = [PERFORMERS.index(p) for p in profiles]
+        matrix = np.full((len(PERFORMERS), len(PERFORMERS)), np.nan)
+        matrix[np.ix_(indexes, indexes)] = distances
+        matrices.append(matrix)
+    return pd.DataFrame(np.nanmean(matrices, axis=0), index=PERFORMERS, columns=PERFORMERS)
+
+
+#####################################
+# clusterings
+######################################
+
+def performers_clustering(fantasias: tuple[int]=None, movement_name: str=None, method: str='dtw',
+                          linkage_method: str='average')->tuple[pd.DataFrame, np.ndarray]:
+    """Hierarchical clustering of the performers
+
+    Args:
+        - fantasias: fantasias numbers. Defaults to None for all fantasias
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+        - method: 'euclidean' or 'dtw'. Defaults to 'dtw'
+        - linkage_method: scipy linkage method. Defaults to 'average'
+
+    Returns:
+        (distances, linkage matrix) (see scipy.cluster.hierarchy.linkage, dendrogram labels PERFORMERS)
+    """
+    distances = distance_matrix(fantasias, movement_name, method)
+    values = distances.to_numpy().copy()
+    # pairs never compared: largest distance
+    values[np.isnan(values)] = np.nanmax(values)
+    np.fill_diagonal(values, 0.0)
+    return distances, linkage(squareform(values, checks=False), method=linkage_method)
+
+
+def all_clusterings(method: str='dtw')->dict[str:tuple[pd.DataFrame, np.ndarray]]:
+    """Hierarchical clusterings of the performers for the whole corpus, each fantasia
+    and each type of movement
+
+    Args:
+        - method: 'euclidean' or 'dtw'. Defaults to 'dtw'
+
+    Returns:
+        {'corpus', 'fantasia n' or movement name : (distances, linkage matrix)}
+    """
+    res = {'corpus': performers_clustering(method=method)}
+    for f in range(1, 13):
+        res[f"fantasia {f}"] = performers_clustering((f,), method=method)
+    for movement_name in MOVEMENTS_POSITIONS:
+        res[movement_name] = performers_clustering(movement_name=movement_name, method=method)
+    return res
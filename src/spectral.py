@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines power spectra of the metrics series resampled on the metrical grid
+(positions in quarter notes of the score), computed with one batched FFT
+for all performances, movements and metrics
+"""
+
+from fractions import Fraction
+import numpy as np
+import pandas as pd
+from src.events import corpus_events
+
+#####################################
+# parameters
+######################################
+
+# grid points by quarter note: sixteenths and eighth triplets are exact
+DIVISIONS = 12
+# length of the analysis windows in quarter notes: all metrical periods of the grid are frequency bins
+WINDOW_QUARTERS = 48
+# windows with less valid points are ignored
+MIN_COVERAGE = 0.5
+
+
+#####################################
+# metrical grid
+######################################
+
+def metrical_windows(events: pd.DataFrame, metrics: tuple[str]=('deltaonset', 'deltaioi'),
+                     divisions: int=DIVISIONS, window_quarters: int=WINDOW_QUARTERS,
+                     rest_filtered: bool=True)->tuple[pd.DataFrame, np.ndarray]:
+    """Resamples the metrics of each movement of each performance on the metrical grid
+    and cuts them in half-overlapping windows, zero padded and Hann tapered
+
+    Args:
+        - events: events table (see events.corpus_events)
+        - metrics: metrics names. Defaults to ('deltaonset', 'deltaioi')
+        - divisions: grid points by quarter note. Defaults to DIVISIONS
+        - window_quarters: length of the windows in quarter notes. Defaults to WINDOW_QUARTERS
+        - rest_filtered: True if rests are removed. Defaults to True
+
+    Returns:
+        (windows, series): dataframe of performer, fantasia, movement_name, start (quarter of the window)
+        and array (windows, metrics, grid points of a window)
+    """
+    length = window_quarters * divisions
+    hop = length // 2
+    performances = events['performer'].astype(str) + '/' + events['fantasia'].astype(str)
+    # score positions in quarters along the sequences of measures performed
+    quarters = (events['duration'].groupby(performances.to_numpy(), sort=False).cumsum()
+                - events['duration']).to_numpy()
+    changes = ((performances != performances.shift()) | (events['movement'] != events['movement'].shift()))
+    segments = np.cumsum(changes.to_numpy())
+    selected = events['voice'].to_numpy() != '.' if rest_filtered else np.ones(len(events), dtype=bool)
+    values = events[list(metrics)].to_numpy(dtype=float)
+    starts = np.searchsorted(segments, np.arange(1, segments[-1] + 2)) if len(events) else [0]
+    meta, series = [], []
+    for s, e in zip(starts[:-1], starts[1:]):
+        kept = np.flatnonzero(selected[s:e]) + s
+        if len(kept) < 2:
+            continue
+        x = quarters[kept]
+        grid = np.arange(np.ceil(x[0] * divisions), np.floor(x[-1] * divisions) + 1) / divisions
+        resampled = np.stack([np.interp(grid, x, values[kept, j]) for j in range(len(metrics))])
+        for w in range(0, max(1, len(grid) - hop), hop):
+            chunk = resampled[:, w:w+length]
+            if chunk.shape[1] < MIN_COVERAGE * length:
+                continue
+            taper = np.hanning(chunk.shape[1])
+            window = np.zeros((len(metrics), length))
+            window[:, :chunk.shape[1]] = (chunk - chunk.mean(axis=1, keepdims=True)) * taper
+            # normalisation by the energy of the taper: comparable power for padded windows
+            series.append(window / np.sqrt(np.sum(taper**2)))
+            meta.append((events['performer'].iat[s], events['fantasia'].iat[s],
+                         events['movement_name'].iat[s], grid[w]))
+    windows = pd.DataFrame(meta, columns=['performer', 'fantasia', 'movement_name', 'start'])
+    if len(series) == 0:
+        return windows, np.zeros((0, len(metrics), length))
+    return windows, np.stack(series)
+
+
+#####################################
+# spectra
+######################################
+
+def power_spectra(events: pd.DataFrame=None, metrics: tuple[str]=('deltaonset', 'deltaioi'),
+                  divisions: int=DIVISIONS, window_quarters: int=WINDOW_QUARTERS,
+                  by: tuple[str]=('performer', 'movement_name'))->tuple[np.ndarray, dict]:
+    """Mean power spectra of the metrics by group of windows, all windows
+    being transformed by a single batched real FFT
+
+    Args:
+        - events: events table. Defaults to None for all events of the corpus
+        - metrics: metrics names. Defaults to ('deltaonset', 'deltaioi')
+        - divisions: grid points by quarter note. Defaults to DIVISIONS
+        - window_quarters: length of the windows in quarter notes. Defaults to WINDOW_QUARTERS
+        - by: columns of the windows grouping the spectra. Defaults to ('performer', 'movement_name')
+
+    Returns:
+        (periods, spectra): periods in quarter notes of the frequency bins (DC excluded)
+        and {(group..., metric) : mean power by bin}
+    """
+    if events is None:
+        events = corpus_events()
+    windows, series = metrical_windows(events, metrics, divisions, window_quarters)
+    power = np.abs(np.fft.rfft(series, axis=-1))**2
+    frequencies = np.fft.rfftfreq(series.shape[-1], d=1/divisions)
+    res = dict()
+    for group, indexes in windows.groupby(list(by), sort=False).indices.items():
+        group = group if isinstance(group, tuple) else (group,)
+        mean_power = power[indexes].mean(axis=0)
+        for j, metric in enumerate(metrics):
+            res[group + (metric,)] = mean_power[j, 1:]
+    return 1 / frequencies[1:], res
+
+
+def metrical_periods(time_signatures: list[str], divisions: int=DIVISIONS,
+                     window_quarters: int=WINDOW_QUARTERS)->list[Fraction]:
+    """Periods of the metrical grid: divisions and multiples of the beats and bars of time signatures,
+    kept if they are whole numbers of grid points and frequency bins of the windows
+
+    Args:
+        - time_signatures: time signatures, for instance ['3/4', '6/8']
+        - divisions: grid points by quarter note. Defaults to DIVISIONS
+        - window_quarters: length of the windows in quarter notes. Defaults to WINDOW_QUARTERS
+
+    Returns:
+        sorted periods in quarter notes
+    """
+    res = set()
+    length = window_quarters * divisions
+    for ts in time_signatures:
+        numerator, denominator = (int(n) for n in ts.split('/'))
+        bar = Fraction(4 * numerator, denominator)
+        # compound meters: beats of three units
+        beat = bar / (numerator // 3) if numerator % 3 == 0 and numerator > 3 else Fraction(4, denominator)
+        for unit in (beat, bar):
+            for m in range(1, length + 1):
+                res.update((unit / m, unit * m))
+    return sorted(p for p in res if (p * divisions).denominator == 1
+                  and (window_quarters / p).denominator == 1 and 1 <= window_quarters / p <= length // 2)
+
+
+def dominant_periodicities(events: pd.DataFrame=None, metrics: tuple[str]=('deltaonset', 'deltaioi'),
+                           k: int=3, by: tuple[str]=('performer',), max_period: float=None,
+                           divisions: int=DIVISIONS, window_quarters: int=WINDOW_QUARTERS)->pd.DataFrame:
+    """Returns the k strongest metrical periodicities of the metrics by group: power of the frequency
+    bins of the metrical periods of the time signatures of the group (see metrical_periods)
+
+    Args:
+        - events: events table. Defaults to None for all events of the corpus
+        - metrics: metrics names. Defaults to ('deltaonset', 'deltaioi')
+        - k: number of periodicities by group. Defaults to 3
+        - by: columns of the windows grouping the spectra. Defaults to ('performer',)
+        - max_period: longest period in quarter notes, for instance 1 for periodicities inside the beat.
+                      Defaults to None for all periods
+        - divisions: grid points by quarter note. Defaults to DIVISIONS
+        - window_quarters: length of the windows in quarter notes. Defaults to WINDOW_QUARTERS
+
+    Returns:
+        dataframe with columns of the groups, metric, rank, period (in quarter notes),
+        power (share of the total power of the spectrum)
+    """
+    if events is None:
+        events = corpus_events()
+    periods, spectra = power_spectra(events, metrics, divisions, window_quarters, by)
+    signatures = events.groupby(list(by), sort=False)['time_signature'].unique()
+    rows = []
+    for key, power in spectra.items():
+        group = key[:-1] if len(by) > 1 else key[0]
+        candidates = [p for p in metrical_periods(signatures[group], divisions, window_quarters)
+                      if max_period == None or p <= max_period]
+        # bin of frequency window_quarters / period (DC excluded)
+        bins = np.array([int(window_quarters / p) - 1 for p in candidates], dtype=int)
+        order = np.argsort(power[bins])[::-1][:k]
+        for rank, i in enumerate(order):
+            rows.append(list(key) + [rank + 1, float(candidates[i]), power[bins[i]] / power.sum()])
+    return pd.DataFrame(rows, columns=list(by) + ['metric', 'rank', 'period', 'power'])
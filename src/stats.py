@@ -164,6 +164,27 @@ def get_metric_results(metric_data: list[float], datas: list[str])->dict[str:lis
                                                        rest_filtered=True, d=0.5, beats_indexes=eight_ternary_p2_indexes)
     results['3rd♪♪♪ TM']=get_metric_of_selected_elements(metric_data, datas, 
                                                       rest_filtered=True, d=0.5, beats_indexes=eight_ternary_p3_indexes)
+    
+    #melodic intervals
+    results['unison']=get_metric_of_selected_elements(metric_data, datas, 
+                                                       rest_filtered=True, beats_indexes=get_interval_indexes(datas, 0, 0))
+    results['step']=get_metric_of_selected_elements(metric_data, datas, 
+                                                       rest_filtered=True, beats_indexes=get_interval_indexes(datas, 1, 2))
+    results['leap']=get_metric_of_selected_elements(metric_data, datas, 
+                                                       rest_filtered=True, beats_indexes=get_interval_indexes(datas, 3, 7))
+    results['large leap']=get_metric_of_selected_elements(metric_data, datas, 
+                                                       rest_filtered=True, beats_indexes=get_interval_indexes(datas, 8))
+    results['ascending']=get_metric_of_selected_elements(metric_data, datas, 
+                                                       rest_filtered=True, beats_indexes=get_interval_indexes(datas, 1, direction=1))
+    results['descending']=get_metric_of_selected_elements(metric_data, datas, 
+                                                       rest_filtered=True, beats_indexes=get_interval_indexes(datas, 1, direction=-1))
+    #register distance between upper and lower voices
+    results['voices ≤ 5th']=get_metric_of_selected_elements(metric_data, datas, 
+                                                       rest_filtered=True, beats_indexes=get_voices_distance_indexes(datas, 0, 7))
+    results['voices 6th-8ve']=get_metric_of_selected_elements(metric_data, datas, 
+                                                       rest_filtered=True, beats_indexes=get_voices_distance_indexes(datas, 8, 12))
+    results['voices > 8ve']=get_metric_of_selected_elements(metric_data, datas, 
+                                                       rest_filtered=True, beats_indexes=get_voices_distance_indexes(datas, 13))
 
     return results
 
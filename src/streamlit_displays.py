@@ -1,6 +1,17 @@
+from __future__ import annotations
+import io
 import streamlit as st
-import pandas as pd
-from matplotlib import pyplot as plt
+from src import lazy_import
+from src.data import PERFORMERS
+
+# imported at the first plot or table
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
+lines = lazy_import('matplotlib.lines')
+
+__all__ = ['ticks_positions', 'performers_positions', 'box_plot_show', 'violin_plot_show', 'rolling_plot_image',
+           'rolling_plot_show',
+           'STATS_NAMES', 'CI_NAMES', 'display_tab', 'data_table']
 
 #############################
 # plots
@@ -25,19 +36,73 @@ def ticks_positions(n: int)->list[int]:
     return res
 
 
+def performers_positions(options: list[str], performers: list[str])->list[int]:
+    """Positions of the plots of the performers ready in their group of 6 ticks
+
+    Args:
+        - options: selected categories
+        - performers: performers ready, in PERFORMERS order
+
+    Returns:
+        positions of the plots, grouped by category
+    """
+    slots = ticks_positions(len(options)*len(PERFORMERS))
+    return [slots[i*len(PERFORMERS) + PERFORMERS.index(p)] for i in range(len(options)) for p in performers]
+
+
+def performers_axes(axs, options: list[str], colors: list[tuple[float, float, float, float]], metric: str):
+    """Labels the groups of 6 ticks by category, with a legend of the performers and the metric as y label
+
+    Args:
+        - axs: matplotlib axes
+        - options: selected categories
+        - colors: colors of the performers (RGBA tuples)
+        - metric: deltaioi or deltaonset
+    """
+    axs.set_xlim(0, ticks_positions(len(options)*len(PERFORMERS))[-1] + 1)
+    axs.tick_params(axis = 'x', length = 0)
+    i=0
+    for k in options:
+        pos = 3.5 + i
+        axs.text(pos, -0.02, k, ha='center',
+                    va='top', transform=axs.get_xaxis_transform(), fontsize=25)
+        i+=7
+    custom_lines = [lines.Line2D([0], [0], color=colors[i], lw=4) for i in range(len(colors))]
+    axs.legend(custom_lines, [p[0].upper()+p[1:] for p in PERFORMERS], 
+                fontsize=21, ncols=6)
+    if metric == 'deltaonset' :
+        ylabel="$\\Delta \\mathit{o}(\\%)$"
+    else :
+        ylabel="$\\Delta \\mathit{IOI}(\\%)$"
+    axs.grid(axis='y', linestyle='--', linewidth=1)
+    axs.set_ylabel(ylabel, fontsize=30)
+    axs.tick_params(axis='y', labelsize=30)
+
+
 def box_plot_show(x: list[list[float]], options: list[str], 
-                  colors: list[tuple[float, float, float, float]], form):
-    """Display metric box plots of selected populations for one performer and one metric
+                  colors: list[tuple[float, float, float, float]], form,
+                  metric: str='deltaioi', performers: list[str]=None):
+    """Display metric box plots of selected populations for one performer and one metric,
+    or grouped by category for several performers
 
     Args:
-        - x: lists of metrics values for each selected filter
+        - x: lists of metrics values for each selected filter (for each performer in a category)
         - options: selected filtered name
-        - colors: list of colors (RGBA tuples)
+        - colors: list of colors (RGBA tuples), one by performer in PERFORMERS order if performers
         - form: streamlit form
+        - metric: deltaioi or deltaonset, y label of the grouped plots. Defaults to 'deltaioi'
+        - performers: performers of each group, in PERFORMERS order. Defaults to None for one performer
     """
-    fig, axs = plt.subplots(figsize=(9, 4))
-    tick_labels=options
-    positions=range(len(options))  
+    if performers == None:
+        fig, axs = plt.subplots(figsize=(9, 4))
+        tick_labels=options
+        positions=range(len(options))
+        box_colors = colors
+    else:
+        fig, axs = plt.subplots(figsize=(20,10))
+        tick_labels=len(x)*[' ']
+        positions=performers_positions(options, performers)
+        box_colors = [colors[PERFORMERS.index(p)] for p in performers]
     bplot = plt.boxplot(x, tick_labels=tick_labels,
                             positions=positions,
                            showmeans=True, 
@@ -47,22 +112,126 @@ def box_plot_show(x: list[list[float]], options: list[str],
                            meanprops={"marker": "+","markeredgecolor": "black", "markersize": "5"},
                         )
     for i in range(len(bplot['boxes'])):
-        bplot['boxes'][i].set(facecolor = colors[i%len(colors)], linewidth=2)
-    # Add label for a group of 6 ticks
-    axs.tick_params(axis='x', labelsize=12)
+        bplot['boxes'][i].set(facecolor = box_colors[i%len(box_colors)], linewidth=2)
+    if performers == None:
+        axs.tick_params(axis='x', labelsize=12)
+    else:
+        performers_axes(axs, options, colors, metric)
     plt.axhline(y=0, color='gray', linestyle='--')
     
     form.pyplot(plt.gcf())
 
+
+def violin_plot_show(vpstats: list[dict], options: list[str],
+                     colors: list[tuple[float, float, float, float]], form,
+                     metric: str='deltaioi', performers: list[str]=None):
+    """Display metric violin plots of selected populations for one performer and one metric,
+    or grouped by category for several performers
+
+    Args:
+        - vpstats: precomputed density statistics for each selected filter (see density.violin_stats)
+        - options: selected filtered name
+        - colors: list of colors (RGBA tuples), one by performer in PERFORMERS order if performers
+        - form: streamlit form
+        - metric: deltaioi or deltaonset, y label of the grouped plots. Defaults to 'deltaioi'
+        - performers: performers of each group, in PERFORMERS order. Defaults to None for one performer
+    """
+    if performers == None:
+        fig, axs = plt.subplots(figsize=(9, 4))
+        positions=range(len(options))
+        body_colors = colors
+    else:
+        fig, axs = plt.subplots(figsize=(20,10))
+        positions=performers_positions(options, performers)
+        body_colors = [colors[PERFORMERS.index(p)] for p in performers]
+    vplot = axs.violin(vpstats, positions=positions, showmeans=True, showmedians=True, showextrema=False)
+    for i in range(len(vplot['bodies'])):
+        vplot['bodies'][i].set(facecolor = body_colors[i%len(body_colors)], alpha=0.8)
+    vplot['cmedians'].set(color="blue", linewidth=1.5)
+    if performers == None:
+        axs.set_xticks(positions, options)
+        axs.tick_params(axis='x', labelsize=12)
+    else:
+        axs.set_xticks(positions, len(positions)*[' '])
+        performers_axes(axs, options, colors, metric)
+    plt.axhline(y=0, color='gray', linestyle='--')
+
+    form.pyplot(plt.gcf())
+
+
+def rolling_plot_image(table: pd.DataFrame, metric: str)->bytes:
+    """Returns the graph of rolling median and IQR of a metric along the performances of all performers,
+    one graph by fantasia (figure closed once rendered)
+
+    Args:
+        - table: rolling statistics by bar (see rolling.rolling_table)
+        - metric: metric name
+
+    Returns:
+        PNG bytes
+    """
+    fantasias = table['fantasia'].unique()
+    performers = table['performer'].unique()
+    cmap = plt.get_cmap('Accent')
+    colors = [cmap(i / 7) for i in range(len(performers))]
+    fig, axs = plt.subplots(len(fantasias), 1, figsize=(20, 5*len(fantasias)), squeeze=False)
+    for ax, f in zip(axs[:, 0], fantasias):
+        for color, p in zip(colors, performers):
+            t = table[(table['fantasia'] == f) & (table['performer'] == p)]
+            ax.plot(t['bar'], t['median'], color=color, label=p)
+            ax.fill_between(t['bar'], t['q1'], t['q3'], color=color, alpha=0.15)
+        ax.axhline(y=0, color='gray', linestyle='--')
+        ax.set_title(f"Fantasia {f}")
+        ax.set_xlabel("bar n° in the performance (repeats included)")
+        ax.set_ylabel(metric)
+    axs[0, 0].legend(ncols=len(performers))
+    plt.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def rolling_plot_show(table: pd.DataFrame, metric: str, form):
+    """Display rolling median and IQR of a metric along the performances of all performers,
+    one graph by fantasia
+
+    Args:
+        - table: rolling statistics by bar (see rolling.rolling_table)
+        - metric: metric name
+        - form: streamlit form or container
+    """
+    form.image(rolling_plot_image(table, metric), use_container_width=True)
+
 ##############################
 # stats in dataframe
 ##############################
 
+def data_table(data: list[dict], metric_data: list[float], metric: str)->pd.DataFrame:
+    """Dataframe of the raw data with the computed metric
+
+    Args:
+        - data: data elements
+        - metric_data: computed metric for each element of data
+        - metric: metric name
+
+    Returns:
+        dataframe with the columns of data and the metric column
+    """
+    dfdata = pd.DataFrame.from_dict(data)
+    dfdata[metric] = metric_data
+    return dfdata
+
+
+STATS_NAMES = ['N_elements', 'mean', 'q1', 'median', 'q3', 'mini', 'maxi', 'stddev']
+CI_NAMES = ['mean CI low', 'mean CI high', 'median CI low', 'median CI high']
+
 def  display_tab(tab: dict[str:dict[str:list]], metric: str='deltaonset'):
     """Display dataframe of statistics for all groups
 
     Args:
-        - tab: {key : [n_elements, mean, q1, q2, q3, mini, maxi, stdev]} from resultat_tot_stats function
+        - tab: {key : [n_elements, mean, q1, q2, q3, mini, maxi, stdev]} from resultat_tot_stats function,
+               optionally followed by [mean_low, mean_high, median_low, median_high] bootstrap intervals
         - metric: metric name. Defaults to 'deltaonset'.
     """
     precision=4
@@ -80,7 +249,7 @@ def  display_tab(tab: dict[str:dict[str:list]], metric: str='deltaonset'):
     
     tab_results.iloc[0] = tab_results.iloc[0].round(0)  # integers for the first line (N _elements)
     tab_results.iloc[1:] = tab_results.iloc[1:].round(precision)
-    tab_results.index=['N_elements', 'mean', 'q1', 'median', 'q3', 'mini', 'maxi', 'stddev']
+    tab_results.index=(STATS_NAMES + CI_NAMES)[:len(tab_results)]
     
     labove, rabove = 0.01, 0.1
     lbelow, rbelow = (-0.01, -0.1) # pb negative number for highlight
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the score-aligned tensor of the performances of a fantasia:
+events of all performers aligned on the score event (measure, repeated, position in the bar)
+in a dense [performer, score event, feature] array with a missing-value mask,
+with pairwise differences between performers and a consensus (median) performance
+"""
+
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from src.data import PERFORMERS
+from src.events import corpus_events
+
+#####################################
+# parameters
+######################################
+
+FEATURES = ('ioi', 'duration', 'bar_ioi', 'metronomic_ioi', 'deltaioi', 'deltaonset')
+SCORE_EVENT_KEY = ['measure', 'repeated', 'position']
+# positions in bars rounded to this number of decimals for the alignment
+POSITION_DECIMALS = 6
+
+
+#####################################
+# tensor
+######################################
+
+class PerformanceTensor:
+    """Performances of a fantasia aligned on score events
+
+    Attributes:
+        - fantasia: fantasia number
+        - performers: names of the performers (first axis)
+        - events: dataframe of the score events (second axis): movement, movement_name, measure,
+                  repeated, position, pitchname, voice, duration, time_signature, beat
+        - features: names of the features (third axis)
+        - values: array [performer, score event, feature], nan if missing
+        - mask: boolean array [performer, score event], True if the performer plays the score event
+    """
+
+    def __init__(self, fantasia: int, performers: list[str], events: pd.DataFrame,
+                 features: tuple[str], values: np.ndarray, mask: np.ndarray):
+        self.fantasia = fantasia
+        self.performers = performers
+        self.events = events
+        self.features = features
+        self.values = values
+        self.mask = mask
+
+    def feature(self, name: str)->np.ndarray:
+        """Returns the matrix [performer, score event] of a feature
+
+        Args:
+            - name: feature name
+
+        Returns:
+            values, nan if missing
+        """
+        return self.values[:, :, self.features.index(name)]
+
+
+@lru_cache(maxsize=64)
+def performance_tensor(fantasia: int, features: tuple[str]=FEATURES, fugato: bool=False,
+                       movement_name: str=None, rest_filtered: bool=False)->PerformanceTensor:
+    """Aligns the events of all performers of a fantasia on the score events (cached, not to be modified).
+    Score events follow the order of the longest repeat plan, events of passes not played
+    by a performer being masked
+
+    Args:
+        - fantasia: fantasia number
+        - features: columns of the events table. Defaults to FEATURES
+        - fugato: True if only fugatos movements, False otherwise. Defaults to False
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+        - rest_filtered: True if rests are removed. Defaults to False
+
+    Returns:
+        PerformanceTensor
+    """
+    events = corpus_events(fantasias=(fantasia,), fugato=fugato, movement_name=movement_name).copy()
+    if rest_filtered:
+        events = events[events['voice'] != '.']
+    events['position'] = events['position'].round(POSITION_DECIMALS)
+    # a measure played twice with the same repeat number: first occurrence kept
+    events = events.drop_duplicates(['performer'] + SCORE_EVENT_KEY)
+    # order of the score events: first occurrence in the performances, longest repeat plans first
+    sizes = events['performer'].value_counts()
+    order = sorted(events['performer'].unique(), key=lambda p: (-sizes[p], PERFORMERS.index(p)))
+    ordered = pd.concat([events[events['performer'] == p] for p in order])
+    score_events = ordered.drop_duplicates(SCORE_EVENT_KEY)[
+        ['movement', 'movement_name'] + SCORE_EVENT_KEY
+        + ['pitchname', 'voice', 'duration', 'time_signature', 'beat']].reset_index(drop=True)
+    performers = [p for p in PERFORMERS if p in sizes.index]
+    index = pd.MultiIndex.from_frame(score_events[SCORE_EVENT_KEY])
+    columns = index.get_indexer(pd.MultiIndex.from_frame(events[SCORE_EVENT_KEY]))
+    rows = np.array([performers.index(p) for p in events['performer']], dtype=np.int64)
+    values = np.full((len(performers), len(score_events), len(features)), np.nan)
+    values[rows, columns] = events[list(features)].to_numpy(dtype=float)
+    mask = np.zeros((len(performers), len(score_events)), dtype=bool)
+    mask[rows, columns] = True
+    return PerformanceTensor(fantasia, performers, score_events, tuple(features), values, mask)
+
+
+#####################################
+# comparisons
+######################################
+
+def pairwise_differences(tensor: PerformanceTensor, feature: str='deltaonset')->np.ndarray:
+    """Differences of a feature between all pairs of performers on every score event
+
+    Args:
+        - tensor: aligned performances
+        - feature: feature name. Defaults to 'deltaonset'
+
+    Returns:
+        array [performer i, performer j, score event] of x_i - x_j, nan if one of both is missing
+    """
+    x = tensor.feature(feature)
+    return x[:, None, :] - x[None, :, :]
+
+
+def pairwise_matrix(tensor: PerformanceTensor, feature: str='deltaonset',
+                    statistic: str='mean')->pd.DataFrame:
+    """Summary of the absolute differences of a feature between performers on their common score events
+
+    Args:
+        - tensor: aligned performances
+        - feature: feature name. Defaults to 'deltaonset'
+        - statistic: 'mean' or 'median'. Defaults to 'mean'
+
+    Returns:
+        dataframe performers x performers
+    """
+    differences = np.abs(pairwise_differences(tensor, feature))
+    common = np.any(~np.isnan(differences), axis=-1)
+    summary = np.full(common.shape, np.nan)
+    reduce = np.nanmean if statistic == 'mean' else np.nanmedian
+    summary[common] = reduce(differences[common], axis=-1)
+    return pd.DataFrame(summary, index=tensor.performers, columns=tensor.performers)
+
+
+def consensus_performance(tensor: PerformanceTensor)->pd.DataFrame:
+    """Consensus performance: median of each feature across performers for every score event
+
+    Args:
+        - tensor: aligned performances
+
+    Returns:
+        dataframe of the score events with the median features and the number of performers
+    """
+    present = tensor.mask.any(axis=0)
+    medians = np.full(tensor.values.shape[1:], np.nan)
+    medians[present] = np.nanmedian(tensor.values[:, present], axis=0)
+    consensus = tensor.events.copy()
+    for j, f in enumerate(tensor.features):
+        consensus[f"{f} median"] = medians[:, j]
+    consensus['performers'] = tensor.mask.sum(axis=0)
+    return consensus
+
+
+def corpus_consensus(features: tuple[str]=FEATURES, fugato: bool=False,
+                     movement_name: str=None)->dict[int:pd.DataFrame]:
+    """Consensus performances of all fantasias
+
+    Args:
+        - features: columns of the events table. Defaults to FEATURES
+        - fugato: True if only fugatos movements, False otherwise. Defaults to False
+        - movement_name: name of a specific movement. Defaults to None if all type movements
+
+    Returns:
+        {fantasia : consensus performance}
+    """
+    return {f: consensus_performance(performance_tensor(f, features, fugato, movement_name))
+            for f in range(1, 13)}
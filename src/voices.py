@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module defines the analysis of the interleaved voices as timed streams: per-voice onset
+and IOI streams, per-voice metronomic grids (tempo of each voice), and asynchronies between
+the upper and lower voices within each beat group
+"""
+
+import numpy as np
+import pandas as pd
+from src.durations_analyse_tools import TERNARY_TS
+from src.events import corpus_events
+
+#####################################
+# parameters
+######################################
+
+# streams of the voice annotations (paper notation)
+STREAMS = {'u': 'upper', 'b': 'lower', 'B': 'lower', 's': 'lower', 't': 'lower', 'm': 'middle'}
+# beats of a bar for the compound time signatures
+COMPOUND_BEATS = {'3/2': 3, '6/4': 2}
+
+
+#####################################
+# streams
+######################################
+
+def beats_in_bar(time_signatures: pd.Series)->np.ndarray:
+    """Number of beat groups of the bars: numerator, dotted quarter notes for ternary meters
+
+    Args:
+        - time_signatures: time signatures as strings
+
+    Returns:
+        number of beat groups
+    """
+    numerators = time_signatures.str.split('/').str[0].astype(int).to_numpy()
+    ternary = time_signatures.isin(TERNARY_TS).to_numpy()
+    beats = np.where(ternary, np.maximum(1, numerators // 3), numerators)
+    compound = time_signatures.map(COMPOUND_BEATS)
+    return np.where(compound.notna(), compound.fillna(0).to_numpy(), beats).astype(int)
+
+
+def voice_streams(events: pd.DataFrame=None)->pd.DataFrame:
+    """Splits the performances into per-voice streams of notes with their score position,
+    beat group, IOI to the next note of the same voice and metronomic onset
+
+    Args:
+        - events: events table. Defaults to None for all events of the corpus
+
+    Returns:
+        dataframe of the notes of the voices with columns performer, fantasia, movement, bar, measure,
+        repeated, stream (upper, lower, middle), voice, quarters (score position in the performance),
+        beat_group, onset, metronomic_onset, asynchrony (ms), voice_ioi, voice_score_ioi (quarters)
+    """
+    if events is None:
+        events = corpus_events()
+    performances = events['performer'].astype(str) + '/' + events['fantasia'].astype(str)
+    quarters = events['duration'].groupby(performances.to_numpy(), sort=False).cumsum() - events['duration']
+    voiced = events['voice'].isin(STREAMS).to_numpy()
+    streams = events.loc[voiced, ['performer', 'fantasia', 'movement', 'bar', 'measure', 'repeated',
+                                  'voice', 'position', 'time_signature', 'onset', 'deltaonset', 'bar_ioi']].copy()
+    streams.insert(6, 'stream', streams['voice'].map(STREAMS))
+    streams['quarters'] = quarters.to_numpy()[voiced]
+    streams['beat_group'] = np.floor(streams['position'].to_numpy() * beats_in_bar(streams['time_signature'])
+                                     + 1e-9).astype(int)
+    streams['asynchrony'] = streams['deltaonset'] * streams['bar_ioi']
+    streams['metronomic_onset'] = streams['onset'] - streams['asynchrony']
+    # ioi to the next note of the same voice in the same movement of the performance
+    following = streams.groupby(['performer', 'fantasia', 'movement', 'stream'], sort=False)
+    streams['voice_ioi'] = following['onset'].shift(-1) - streams['onset']
+    streams['voice_score_ioi'] = following['quarters'].shift(-1) - streams['quarters']
+    return streams.drop(columns=['position', 'deltaonset']).reset_index(drop=True)
+
+
+#####################################
+# per-voice grids
+######################################
+
+def voice_tempi(streams: pd.DataFrame=None)->pd.DataFrame:
+    """Per-voice metronomic grids: slope of the onsets on the score positions of each voice
+    (ms by quarter note) with an intercept by bar, fitted by movement of each performance
+
+    Args:
+        - streams: voice streams (see voice_streams). Defaults to None for all the corpus
+
+    Returns:
+        dataframe by performer, fantasia, movement and stream with columns notes, ms_per_quarter,
+        tempo (quarter notes per minute) and ratio (tempo of the stream / tempo of the lower voice)
+    """
+    if streams is None:
+        streams = voice_streams()
+    bars = streams.groupby(['performer', 'fantasia', 'bar', 'stream'], sort=False)
+    q = streams['quarters'] - bars['quarters'].transform('mean')
+    o = streams['onset'] - bars['onset'].transform('mean')
+    frame = streams[['performer', 'fantasia', 'movement', 'stream']].assign(qo=q * o, qq=q * q, notes=1)
+    tempi = frame.groupby(['performer', 'fantasia', 'movement', 'stream']).sum()
+    tempi = tempi[tempi['qq'] > 0]
+    tempi['ms_per_quarter'] = tempi['qo'] / tempi['qq']
+    tempi['tempo'] = 60000 / tempi['ms_per_quarter']
+    lower = tempi['tempo'].xs('lower', level='stream')
+    tempi['ratio'] = tempi['tempo'] / lower.reindex(tempi.index.droplevel('stream')).to_numpy()
+    return tempi[['notes', 'ms_per_quarter', 'tempo', 'ratio']].reset_index()
+
+
+#####################################
+# asynchronies
+######################################
+
+def beat_asynchronies(streams: pd.DataFrame=None, upper: str='upper', lower: str='lower')->pd.DataFrame:
+    """Lag between two voices within each beat group: mean deviation of the onsets of a voice
+    to the metronomic grid minus the one of the other voice
+
+    Args:
+        - streams: voice streams (see voice_streams). Defaults to None for all the corpus
+        - upper: first stream. Defaults to 'upper'
+        - lower: second stream. Defaults to 'lower'
+
+    Returns:
+        dataframe by beat group with both voices: performer, fantasia, movement, bar, measure, repeated,
+        beat_group, time_signature, lag (ms, positive if the first voice is late) and lag_ratio
+        (fraction of the bar duration, as Δo)
+    """
+    if streams is None:
+        streams = voice_streams()
+    keys = ['performer', 'fantasia', 'movement', 'bar', 'measure', 'repeated', 'beat_group', 'time_signature']
+    selected = streams[streams['stream'].isin([upper, lower])]
+    means = selected.groupby(keys + ['stream'], sort=False).agg(asynchrony=('asynchrony', 'mean'),
+                                                                bar_ioi=('bar_ioi', 'first'))
+    means = means.unstack('stream')
+    # one of the voices never played in the selection
+    if not {upper, lower} <= set(means.columns.get_level_values('stream')):
+        return pd.DataFrame(columns=keys + ['lag', 'lag_ratio'])
+    means = means.dropna()
+    if len(means) == 0:
+        return pd.DataFrame(columns=keys + ['lag', 'lag_ratio'])
+    lags = pd.DataFrame(index=means.index)
+    lags['lag'] = means[('asynchrony', upper)] - means[('asynchrony', lower)]
+    lags['lag_ratio'] = lags['lag'] / means[('bar_ioi', upper)]
+    return lags.reset_index()
+
+
+def asynchrony_results(lags: pd.DataFrame=None, column: str='lag_ratio')->dict[str:dict[str:list]]:
+    """Distributions of the lags between voices by meter, in the format of timings (for results_to_stats)
+
+    Args:
+        - lags: lags by beat group (see beat_asynchronies). Defaults to None for upper/lower in all the corpus
+        - column: 'lag' (ms) or 'lag_ratio' (fraction of bar). Defaults to 'lag_ratio'
+
+    Returns:
+        {performer : {'all', time signature : lags}}
+    """
+    if lags is None:
+        lags = beat_asynchronies()
+    res = dict()
+    for p, performance in lags.groupby('performer', sort=False):
+        res[p] = {'all': performance[column].tolist()}
+        for ts, group in performance.groupby('time_signature'):
+            res[p][ts] = group[column].tolist()
+    return res
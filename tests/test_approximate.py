@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sampled statistics of the approximate mode against the exact statistics of the selection
+"""
+
+import pytest
+from src import approximate
+from src.approximate import measures_plan, approximate_timings, approximate_stats
+from src.data import MOVEMENTS_POSITIONS
+from src.durations_analyse_tools import get_all_metric_and_data_for_one_performer
+from src.stats import timings, results_to_stats
+
+
+def exact_timings(metric: str, performer: str, movement_name: str)->dict[str:list]:
+    """Metric values of all the measures of a movement type"""
+    metric_data, datas = get_all_metric_and_data_for_one_performer(performer, metric,
+                                                                   movement_name=movement_name)
+    return timings(metric, performer, metric_data, datas)[performer]
+
+
+def test_plan_by_movement():
+    plan = measures_plan('pahud')
+    by_movement = {m: measures_plan('pahud', movement_name=m) for m in MOVEMENTS_POSITIONS}
+    # movement types share no measure and cover the performance
+    assert sum(len(p) for p in by_movement.values()) == len(plan)
+    assert set().union(*by_movement.values()) == set(plan)
+    assert {f for f, _, _ in by_movement['toccata']} == set(MOVEMENTS_POSITIONS['toccata'])
+
+
+def test_full_rate_is_exact():
+    results, rate = approximate_timings('deltaioi', ['porter'], movement_name='largo', latency=1e6)
+    assert rate == 1.0
+    exact = exact_timings('deltaioi', 'porter', 'largo')
+    assert results['porter'].keys() == exact.keys()
+    assert all(results['porter'][k] == exact[k] for k in exact)
+
+
+@pytest.mark.parametrize("movement_name", ['gigue', 'allegro fugato', 'rigaudon'])
+def test_sample_within_bounds(monkeypatch, movement_name):
+    # fixed rate, independent of the measured cost of a measure
+    monkeypatch.setattr(approximate, 'sample_rate', lambda n, latency: 0.5)
+    stats, rate = approximate_stats('deltaioi', ['kuijken'], movement_name=movement_name, seed=1)
+    assert rate == 0.5
+    exact = results_to_stats(exact_timings('deltaioi', 'kuijken', movement_name))
+    n, mean, q1, median = exact['all'][:4]
+    row = stats['kuijken']['all']
+    assert 0.4 * n < row[0] < 0.6 * n
+    assert row[8] <= mean <= row[9]
+    assert row[10] <= median <= row[11]
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+Per-bar table and its top-k and threshold queries against sort-based references
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.bars import bar_table, top_bars, bars_above, BAR_KEY
+from src.events import corpus_events
+
+
+def random_table(seed: int=0)->pd.DataFrame:
+    """Per-bar table of 2 performers with ties and missing values"""
+    rng = np.random.default_rng(seed)
+    n = 200
+    table = pd.DataFrame({'performer': rng.choice(['a', 'b'], n), 'fantasia': rng.choice([1, 2], n),
+                          'movement': 1, 'movement_name': rng.choice(['toccata', 'presto'], n),
+                          'measure': np.arange(n), 'repeated': 0,
+                          'deltaonset mean abs': np.round(rng.uniform(0, 0.1, n), 2)})
+    table.loc[rng.choice(n, 20, replace=False), 'deltaonset mean abs'] = np.nan
+    return table
+
+
+def sorted_reference(table: pd.DataFrame, column: str, largest: bool, **selection)->pd.DataFrame:
+    """Rows of the selection sorted by a column (ties in table order), missing values removed"""
+    for c, v in selection.items():
+        table = table[table[c] == v]
+    return table.dropna(subset=[column]).sort_values(column, ascending=not largest, kind='stable')
+
+
+@pytest.mark.parametrize("largest", [True, False])
+@pytest.mark.parametrize("selection", [{}, {'performer': 'a'}, {'performer': 'b', 'fantasia': 2},
+                                       {'movement_name': 'presto'}])
+def test_top_bars_match_sort(largest, selection):
+    table = random_table()
+    column = 'deltaonset mean abs'
+    top = top_bars(table, column, k=15, largest=largest, **selection)
+    expected = sorted_reference(table, column, largest, **selection)
+    assert top[column].tolist() == expected[column].head(15).tolist()
+    # ties may be ordered differently, not the selected values
+    assert len(top) == min(15, len(expected))
+    assert top.index.is_unique
+
+
+def test_top_bars_empty_selection():
+    assert len(top_bars(random_table(), k=5, performer='nobody')) == 0
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.05, 0.2])
+def test_bars_above_match_filter(threshold):
+    table = random_table(1)
+    column = 'deltaonset mean abs'
+    above = bars_above(table, column, threshold, performer='a')
+    expected = sorted_reference(table, column, True, performer='a')
+    expected = expected[expected[column] > threshold]
+    assert sorted(above.index) == sorted(expected.index)
+    assert above[column].is_monotonic_decreasing
+
+
+def test_bar_table_matches_events():
+    table = bar_table(voices='u')
+    events = corpus_events()
+    bar = table[(table['performer'] == 'pahud') & (table['fantasia'] == 3)].iloc[5]
+    selected = events[(events[BAR_KEY] == bar[BAR_KEY]).all(axis=1)]
+    selected = selected[selected['step'] == selected['step'].min()]
+    notes = selected[selected['voice'] == 'u']
+    assert bar['quarters'] == pytest.approx(selected['duration'].sum())
+    assert bar['tempo'] == pytest.approx(60000 * selected['duration'].sum() / selected['ioi'].sum())
+    assert bar['notes'] == len(notes)
+    if len(notes):
+        assert bar['deltaioi mean abs'] == pytest.approx(notes['deltaioi'].abs().mean())
+        assert bar['deltaonset max abs'] == pytest.approx(notes['deltaonset'].abs().max())
+    assert not table.duplicated(BAR_KEY).any()
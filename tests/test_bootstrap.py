@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bootstrap confidence intervals against a plain resampling with np.percentile
+"""
+
+import numpy as np
+import pytest
+from src import bootstrap
+from src.bootstrap import bootstrap_ci, results_to_stats_with_ci
+
+
+def plain_bootstrap(values: np.ndarray, n_resamples: int, rng: np.random.Generator)->tuple[float]:
+    """Percentile intervals of the mean and the median from resamples drawn with rng.choice"""
+    drawn = rng.choice(values, size=(n_resamples, len(values)), replace=True)
+    means, medians = drawn.mean(axis=1), np.median(drawn, axis=1)
+    return tuple(np.percentile(means, [2.5, 97.5])) + tuple(np.percentile(medians, [2.5, 97.5]))
+
+
+def samples(seed: int=0)->dict[str:dict[str:list]]:
+    rng = np.random.default_rng(seed)
+    return {'a': {'all': rng.normal(0, 1, 200).tolist(), 'u': rng.exponential(1, 31).tolist(),
+                  'one': [0.5], 'none': []},
+            'b': {'all': rng.normal(1, 2, 120).tolist(), 'u': rng.normal(0, 1, 40).tolist(),
+                  'one': [1.0], 'none': []}}
+
+
+def test_matches_plain_bootstrap():
+    results = samples()
+    ci = bootstrap_ci(results, n_resamples=20000, seed=1)
+    rng = np.random.default_rng(2)
+    for p in results:
+        for g in ['all', 'u']:
+            expected = plain_bootstrap(np.array(results[p][g]), 20000, rng)
+            width = expected[1] - expected[0]
+            assert np.allclose(ci[p][g], expected, atol=0.05 * width)
+    assert ci['a']['one'] == (0.5, 0.5, 0.5, 0.5)
+    assert ci['a']['none'] == (0.0, 0.0, 0.0, 0.0)
+
+
+def test_deterministic(monkeypatch):
+    results = samples(3)
+    serial = bootstrap_ci(results, seed=4, workers=1)
+    assert bootstrap_ci(results, seed=4, workers=1) == serial
+    # same chunks of resamples in a process pool
+    monkeypatch.setattr(bootstrap, 'SERIAL_ELEMENTS', 0)
+    assert bootstrap_ci(results, seed=4, workers=2) == serial
+    assert bootstrap_ci(results, seed=5, workers=1) != serial
+
+
+def test_coverage():
+    rng = np.random.default_rng(6)
+    covered = np.zeros(2)
+    repeats = 200
+    for i in range(repeats):
+        low_mean, high_mean, low_median, high_median = bootstrap_ci({'p': {'g': rng.normal(0, 1, 60)}},
+                                                                    n_resamples=500, seed=i)['p']['g']
+        covered += [low_mean <= 0 <= high_mean, low_median <= 0 <= high_median]
+    assert np.all(covered / repeats > 0.88) and np.all(covered / repeats <= 1)
+
+
+def test_stats_rows():
+    results = samples()
+    stats = results_to_stats_with_ci(results, n_resamples=200)
+    low_mean, high_mean = stats['a']['all'][8:10]
+    assert low_mean <= stats['a']['all'][1] <= high_mean
+    assert len(stats['b']['u']) == 12
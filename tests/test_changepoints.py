@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+PELT segmentation against an exhaustive optimal partitioning
+"""
+
+import numpy as np
+import pytest
+from src.changepoints import pelt, noise_variance, bars_tempi, performance_changepoints
+from src.events import performance_events
+
+
+def optimal_cost(series: np.ndarray, boundaries: list[int], penalty: float)->float:
+    """Sum of squared deviations to the segments means plus penalties"""
+    edges = [0] + boundaries + [len(series)]
+    return sum(((series[s:e] - series[s:e].mean())**2).sum() for s, e in zip(edges[:-1], edges[1:])) \
+        + penalty * len(boundaries)
+
+
+def optimal_partitioning(series: np.ndarray, penalty: float, min_size: int)->float:
+    """Cost of the optimal segmentation by dynamic programming without pruning"""
+    n = len(series)
+    best = [-penalty] + [np.inf] * n
+    for t in range(min_size, n + 1):
+        for s in range(0, t - min_size + 1):
+            if np.isfinite(best[s]):
+                segment = series[s:t]
+                best[t] = min(best[t], best[s] + ((segment - segment.mean())**2).sum() + penalty)
+    return best[n]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("min_size", [1, 2, 3])
+def test_pelt_optimal(seed, min_size):
+    rng = np.random.default_rng(seed)
+    # 4 steps of random lengths with noise
+    series = np.repeat(rng.normal(0, 2, 4), rng.integers(2, 8, 4))
+    series = series + rng.normal(0, 0.3, len(series))
+    penalty = 2.0
+    boundaries = pelt(series, penalty, min_size)
+    lengths = np.diff([0] + boundaries + [len(series)])
+    assert lengths.min() >= min_size
+    assert optimal_cost(series, boundaries, penalty) == pytest.approx(optimal_partitioning(series, penalty, min_size))
+
+
+def test_pelt_steps():
+    series = np.concatenate([np.zeros(10), np.ones(8) * 5, np.ones(12) * -2])
+    series += np.random.default_rng(0).normal(0, 0.1, len(series))
+    assert pelt(series, 1.0) == [10, 18]
+    # too short to be split
+    assert pelt(series[:3], 1.0, min_size=2) == []
+    # penalty larger than any gain
+    assert pelt(series, 1e6) == []
+
+
+def test_noise_variance():
+    rng = np.random.default_rng(1)
+    # steps do not inflate the estimate
+    series = np.repeat([0.0, 10.0, -5.0], 300) + rng.normal(0, 2, 900)
+    assert noise_variance(series) == pytest.approx(4, rel=0.15)
+    assert noise_variance(np.ones(2)) == 0
+
+
+def test_performance_segments():
+    events = performance_events('rampal', 4)
+    bars = bars_tempi(events)
+    segments = performance_changepoints('rampal', 4)
+    # segments partition the bars of each movement
+    assert segments['bars'].sum() == len(bars)
+    assert segments.groupby('movement')['bars'].sum().to_dict() == bars.groupby('movement').size().to_dict()
+    assert (segments['bars'] >= 2).all() and (segments['tempo'] > 0).all()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""
+Binned kernel density estimates against scipy Gaussian kernel density estimates
+"""
+
+import numpy as np
+import pytest
+from scipy.stats import gaussian_kde
+from src.density import binned_kde, silverman_bandwidth, category_bounds, densities, violin_stats
+
+
+def exact_kde(values: np.ndarray, bandwidth: float, coords: np.ndarray)->np.ndarray:
+    """Gaussian kernel density of scipy with the same bandwidth"""
+    return gaussian_kde(values, bw_method=bandwidth / np.std(values, ddof=1))(coords)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_binned_kde_scipy(seed):
+    rng = np.random.default_rng(seed)
+    groups = [rng.normal(0, 0.05, 400), rng.standard_t(3, 150) * 0.02 + 0.1,
+              np.concatenate([rng.normal(-0.1, 0.01, 100), rng.normal(0.1, 0.03, 300)])]
+    bandwidths = np.array([silverman_bandwidth(g) for g in groups])
+    bounds = np.array([category_bounds([g], np.array([b])) for g, b in zip(groups, bandwidths)])
+    coords, dens = binned_kde(groups, bounds, bandwidths)
+    for g, b, x, d in zip(groups, bandwidths, coords, dens):
+        exact = exact_kde(g, b, x)
+        assert np.abs(d - exact).max() <= 0.02 * exact.max()
+        # mass of the grid
+        assert np.trapezoid(d, x) == pytest.approx(np.trapezoid(exact, x), abs=0.01)
+
+
+def test_silverman_bandwidth():
+    values = np.random.default_rng(3).normal(0, 1, 1000)
+    # scipy's silverman factor is 0.9 * sigma * n^(-1/5) on gaussian samples up to the IQR term
+    assert silverman_bandwidth(values) == pytest.approx(0.9 * np.std(values) * 1000 ** -0.2, rel=0.05)
+    assert silverman_bandwidth(np.ones(10)) == 0
+    assert silverman_bandwidth(np.ones(1)) == 0
+
+
+def test_densities_cached(monkeypatch):
+    rng = np.random.default_rng(4)
+    results = {p: {'all': list(rng.normal(0, 0.05, 200)), 'const': [0.1] * 5} for p in ('a', 'b')}
+    curves = densities(results, 'deltaioi', scope='test')
+    # shared grid by category
+    assert np.array_equal(curves['a']['all'][0], curves['b']['all'][0])
+    # degenerate sample: finite curve around its value
+    coords, density = curves['a']['const']
+    assert np.all(np.isfinite(density)) and coords[np.argmax(density)] == pytest.approx(0.1, abs=0.01)
+    # computed once
+    monkeypatch.setattr('src.density.binned_kde', None)
+    again = densities(results, 'deltaioi', scope='test')
+    assert again['a']['all'][1] is curves['a']['all'][1]
+
+
+def test_violin_stats():
+    values = [0.01, 0.02, 0.05]
+    coords, density = np.linspace(0, 0.1, 5), np.ones(5) * 10
+    stats = violin_stats(values, (coords, density), scale=100)
+    assert np.allclose(stats['coords'], coords * 100) and np.allclose(stats['vals'], 0.1)
+    assert stats['median'] == pytest.approx(2) and stats['max'] == pytest.approx(5)
+    assert violin_stats([], (coords, density))['mean'] == 0
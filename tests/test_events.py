@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""
+Vectorised events table against the loop over measures of durations_analyse_tools
+"""
+
+import numpy as np
+import pytest
+from src.durations_analyse_tools import get_all_metric_and_data_for_one_performer
+from src.events import performance_events, fraction_denominators
+
+
+@pytest.mark.parametrize("performer, fantasia, fugato, movement_name", [
+    ('kuijken', 1, False, None),
+    ('pahud', 7, True, None),
+    ('rampal', 5, False, 'toccata'),
+])
+@pytest.mark.parametrize("metric", ['deltaioi', 'deltaonset'])
+def test_metrics_match_measures_loop(performer, fantasia, fugato, movement_name, metric):
+    events = performance_events(performer, fantasia, fugato, movement_name)
+    metric_data, data = get_all_metric_and_data_for_one_performer(performer, metric, f=fantasia, fugato=fugato,
+                                                                  movement_name=movement_name)
+    assert len(events) == len(metric_data) > 0
+    assert np.allclose(events[metric].to_numpy(), np.array(metric_data, dtype=float))
+    assert events['measure'].tolist() == [int(d['measure']) for d in data]
+    assert events['repeated'].tolist() == [int(d['repeated']) for d in data]
+
+
+def test_fraction_denominators():
+    x = np.array([0.0, 0.5, 1/3, 0.75, 5/12, 0.123456])
+    assert fraction_denominators(x).tolist() == [1, 2, 3, 4, 12, 100]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+"""
+Placeholders of lazily imported modules: attributes read, patched and listed on the module itself
+"""
+
+import importlib
+import os
+import subprocess
+import sys
+from src import LazyModule, lazy_import, loaded
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_patch_through_placeholder(monkeypatch, tmp_path):
+    placeholder = lazy_import('src.score_pages')
+    module = importlib.import_module('src.score_pages')
+    previous = module.PAGES_CACHE
+    monkeypatch.setattr(placeholder, 'PAGES_CACHE', str(tmp_path))
+    assert module.PAGES_CACHE == placeholder.PAGES_CACHE == str(tmp_path)
+    assert module.pages_folder(1).startswith(str(tmp_path))
+    monkeypatch.undo()
+    assert module.PAGES_CACHE == previous
+
+
+def test_placeholder_forwards_dir_and_delattr():
+    placeholder = lazy_import('src.rolling')
+    assert 'rolling_quantiles' in dir(placeholder)
+    placeholder.EXTRA = 1
+    assert loaded(placeholder).EXTRA == 1
+    del placeholder.EXTRA
+    assert not hasattr(loaded(placeholder), 'EXTRA')
+    assert loaded(placeholder) is importlib.import_module('src.rolling')
+
+
+def test_submodule_import_is_lazy():
+    # fresh interpreter: the submodule is only run at its first attribute access
+    code = ("import sys\nfrom src import spectral, LazyModule\n"
+            "assert isinstance(spectral, LazyModule) and 'src.spectral' not in sys.modules\n"
+            "from src import spectral as again\nassert again is spectral\n"
+            "spectral.WINDOW_QUARTERS = 0\nimport src.spectral\nassert src.spectral.WINDOW_QUARTERS == 0\n")
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                   env=dict(os.environ, PYTHONPATH=ROOT))
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sparse least squares of the linear model against a dense lstsq
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.events import performance_events
+from src.linear_model import design_matrix, weighted_fit, fit_timing_model, model_frame
+
+
+def frame(n: int=300, seed: int=0)->pd.DataFrame:
+    """Random categorical factors, one of them with an unobserved combination"""
+    rng = np.random.default_rng(seed)
+    res = pd.DataFrame({'a': rng.choice(['p', 'q', 'r'], n, p=[0.5, 0.3, 0.2]),
+                        'b': rng.choice(['u', 'v'], n, p=[0.6, 0.4])})
+    res.loc[(res['a'] == 'r') & (res['b'] == 'v'), 'b'] = 'u'
+    return res
+
+
+def dense_design(frame: pd.DataFrame, interactions: tuple=())->np.ndarray:
+    """Treatment coding built column by column (reference: most frequent level)"""
+    columns = [np.ones(len(frame))]
+    for f in frame.columns:
+        levels = list(frame[f].value_counts().index)
+        columns += [(frame[f] == l).to_numpy(dtype=float) for l in levels[1:]]
+    for f1, f2 in interactions:
+        l1, l2 = list(frame[f1].value_counts().index), list(frame[f2].value_counts().index)
+        columns += [((frame[f1] == a) & (frame[f2] == b)).to_numpy(dtype=float) for a in l1[1:] for b in l2[1:]]
+    x = np.column_stack(columns)
+    return x[:, x.sum(axis=0) > 0]
+
+
+def test_design_matrix_matches_dense_coding():
+    f = frame()
+    x, names = design_matrix(f, interactions=(('a', 'b'),))
+    assert np.array_equal(x.toarray(), dense_design(f, interactions=(('a', 'b'),)))
+    assert names[0] == 'intercept' and len(names) == x.shape[1]
+
+
+def test_weighted_fit_matches_lstsq():
+    f = frame()
+    x, _ = design_matrix(f, interactions=(('a', 'b'),))
+    rng = np.random.default_rng(1)
+    y = rng.normal(size=(len(f), 2))
+    weights = rng.uniform(0.2, 1.0, size=y.shape)
+    coefs, covariances = weighted_fit(x, y, weights)
+    dense = x.toarray()
+    for j in range(2):
+        root = np.sqrt(weights[:, j])
+        expected = np.linalg.lstsq(dense * root[:, None], y[:, j] * root, rcond=None)[0]
+        assert np.allclose(coefs[:, j], expected)
+        assert np.all(np.diag(covariances[j]) > 0)
+
+
+def test_timing_model_matches_lstsq():
+    events = pd.concat([performance_events(p, 1) for p in ('kuijken', 'pahud')], ignore_index=True)
+    factors = ('performer', 'voice', 'beat')
+    tables = fit_timing_model(events, factors=factors)
+    events = events[events['voice'] != '.']
+    dense = dense_design(model_frame(events, factors))
+    for metric, table in tables.items():
+        expected = np.linalg.lstsq(dense, events[metric].to_numpy(dtype=float), rcond=None)[0]
+        assert table['coef'].to_numpy() == pytest.approx(expected)
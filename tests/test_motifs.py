@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+Motif index against a brute-force count of the n-grams, pitch names conversion
+"""
+
+from collections import Counter
+import numpy as np
+import pandas as pd
+import pytest
+from src.motifs import MotifIndex, motif_occurrences, DURATION_DIVISIONS
+from src.pitches import name_to_midi, pitch_numbers, REST
+from src.events import corpus_events
+
+
+def melody(pitches: list[str], performer: str='a', movement: int=1)->list[dict]:
+    """Sixteenths of the upper voice, '0' for rests"""
+    return [{'performer': performer, 'fantasia': 1, 'movement': movement, 'movement_name': 'largo',
+             'measure': 1 + i // 16, 'repeated': 0, 'position': (i % 16) / 16,
+             'pitchname': p, 'voice': '.' if p == '0' else 'u', 'duration': 0.25,
+             'deltaioi': float(i), 'deltaonset': 0.0}
+            for i, p in enumerate(pitches)]
+
+
+def test_name_to_midi():
+    assert name_to_midi('C4') == 60 and name_to_midi('A4') == 69
+    assert name_to_midi('C♯5') == name_to_midi('D♭5') == 73
+    assert name_to_midi('B#3') == 60 and name_to_midi('E♭♭4') == 62
+    assert name_to_midi('0') == REST
+    assert pitch_numbers(np.array(['A4', '0', 'A4', 'G4'])).tolist() == [69, REST, 69, 67]
+    assert len(pitch_numbers(np.array([], dtype=str))) == 0
+
+
+def test_lookup():
+    events = pd.DataFrame(melody(['C4', 'D4', 'E4', 'C4', '0', 'G4', 'A4', 'B4', 'G4', 'A4'])
+                          + melody(['C4', 'D4', 'E4'], movement=2) + melody(['C4'], movement=3))
+    index = MotifIndex(events)
+    occurrences, values = motif_occurrences([2, 2, -4], [0.25] * 4, index=index)
+    # transposed occurrence found, not across the rest or the movements
+    assert occurrences['pitchname'].tolist() == ['C4', 'G4']
+    assert values['deltaioi'].tolist() == [[0, 1, 2, 3], [5, 6, 7, 8]]
+    assert len(index.lookup([2, 2, -4], [0.5] * 4)) == 0
+
+
+def test_recurrences_brute_force():
+    events = corpus_events(fantasias=(2,), performers=('pahud',))
+    index = MotifIndex(events, n=3)
+    notes = events[(events['voice'] != '.') & (events['pitchname'] != '0')]
+    counts = Counter()
+    rows = notes.index.to_numpy()
+    midi = pitch_numbers(notes['pitchname'].to_numpy())
+    durations = np.round(notes['duration'].to_numpy() * DURATION_DIVISIONS).astype(int)
+    movements = notes['movement'].to_numpy()
+    for i in range(len(notes) - 2):
+        if rows[i + 2] - rows[i] == 2 and movements[i] == movements[i + 2]:
+            counts[(midi[i+1] - midi[i], midi[i+2] - midi[i+1]) + tuple(durations[i:i+3] / DURATION_DIVISIONS)] += 1
+    recurrences = index.recurrences(min_count=1)
+    found = {tuple(r.intervals) + tuple(r.durations): r.occurrences for r in recurrences.itertuples()}
+    assert found == dict(counts)
+    assert (np.diff(recurrences['occurrences']) <= 0).all()
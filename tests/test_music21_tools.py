@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cached parsed scores: slices returned to the callers are copies
+"""
+
+from src import music21_tools
+from src.music21_tools import score
+
+
+def pitches(excerpt)->list[str]:
+    return [n.nameWithOctave for n in excerpt.recurse().notes]
+
+
+def test_modified_slice_does_not_leak(monkeypatch, tmp_path):
+    monkeypatch.setattr(music21_tools, 'SCORES_CACHE', str(tmp_path))
+    first = score(1, 1, 3)
+    expected = pitches(first)
+    assert len(expected) > 0
+    first.transpose(2, inPlace=True)
+    first.parts[0].remove(first.parts[0].getElementsByClass('Measure')[0])
+    assert pitches(first) != expected
+    assert pitches(score(1, 1, 3)) == expected
+    assert score(1, 1, 3) is not score(1, 1, 3)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+"""
+Suspect alignment points: robust z-scores on hand-made values and an injected alignment error
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.outliers import cross_performers_z, local_z, score_event_keys, suspect_alignments, MAD_SCALE, MIN_MAD
+from src.events import corpus_events
+
+
+def test_cross_performers_z():
+    values = {'a': [0.0, 0.1], 'b': [0.1, 0.1], 'c': [0.2, 0.1], 'd': [1.0, None]}
+    events = pd.DataFrame([{'performer': p, 'fantasia': 1, 'measure': 1, 'repeated': 0, 'note': n, 'deltaioi': v}
+                           for p, vs in values.items() for n, v in enumerate(vs) if v != None])
+    z = cross_performers_z(events)
+    first = events['note'] == 0
+    # median 0.15, MAD 0.1 * MAD_SCALE
+    expected = (events.loc[first, 'deltaioi'] - 0.15) / (0.1 * MAD_SCALE)
+    assert np.allclose(z[first], expected)
+    # identical values: MAD bounded, no infinite score
+    assert np.allclose(z[~first], 0)
+    # too few performances
+    assert np.isnan(cross_performers_z(events[events['performer'].isin(['a', 'b'])])).all()
+
+
+def test_local_z():
+    values = np.zeros(40)
+    values[20] = 1.0
+    events = pd.DataFrame({'performer': 'a', 'fantasia': 1, 'deltaioi': values})
+    z = local_z(events, window=4)
+    assert z[20] == pytest.approx(1.0 / MIN_MAD)
+    # window edges with half a window of neighbours
+    assert np.allclose(np.delete(z, 20), 0)
+
+
+def test_injected_error_ranked_first():
+    events = corpus_events(fantasias=(4,)).copy()
+    played = np.flatnonzero(events['voice'].to_numpy() != '.')
+    row = played[len(played) // 2]
+    events.iloc[row, events.columns.get_loc('deltaioi')] += 2.0
+    report = suspect_alignments(events)
+    keyed = score_event_keys(events[events['voice'] != '.'])
+    target = keyed.loc[row]
+    assert tuple(report.loc[0, ['performer', 'fantasia', 'measure', 'repeated', 'note']]) == \
+        (target['performer'], target['fantasia'], target['measure'], target['repeated'], target['note'])
+    assert (report['score'].diff().dropna() <= 0).all()
+    assert (report['z performers'] * report['z local'] > 0).all()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Dependency graph of the page state: only the results depending on a changed input are invalidated
+"""
+
+from src.page_state import PageState
+
+
+def page()->tuple[PageState, dict, list]:
+    """Results of a performer page: statistics from results, plots from results and the plot type"""
+    state, calls = dict(), []
+    page_state = PageState('p', {'results': ('performer', 'metric'), 'statistics': ('results',),
+                                 'plots': ('results', 'plot'), 'score': ('fantasia',)}, state)
+    state['p/performer'], state['p/metric'], state['p/plot'], state['p/fantasia'] = 'a', 'deltaioi', 'box', 1
+
+    def compute(name):
+        calls.append(name)
+        return name
+
+    for name in ('results', 'statistics', 'plots', 'score'):
+        page_state.get(name, compute, name)
+    return page_state, state, calls
+
+
+def test_graph():
+    page_state, _, _ = page()
+    assert page_state.inputs('statistics') == ['metric', 'performer']
+    assert page_state.inputs('plots') == ['metric', 'performer', 'plot']
+    assert page_state.dependents('performer') == {'results', 'statistics', 'plots'}
+    assert page_state.dependents('plot') == {'plots'}
+    assert page_state.dependents('statistics') == set()
+
+
+def test_invalidate_dependents_only():
+    page_state, state, _ = page()
+    page_state.invalidate('plot')
+    assert 'p/plots' not in state
+    assert all(f"p/{n}" in state for n in ('results', 'statistics', 'score'))
+    page_state.invalidate('performer')
+    assert not any(f"p/{n}" in state for n in ('results', 'statistics', 'plots'))
+    assert page_state.ready('score')
+    # inputs are kept
+    assert state['p/performer'] == 'a'
+    # unknown or not computed names
+    page_state.invalidate('other')
+    page_state.invalidate('plots')
+
+
+def test_recomputed_on_change():
+    page_state, state, calls = page()
+    calls.clear()
+    # changed input without callback: stale results recomputed, with their dependents
+    state['p/metric'] = 'deltaonset'
+    assert not page_state.ready('statistics') and page_state.ready('score')
+    page_state.get('results', calls.append, 'results')
+    assert 'p/statistics' not in state and 'p/plots' not in state
+    page_state.get('score', calls.append, 'score')
+    assert calls == ['results']
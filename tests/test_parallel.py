@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared process pools: reused between calls, results in order, serial runs in background
+"""
+
+import os
+from src.parallel import background, map_pool, imap_pool, run_chunks, shared_pool
+
+
+def test_pool_reused():
+    first = map_pool(os.getpid, [()] * 4, workers=2)
+    second = map_pool(os.getpid, [()] * 4, workers=2)
+    assert os.getpid() not in first
+    assert set(first) | set(second) <= set(shared_pool(2)._processes)
+    assert shared_pool(2) is shared_pool(2)
+
+
+def test_results_in_order():
+    assert map_pool(pow, [(2, i) for i in range(10)], workers=2) == [2**i for i in range(10)]
+    assert sorted(imap_pool(pow, [(3, i) for i in range(5)], workers=2)) == [(i, 3**i) for i in range(5)]
+
+
+def test_stopped_iteration():
+    results = imap_pool(pow, [(2, i) for i in range(50)], workers=2)
+    next(results)
+    results.close()
+    assert map_pool(abs, [(-1,), (-2,)], workers=2) == [1, 2]
+
+
+def test_serial_in_background():
+    with background():
+        assert run_chunks(os.getpid, [()] * 3, workers=2) == [os.getpid()] * 3
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+"""
+Indexed voice-pattern search against a brute-force regular expression scan of each performance
+"""
+
+import re
+import numpy as np
+import pandas as pd
+import pytest
+from src.patterns import VoiceIndex, VOICES, WILDCARD, pattern_results
+
+
+def random_events(seed: int=0)->pd.DataFrame:
+    """Events of 3 performances with random voices, bars of 4 events, durations and beats"""
+    rng = np.random.default_rng(seed)
+    tables = []
+    for performer, fantasia, n in [('a', 1, 400), ('a', 2, 7), ('b', 1, 300)]:
+        tables.append(pd.DataFrame({'performer': performer, 'fantasia': fantasia,
+                                    'voice': rng.choice(list('uBbx.'), n, p=[0.35, 0.3, 0.2, 0.1, 0.05]),
+                                    'bar': np.arange(n) // 4,
+                                    'duration': rng.choice([0.5, 1.0], n),
+                                    'beat': rng.choice(['first', 'on', 'off'], n),
+                                    'time_signature': rng.choice(['3/4', '6/8'], n),
+                                    'deltaonset': rng.normal(size=n)}))
+    return pd.concat(tables, ignore_index=True)
+
+
+def regex(pattern: str)->str:
+    """Regular expression of a voice pattern"""
+    res = ''
+    for token in re.findall(r"\[[^\]]+\]|.", pattern):
+        if token == WILDCARD:
+            res += f"[{re.escape(VOICES)}]"
+        elif token.startswith('['):
+            res += f"[{re.escape(token[1:-1])}]"
+        else:
+            res += re.escape(token)
+    return res
+
+
+def brute_force(events: pd.DataFrame, pattern: str, same_bar: bool)->list[int]:
+    """Rows of the events starting a pattern, scanning the voices of each performance (overlapping matches)"""
+    res = []
+    length = len(re.findall(r"\[[^\]]+\]|.", pattern))
+    for _, performance in events.groupby(['performer', 'fantasia'], sort=False):
+        voices = ''.join(performance['voice'])
+        for m in re.finditer(f"(?={regex(pattern)})", voices):
+            bars = performance['bar'].to_numpy()
+            if not same_bar or bars[m.start()] == bars[m.start() + length - 1]:
+                res.append(performance.index[m.start()])
+    return sorted(res)
+
+
+@pytest.mark.parametrize("pattern", ['uBu', 'u', 'Bb', '[Bb]u[Bb]u', 'u??B', '?.?', 'x[ub]', 'uuuuuu'])
+@pytest.mark.parametrize("same_bar", [True, False])
+def test_search_matches_brute_force(pattern, same_bar):
+    events = random_events()
+    index = VoiceIndex(events)
+    assert sorted(index.search(pattern, same_bar=same_bar).tolist()) == brute_force(events, pattern, same_bar)
+
+
+def test_search_constraints():
+    events = random_events(1)
+    index = VoiceIndex(events)
+    rows = index.search('u?B', durations=(0.5, None, 1.0), beats=(('on', 'first'), None, None),
+                        time_signatures=['3/4'], same_bar=False)
+    expected = [r for r in brute_force(events, 'u?B', False)
+                if events.loc[r, 'duration'] == 0.5 and events.loc[r + 2, 'duration'] == 1.0
+                and events.loc[r, 'beat'] in ('on', 'first') and events.loc[r, 'time_signature'] == '3/4']
+    assert sorted(rows.tolist()) == expected
+
+
+def test_pattern_results():
+    events = random_events(2)
+    index = VoiceIndex(events)
+    results = pattern_results(['uB', 'Bu'], index=index, same_bar=False)
+    rows = sorted(set(brute_force(events, 'uB', False)) | set(brute_force(events, 'Bu', False)))
+    for performer in ['a', 'b']:
+        selected = [r for r in rows if events.loc[r, 'performer'] == performer]
+        assert results[performer]['1st'] == events.loc[selected, 'deltaonset'].tolist()
+        assert results[performer]['2nd'] == events.loc[[r + 1 for r in selected], 'deltaonset'].tolist()
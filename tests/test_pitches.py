@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Pitch columns of the alignments and the statistic groups built on them
+"""
+
+import pytest
+from src.pitches import add_pitch_columns
+from src.durations_analyse_tools import (get_interval_indexes, get_voices_distance_indexes,
+                                         get_all_metric_and_data_for_one_performer)
+from src.stats import get_metric_results
+
+# groups of the statistics tables before the pitch groups, in display order
+CATEGORIES = ['all', 'no rest', 'b', 'B', 'B+b', 'u', 'm', 'x', '♩', '♪', '♬', '1st beat', 'on beat', '♪ on',
+              'off beat', '♪ off', '1st♪♪ inter BM', '2nd♪♪ inter BM', '1st♪♪ NO inter BM', '2nd♪♪ NO inter BM',
+              '1st♬♬ BM', '2nd♬♬ BM', '3rd♬♬ BM', '4th♬♬ BM', '1st♬♬ interleaved upper/lower',
+              '2nd♬♬ interleaved upper/lower', '3rd♬♬ interleaved upper/lower', '4th♬♬ interleaved upper/lower',
+              '1st♪♪♪ TM', '2nd♪♪♪ TM', '3rd♪♪♪ TM']
+PITCH_CATEGORIES = ['unison', 'step', 'leap', 'large leap', 'ascending', 'descending',
+                    'voices ≤ 5th', 'voices 6th-8ve', 'voices > 8ve']
+
+
+def element(pitchname: str, voice: str, movement: str='1', duration: str='0.5')->dict:
+    return {'pitchname': pitchname, 'voice': voice, 'movement': movement, 'duration': duration}
+
+
+def test_add_pitch_columns():
+    data = [element('C4', 'b'), element('G5', 'u'), element('0', '.'), element('D4', 'b', duration='0.0'),
+            element('E4', 'b'), element('F5', 'u'), element('C4', 'b', movement='2')]
+    add_pitch_columns(data)
+    assert [d['midi'] for d in data] == ['60', '79', '', '', '64', '77', '60']
+    # rests and grace notes skipped, no interval across movements
+    assert [d['interval'] for d in data] == ['', '19', '', '', '-15', '13', '']
+    # to the last note of the other voice, positive if the upper voice is above
+    assert [d['voices_distance'] for d in data] == ['', '19', '', '', '15', '13', '']
+    add_pitch_columns([])
+
+
+def test_indexes():
+    data = [element('C4', 'b'), element('C4', 'u'), element('D4', 'u'), element('G4', 'b'), element('A5', 'u')]
+    add_pitch_columns(data)
+    assert get_interval_indexes(data, 0, 0) == [1]
+    assert get_interval_indexes(data, 1, 2) == [2]
+    assert get_interval_indexes(data, 3, 7) == [3]
+    assert get_interval_indexes(data, 8) == [4]
+    assert get_interval_indexes(data, 1, direction=-1) == []
+    assert get_voices_distance_indexes(data, 0, 7) == [1, 2, 3]
+    assert get_voices_distance_indexes(data, 13) == [4]
+
+
+def test_groups_order():
+    metric_data, data = get_all_metric_and_data_for_one_performer('kuijken', 'deltaioi', f=3)
+    results = get_metric_results(metric_data, data)
+    # pitch groups after the existing groups, whose order is kept
+    assert list(results) == CATEGORIES + PITCH_CATEGORIES
+    notes = len(results['no rest'])
+    assert len(results['unison']) + len(results['step']) + len(results['leap']) + len(results['large leap']) < notes
+    assert len(results['ascending']) + len(results['descending']) + len(results['unison']) == \
+        len(get_interval_indexes(data, 0))
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+"""
+Background scheduler: priorities, serial computations paused while pages are waiting
+"""
+
+import os
+import time
+from src.data import PERFORMERS, MOVEMENTS_POSITIONS
+from src.parallel import checkpoint, in_background, run_chunks
+from src.precompute import SCHEDULER, Scheduler, PREFETCH, WARMUP, warmup_tasks
+from src.shared_cache import ResultCache
+
+
+def test_submit_priorities():
+    scheduler = Scheduler(ResultCache(), workers=1)
+    assert scheduler.submit('a', int, priority=WARMUP)
+    assert scheduler.submit('b', int, priority=WARMUP)
+    # queued again with a higher priority, not with a lower one
+    assert scheduler.submit('b', int, priority=PREFETCH)
+    assert not scheduler.submit('b', int, priority=WARMUP)
+    assert [scheduler.next_task()[0] for _ in range(2)] == ['b', 'a']
+    assert scheduler.stats()['queued'] == 0
+
+
+def test_background_serial_and_paused():
+    cache = ResultCache()
+    scheduler = Scheduler(cache, workers=1)
+    steps = []
+
+    def task(n):
+        for i in range(n):
+            checkpoint()
+            steps.append(in_background())
+            time.sleep(0.02)
+        # no process pool in background
+        return run_chunks(os.getpid, [()] * 3, workers=3)
+
+    scheduler.submit('k', task, 20)
+    scheduler.start()
+    time.sleep(0.05)
+    with cache.foreground_request():
+        time.sleep(0.05)
+        paused = len(steps)
+        time.sleep(0.2)
+        assert len(steps) == paused < 20
+        # a page waiting for the result being computed: not paused (no deadlock)
+        assert cache.get_or_compute('k', task, 0) == [os.getpid()] * 3
+    assert all(steps) and not in_background()
+
+
+def test_warmup_all_selections():
+    keys = [key for key, _, _ in warmup_tasks()]
+    assert len(keys) == len(set(keys)) == 2 * len(PERFORMERS) * (2 + len(MOVEMENTS_POSITIONS))
+    # default selections first
+    assert {k.performer for k in keys[:len(PERFORMERS)]} == set(PERFORMERS)
+    assert {k.metric for k in keys[:len(PERFORMERS)]} == {'deltaioi'}
+    assert [(k.scope, k.performer) for k in keys[len(PERFORMERS):len(PERFORMERS) + 3]] == \
+        [('corpus', 'kuijken'), ('fugatos', 'kuijken'), ('movements', 'kuijken')]
+    assert all(k.fugato == (k.scope == 'fugatos') for k in keys)
+
+
+def test_not_started_out_of_server():
+    # started at import by the pages only
+    assert SCHEDULER.threads == []
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Repeated passes joined with the first pass on hand-made performances
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.repeats import repeated_notes, repeated_bars, repeat_change_results, CATEGORIES
+
+
+def bar_events(performer: str, measure: int, repeated: int, bar: int, iois: list[float],
+               pitches: list[str], deltaonsets: list[float])->list[dict]:
+    """Quarter notes of a 3/4 bar, deltaioi relative to 600 ms"""
+    return [{'performer': performer, 'fantasia': 1, 'movement': 1, 'measure': measure, 'repeated': repeated,
+             'bar': bar, 'position': i / 3, 'pitchname': pitch, 'voice': 'u' if i else 'b', 'duration': 1.0,
+             'beat': 'first' if i == 0 else 'on', 'ioi': ioi, 'deltaioi': (ioi - 600) / 1800,
+             'deltaonset': onset, 'bar_ioi': sum(iois)}
+            for i, (ioi, pitch, onset) in enumerate(zip(iois, pitches, deltaonsets))]
+
+
+@pytest.fixture
+def events():
+    rows = bar_events('a', 1, 0, 1, [600, 600, 600], ['C4', 'D4', 'E4'], [0.0, 0.0, 0.0])
+    rows += bar_events('a', 2, 0, 2, [600, 600, 600], ['C4', 'D4', 'E4'], [0.0, 0.0, 0.0])
+    # repeat of measure 1 faster, a different pitch at the 3rd beat (not joined)
+    rows += bar_events('a', 1, 1, 3, [500, 500, 500], ['C4', 'D4', 'F4'], [0.1, -0.1, 0.0])
+    rows += bar_events('b', 1, 0, 1, [600, 600, 600], ['C4', 'D4', 'E4'], [0.0, 0.0, 0.0])
+    rows += bar_events('b', 1, 1, 2, [600, 600, 600], ['C4', 'D4', 'E4'], [0.0, 0.0, 0.0])
+    # rest not joined
+    rows.append(dict(rows[-1], position=0.9, voice='.', pitchname='r'))
+    return pd.DataFrame(rows)
+
+
+def test_notes(events):
+    joined = repeated_notes(events)
+    assert joined.groupby('performer').size().to_dict() == {'a': 2, 'b': 3}
+    a = joined[joined['performer'] == 'a']
+    assert np.allclose(a['ioi ratio'], 5 / 6)
+    assert np.allclose(a['deltaonset change'], [0.1, -0.1])
+    assert (a['bar 0'] == 1).all()
+
+
+def test_bars(events):
+    bars = repeated_bars(repeated_notes(events)).set_index('performer')
+    assert bars.loc['a', 'tempo ratio'] == pytest.approx(1.2)
+    assert bars.loc['b', 'tempo ratio'] == 1.0
+    assert bars.loc['a', 'notes'] == 2 and bars.loc['a', 'mean deltaioi change'] == pytest.approx(-100 / 1800)
+
+
+def test_categories(events):
+    results = repeat_change_results('deltaonset', joined=repeated_notes(events))
+    assert set(results['a']) == set(CATEGORIES)
+    assert results['a']['all'] == pytest.approx([0.1, -0.1])
+    assert results['a']['1st beat'] == pytest.approx([0.1]) and results['a']['b'] == pytest.approx([0.1])
+    assert results['a']['u'] == pytest.approx([-0.1]) and results['a']['♪'] == []
+    # passes not selected
+    assert repeat_change_results('deltaonset', passes=(2,), joined=repeated_notes(events)) == {}
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+"""
+Rolling quantiles of the sorted window against numpy quantiles of each window
+"""
+
+import numpy as np
+import pytest
+from src.rolling import SortedWindow, rolling_quantiles, rolling_table
+from src.events import performance_events
+
+
+def naive_rolling(values: np.ndarray, bars: np.ndarray, window: int, quantiles: tuple[float])->np.ndarray:
+    """Quantiles of each window of bars by sorting it"""
+    res = []
+    for b in range(bars[0], bars[-1] + 1):
+        selected = values[(bars > b - window) & (bars <= b)]
+        if len(selected):
+            res.append([len(selected)] + [np.quantile(selected, q) for q in quantiles])
+        else:
+            res.append([0] + [np.nan] * len(quantiles))
+    return np.array(res)
+
+
+def test_window_kth():
+    rng = np.random.default_rng(0)
+    values = np.round(rng.normal(size=200), 1).tolist()
+    window = SortedWindow()
+    for v in values:
+        window.add(v)
+    for v in values[:80]:
+        window.remove(v)
+    remaining = np.sort(values[80:])
+    assert window.count == len(remaining)
+    assert [window.kth(k) for k in range(window.count)] == remaining.tolist()
+
+
+@pytest.mark.parametrize("window", [1, 3, 8])
+def test_rolling_quantiles_match_naive(window):
+    rng = np.random.default_rng(window)
+    # bars with several events, some without any, and ties
+    bars = np.sort(rng.choice(np.arange(10, 40), 150))
+    values = np.round(rng.normal(size=len(bars)), 1)
+    quantiles = (0.1, 0.25, 0.5, 0.75)
+    expected = naive_rolling(values, bars, window, quantiles)
+    assert np.allclose(rolling_quantiles(values, bars, window, quantiles), expected, equal_nan=True)
+
+
+def test_rolling_table_matches_naive():
+    events = performance_events('kuijken', 2)
+    table = rolling_table(events, 'deltaioi', 4)
+    assert len(table) == events['bar'].nunique()
+    played = events[events['voice'] != '.']
+    for movement in played['movement'].unique():
+        selected = played[played['movement'] == movement]
+        bars = selected['bar'].to_numpy()
+        expected = naive_rolling(selected['deltaioi'].to_numpy(), bars, 4, (0.25, 0.5, 0.75))
+        rows = table[table['bar'].isin(np.unique(bars))].set_index('bar')
+        positions = np.unique(bars) - bars[0]
+        assert np.allclose(rows['median'].to_numpy(), expected[positions, 2])
+        assert np.array_equal(rows['n'].to_numpy(), expected[positions, 0].astype(int))
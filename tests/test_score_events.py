@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""
+Banded sequence alignment on small hand-made sequences against the edit distance
+"""
+
+import numpy as np
+import pytest
+from src.score_events import banded_alignment
+
+
+def seq(values: list[int])->np.ndarray:
+    """Tokens (n, 2): pitch and a constant duration"""
+    return np.stack([np.array(values, dtype=np.int64), np.full(len(values), 12)], axis=1)
+
+
+def edit_distance(a: np.ndarray, b: np.ndarray)->int:
+    """Levenshtein distance of the rows of tokens"""
+    d = np.arange(len(b) + 1)
+    for i in range(1, len(a) + 1):
+        previous, d = d, np.empty(len(b) + 1, dtype=int)
+        d[0] = i
+        for j in range(1, len(b) + 1):
+            d[j] = min(previous[j] + 1, d[j-1] + 1, previous[j-1] + int(np.any(a[i-1] != b[j-1])))
+    return int(d[-1])
+
+
+def alignment_cost(a: np.ndarray, b: np.ndarray, pairs: list[tuple[int, int]])->int:
+    """Insertions, deletions and substitutions of the aligned pairs, checking they cover both sequences in order"""
+    assert [i for i, _ in pairs if i >= 0] == list(range(len(a)))
+    assert [j for _, j in pairs if j >= 0] == list(range(len(b)))
+    return sum(1 if i < 0 or j < 0 else int(np.any(a[i] != b[j])) for i, j in pairs)
+
+
+def test_hand_made():
+    a = seq([60, 62, 64, 65, 67])
+    assert banded_alignment(a, a) == [(i, i) for i in range(5)]
+    # a note missing in the second sequence
+    assert banded_alignment(a, seq([60, 62, 65, 67])) == [(0, 0), (1, 1), (2, -1), (3, 2), (4, 3)]
+    # an extra note and a wrong pitch
+    assert banded_alignment(a, seq([60, 61, 62, 64, 66, 67])) == [(0, 0), (-1, 1), (1, 2), (2, 3), (3, 4), (4, 5)]
+    # a different duration is a substitution
+    b = a.copy()
+    b[2, 1] = 6
+    assert banded_alignment(a, b) == [(i, i) for i in range(5)]
+    assert banded_alignment(a, seq([])) == [(i, -1) for i in range(5)]
+    assert banded_alignment(seq([]), seq([60])) == [(-1, 0)]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_edit_distance(seed):
+    rng = np.random.default_rng(seed)
+    a = seq(rng.integers(60, 64, rng.integers(5, 30)))
+    # edits of a: substitutions, insertions and deletions
+    values = list(a[:, 0])
+    for _ in range(rng.integers(1, 6)):
+        k = int(rng.integers(0, len(values)))
+        operation = rng.integers(0, 3)
+        if operation == 0:
+            values[k] = 70
+        elif operation == 1:
+            values.insert(k, 71)
+        elif len(values) > 1:
+            del values[k]
+    b = seq(values)
+    pairs = banded_alignment(a, b, band=len(a) + len(b))
+    assert alignment_cost(a, b, pairs) == edit_distance(a, b)
+    # narrow band widened to the difference of lengths: still a valid alignment
+    assert alignment_cost(a, b, banded_alignment(a, b, band=1)) >= edit_distance(a, b)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""
+Index of the measures on the rendered pages and selection of the systems
+"""
+
+import pandas as pd
+from src import score_pages
+from src.score_pages import selection_boxes, measures_index, selection_images
+
+
+def index()->pd.DataFrame:
+    """2 pages of 2 systems of 3 measures"""
+    rows = []
+    for m in range(1, 13):
+        system = (m - 1) // 3
+        rows.append({'measure': m, 'number': m, 'page': system // 2 + 1, 'system': system % 2 + 1,
+                     'top': 0.1 + 0.4 * (system % 2), 'bottom': 0.4 + 0.4 * (system % 2)})
+    return pd.DataFrame(rows)
+
+
+def test_selection_boxes():
+    assert selection_boxes(index(), 2, 3) == [(1, 0.1, 0.4)]
+    assert selection_boxes(index(), 3, 4) == [(1, 0.1, 0.8)]
+    assert selection_boxes(index(), 5, 8) == [(1, 0.5, 0.8), (2, 0.1, 0.4)]
+    # reversed range
+    assert selection_boxes(index(), 8, 5) == selection_boxes(index(), 5, 8)
+    # measure beyond the score: last system
+    assert selection_boxes(index(), 40, 41) == [(2, 0.5, 0.8)]
+
+
+def test_not_rendered(monkeypatch, tmp_path):
+    # never rendered at request time
+    monkeypatch.setattr(score_pages, 'PAGES_CACHE', str(tmp_path))
+    assert measures_index(1) is None
+    assert selection_images(1, 1, 4) is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+Memory budget, least recently used eviction and concurrent computations of the shared cache
+"""
+
+import threading
+import time
+import numpy as np
+import pytest
+from src import shared_cache
+from src.data import PERFORMERS
+from src.shared_cache import ResultCache, estimated_size
+
+
+def test_estimated_size():
+    values = np.zeros(1000)
+    assert estimated_size(values) == values.nbytes
+    assert estimated_size([1.0] * 1000) > estimated_size([1.0] * 10)
+    # shared objects counted once
+    assert estimated_size([values, values]) < 2 * values.nbytes
+    # a list starting with a number but holding other objects is walked
+    assert estimated_size([1.0, {'text': 'x' * 10000}]) > 10000
+
+
+def test_least_recently_used_evicted():
+    block = np.zeros(100)
+    cache = ResultCache(max_bytes=3 * block.nbytes)
+    for key in 'abc':
+        cache.put(key, np.zeros(100))
+    assert cache.get('a') is not None
+    cache.put('d', np.zeros(100))
+    assert 'b' not in cache
+    assert all(key in cache for key in 'acd')
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] <= cache.max_bytes
+
+
+def test_too_large_not_stored():
+    cache = ResultCache(max_bytes=100)
+    cache.put('a', np.zeros(1000))
+    assert 'a' not in cache and cache.stats()['bytes'] == 0
+
+
+def test_concurrent_requests_computed_once():
+    cache = ResultCache()
+    calls = []
+
+    def compute(x):
+        calls.append(x)
+        time.sleep(0.2)
+        return x * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute, 21)))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [42] * 5 and calls == [21]
+    assert cache.stats()['misses'] == 1
+    assert not cache.computing('k')
+
+
+def test_failed_computation_released():
+    cache = ResultCache()
+
+    def fail():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute('k', fail)
+    assert not cache.computing('k')
+    assert cache.get_or_compute('k', lambda: 1) == 1
+
+
+def test_wait_idle():
+    cache = ResultCache()
+    started = threading.Event()
+
+    def background():
+        cache.wait_idle()
+        started.set()
+
+    with cache.foreground_request():
+        thread = threading.Thread(target=background)
+        thread.start()
+        assert not started.wait(0.1)
+    assert started.wait(1)
+    thread.join()
+
+
+def test_reserved_result_waited_for():
+    cache = ResultCache()
+    assert cache.reserve('k') and not cache.reserve('k')
+    results = []
+    thread = threading.Thread(target=lambda: results.append(cache.get_or_compute('k', lambda: 0)))
+    thread.start()
+    time.sleep(0.1)
+    cache.put('k', 1)
+    cache.release('k')
+    thread.join()
+    assert results == [1] and not cache.computing('k')
+    # released twice or never reserved: nothing
+    cache.release('k')
+    assert not cache.reserve('k')
+
+
+def test_performers_timings_releases_reserved(monkeypatch):
+    cache = ResultCache()
+    monkeypatch.setattr(shared_cache, 'RESULTS', cache)
+    monkeypatch.setattr(shared_cache, 'compute_performer_results',
+                        lambda p, metric: {'results': {p: {'all': [PERFORMERS.index(p)]}}})
+    cache.put(shared_cache.result_key('corpus', PERFORMERS[2], 'deltaioi'),
+              {'results': {PERFORMERS[2]: {'all': [2]}}})
+    stream = shared_cache.performers_timings('deltaioi', workers=1)
+    # cached performer first, the others reserved while the stream is consumed
+    assert next(stream)[0] == PERFORMERS[2]
+    assert next(stream)[0] == PERFORMERS[0]
+    assert cache.foreground == 0
+    assert all(cache.computing(shared_cache.result_key('corpus', p, 'deltaioi')) for p in PERFORMERS[3:])
+    stream.close()
+    assert len(cache.pending) == 0
+    timings = shared_cache.corpus_timings('deltaioi')
+    assert [timings[p]['all'] for p in PERFORMERS] == [[i] for i in range(len(PERFORMERS))]
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+Batch tests between performers against the scipy implementations
+"""
+
+import numpy as np
+import pytest
+from scipy import stats
+from src import significance
+from src.significance import batch_tests, holm, mann_whitney
+
+
+def samples(seed: int=0)->dict[str:dict[str:list]]:
+    """Rounded metric values (ties) of 3 performers in 2 categories"""
+    rng = np.random.default_rng(seed)
+    return {p: {c: np.round(rng.normal(shift, 1, size), 1).tolist()
+                for c, size in (('all', 40), ('u', 25))}
+            for p, shift in (('a', 0.0), ('b', 0.3), ('c', -0.2))}
+
+
+def test_mann_whitney_matches_scipy():
+    rng = np.random.default_rng(1)
+    x, y = np.round(rng.normal(0, 1, 30), 1), np.round(rng.normal(0.5, 1, 45), 1)
+    u, p, delta = mann_whitney(x, y)
+    expected = stats.mannwhitneyu(x, y, alternative='two-sided', method='asymptotic', use_continuity=True)
+    assert u == pytest.approx(expected.statistic)
+    assert p == pytest.approx(expected.pvalue)
+    assert delta == pytest.approx(np.mean(np.sign(x[:, None] - y[None, :])))
+
+
+def test_holm_matches_definition():
+    pvalues = np.array([0.01, 0.04, np.nan, 0.03, 0.5])
+    valid = np.array([0.01, 0.04, 0.03, 0.5])
+    order = np.argsort(valid)
+    expected = np.empty(len(valid))
+    running = 0.0
+    for k, i in enumerate(order):
+        running = max(running, min(1.0, (len(valid) - k) * valid[i]))
+        expected[i] = running
+    adjusted = holm(pvalues)
+    assert np.isnan(adjusted[2])
+    assert np.allclose(adjusted[[0, 1, 3, 4]], expected)
+
+
+def test_batch_tests_match_scipy():
+    results = samples()
+    tab = batch_tests(results, permutations=False, workers=1)
+    for c in ['all', 'u']:
+        groups = [results[p][c] for p in results]
+        kruskal = stats.kruskal(*groups)
+        assert tab.loc[c, ('kruskal', 'H')] == pytest.approx(kruskal.statistic)
+        assert tab.loc[c, ('kruskal', 'p')] == pytest.approx(kruskal.pvalue)
+        for p1, p2 in [('a', 'b'), ('a', 'c'), ('b', 'c')]:
+            expected = stats.mannwhitneyu(results[p1][c], results[p2][c], alternative='two-sided',
+                                          method='asymptotic')
+            assert tab.loc[c, (f"{p1}/{p2}", 'p')] == pytest.approx(expected.pvalue)
+
+
+def test_batch_tests_permutations_reproducible():
+    results = samples(2)
+    first = batch_tests(results, n_permutations=200, seed=3, workers=1)
+    second = batch_tests(results, n_permutations=200, seed=3, workers=1)
+    assert first.equals(second)
+    perm = first.xs('p perm', axis=1, level=1).to_numpy()
+    assert np.all((perm > 0) & (perm <= 1))
+
+
+def test_batch_tests_pool_matches_serial(monkeypatch):
+    results = samples(4)
+    serial = batch_tests(results, n_permutations=100, seed=1, workers=1)
+    monkeypatch.setattr(significance, 'SERIAL_ELEMENTS', 0)
+    assert batch_tests(results, n_permutations=100, seed=1, workers=2).equals(serial)
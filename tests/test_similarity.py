@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Distances between performers: banded DTW against a cell by cell recursion, distances on hand-made profiles
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.similarity import dtw_distance, euclidean_distances, performers_clustering
+from src.data import PERFORMERS
+
+
+def naive_dtw(a: np.ndarray, b: np.ndarray, width: float)->float:
+    """DTW recursion cell by cell in the band"""
+    n, m = len(a), len(b)
+    d = np.full((n + 1, m + 1), np.inf)
+    d[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if abs(i * m / n - j) <= width:
+                d[i, j] = np.linalg.norm(a[i-1] - b[j-1]) + min(d[i-1, j], d[i, j-1], d[i-1, j-1])
+    return d[n, m] / (n + m)
+
+
+@pytest.mark.parametrize("n, m", [(10, 10), (12, 17), (25, 9)])
+def test_dtw_naive(n, m):
+    rng = np.random.default_rng(n * m)
+    a, b = rng.normal(size=(n, 2)), rng.normal(size=(m, 2))
+    for band, min_band in [(0.1, 4), (0.5, 1), (1.0, 1)]:
+        width = max(min_band, band * max(n, m))
+        assert dtw_distance(a, b, band, min_band) == pytest.approx(naive_dtw(a, b, width))
+
+
+def test_dtw_warping():
+    a = np.sin(np.linspace(0, 6, 40))[:, None]
+    assert dtw_distance(a, a) == 0
+    # a repeated bar costs nothing
+    assert dtw_distance(a, np.insert(a, 20, a[20], axis=0)) == 0
+    assert np.isnan(dtw_distance(a, a[:0]))
+
+
+def test_euclidean_common_bars():
+    profiles = {'a': pd.DataFrame({'measure': [1, 2, 3], 'repeated': 0, 'tempo': [0.0, 1.0, 2.0], 'deltaonset': 0.0}),
+                'b': pd.DataFrame({'measure': [2, 3, 4], 'repeated': 0, 'tempo': [1.0, 4.0, 9.0], 'deltaonset': 1.0}),
+                'c': pd.DataFrame({'measure': [5], 'repeated': 0, 'tempo': [0.0], 'deltaonset': 0.0})}
+    distances = euclidean_distances(profiles)
+    # bars 2 and 3: squared differences (0 + 1) and (4 + 1)
+    assert distances[0, 1] == distances[1, 0] == pytest.approx(np.sqrt(3))
+    assert np.isnan(distances[0, 2]) and distances[2, 2] == 0
+
+
+def test_clustering():
+    distances, tree = performers_clustering((1,), method='euclidean')
+    assert list(distances.index) == PERFORMERS
+    assert np.allclose(distances, distances.T, equal_nan=True)
+    assert tree.shape == (len(PERFORMERS) - 1, 4)
+    # merge heights non decreasing with average linkage
+    assert (np.diff(tree[:, 2]) >= -1e-12).all()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""
+Metrical power spectra of synthetic performances with known periodicities
+"""
+
+from fractions import Fraction
+import numpy as np
+import pandas as pd
+import pytest
+from src.spectral import metrical_windows, power_spectra, metrical_periods, dominant_periodicities
+
+
+def periodic_events(performer: str, period: float, n_quarters: int=200, step: float=0.25)->pd.DataFrame:
+    """Notes of a 3/4 movement (sixteenths by default), deltaonset periodic of period (quarters), deltaioi noise"""
+    quarters = np.arange(0, n_quarters, step)
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'performer': performer, 'fantasia': 1, 'movement': 1, 'movement_name': 'largo',
+                         'duration': step, 'voice': 'u', 'time_signature': '3/4',
+                         'deltaonset': np.cos(2 * np.pi * quarters / period),
+                         'deltaioi': rng.normal(0, 0.1, len(quarters))})
+
+
+def test_metrical_periods():
+    periods = metrical_periods(['3/4'])
+    assert {Fraction(1), Fraction(3), Fraction(1, 2), Fraction(1, 4), Fraction(6)} <= set(periods)
+    # not a frequency bin of 48 quarters windows
+    assert Fraction(5) not in periods
+    # compound meter: beats of a dotted quarter
+    assert Fraction(3, 2) in metrical_periods(['6/8'])
+
+
+def test_windows_grid():
+    events = periodic_events('a', 1)
+    windows, series = metrical_windows(events)
+    assert series.shape[1:] == (2, 48 * 12)
+    # half-overlapping windows of one movement
+    assert np.all(np.diff(windows['start']) == 24)
+    # on the grid points, normalised by the energy of the taper: power of the cosine
+    _, on_grid = metrical_windows(periodic_events('a', 3, step=1/12))
+    assert np.allclose((on_grid[:, 0]**2).sum(axis=-1), 0.5, rtol=0.02)
+    # rests skipped
+    rests = events.assign(voice=np.where(np.arange(len(events)) % 2, '.', 'u'))
+    assert len(metrical_windows(rests)[0]) == len(windows)
+
+
+@pytest.mark.parametrize("period", [1, 3, 0.5])
+def test_dominant_period(period):
+    events = pd.concat([periodic_events('a', period), periodic_events('b', 6)], ignore_index=True)
+    periods, spectra = power_spectra(events, by=('performer',))
+    assert periods[np.argmax(spectra[('a', 'deltaonset')])] == pytest.approx(period)
+    top = dominant_periodicities(events, k=1)
+    assert top.set_index(['performer', 'metric']).loc[('a', 'deltaonset'), 'period'] == pytest.approx(period)
+    assert top.set_index(['performer', 'metric']).loc[('b', 'deltaonset'), 'period'] == pytest.approx(6)
+    assert ((top['power'] > 0) & (top['power'] <= 1)).all()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+Score-aligned tensor of the performances of a fantasia against the events table
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.tensor import (performance_tensor, pairwise_differences, pairwise_matrix, consensus_performance,
+                        SCORE_EVENT_KEY, POSITION_DECIMALS)
+from src.events import corpus_events
+
+
+@pytest.fixture(scope='module')
+def tensor():
+    return performance_tensor(3, rest_filtered=True)
+
+
+def played(fantasia: int)->pd.DataFrame:
+    """Events without rests, first pass of each score event by performer"""
+    events = corpus_events(fantasias=(fantasia,))
+    events = events[events['voice'] != '.'].copy()
+    events['position'] = events['position'].round(POSITION_DECIMALS)
+    return events.drop_duplicates(['performer'] + SCORE_EVENT_KEY)
+
+
+def test_tensor_cells(tensor):
+    events = played(3)
+    index = pd.MultiIndex.from_frame(tensor.events[SCORE_EVENT_KEY])
+    assert index.is_unique
+    for i, performer in enumerate(tensor.performers):
+        mine = events[events['performer'] == performer]
+        columns = index.get_indexer(pd.MultiIndex.from_frame(mine[SCORE_EVENT_KEY]))
+        assert (columns >= 0).all() and tensor.mask[i].sum() == len(mine)
+        assert np.allclose(tensor.feature('deltaioi')[i, columns], mine['deltaioi'])
+        assert np.isnan(tensor.feature('ioi')[i, ~tensor.mask[i]]).all()
+
+
+def test_pairwise(tensor):
+    differences = pairwise_differences(tensor, 'deltaioi')
+    assert np.allclose(differences, -differences.transpose(1, 0, 2), equal_nan=True)
+    matrix = pairwise_matrix(tensor, 'deltaioi')
+    assert np.allclose(np.diag(matrix), 0)
+    x = tensor.feature('deltaioi')
+    common = tensor.mask[0] & tensor.mask[1]
+    assert matrix.iloc[0, 1] == pytest.approx(np.mean(np.abs(x[0, common] - x[1, common])))
+    assert np.allclose(matrix, matrix.T)
+
+
+def test_consensus(tensor):
+    consensus = consensus_performance(tensor)
+    expected = played(3).groupby(SCORE_EVENT_KEY)['deltaonset'].agg(['median', 'size'])
+    consensus = consensus.set_index(SCORE_EVENT_KEY).loc[expected.index]
+    assert np.allclose(consensus['deltaonset median'], expected['median'])
+    assert np.array_equal(consensus['performers'], expected['size'])
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+"""
+Voice streams, per-voice tempi and asynchronies of a hand-made interleaved performance
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.voices import beats_in_bar, voice_streams, voice_tempi, beat_asynchronies, asynchrony_results
+
+
+def interleaved(late: float=20.0, bars: int=2)->pd.DataFrame:
+    """2/4 bars of 1 s of eighths alternating lower and upper voices, the upper voice late by `late` ms,
+    a rest at the end of the performance"""
+    rows = []
+    for bar in range(bars):
+        for i, voice in enumerate(['b', 'u', 'b', 'u']):
+            shift = late if voice == 'u' else 0.0
+            rows.append({'performer': 'a', 'fantasia': 1, 'movement': 1, 'bar': bar + 1, 'measure': bar + 1,
+                         'repeated': 0, 'voice': voice, 'position': i / 4, 'time_signature': '2/4',
+                         'duration': 0.5, 'onset': 1000 * bar + 250 * i + shift,
+                         'deltaonset': shift / 1000, 'bar_ioi': 1000.0})
+    rows.append(dict(rows[-1], voice='.', position=0.9, onset=2000.0, deltaonset=0.0))
+    return pd.DataFrame(rows)
+
+
+def test_beats_in_bar():
+    signatures = pd.Series(['2/4', '3/4', '6/8', '3/8', '3/2', '6/4', '12/8'])
+    assert beats_in_bar(signatures).tolist() == [2, 3, 2, 1, 3, 2, 4]
+
+
+def test_streams():
+    streams = voice_streams(interleaved())
+    assert len(streams) == 8 and set(streams['stream']) == {'upper', 'lower'}
+    assert streams['quarters'].tolist() == [0.5 * i for i in range(8)]
+    assert streams['beat_group'].tolist() == [0, 0, 1, 1] * 2
+    assert np.allclose(streams['metronomic_onset'], 250 * np.arange(8))
+    upper = streams[streams['stream'] == 'upper']
+    assert upper['voice_ioi'].iloc[:-1].tolist() == [500.0] * 3 and np.isnan(upper['voice_ioi'].iloc[-1])
+    assert upper['voice_score_ioi'].iloc[0] == 1.0
+
+
+def test_tempi():
+    tempi = voice_tempi(voice_streams(interleaved())).set_index('stream')
+    assert tempi.loc['lower', 'ms_per_quarter'] == pytest.approx(500)
+    assert tempi.loc['upper', 'tempo'] == pytest.approx(120)
+    assert np.allclose(tempi['ratio'], 1)
+
+
+def test_asynchronies():
+    lags = beat_asynchronies(voice_streams(interleaved(late=20.0)))
+    assert len(lags) == 4
+    assert np.allclose(lags['lag'], 20) and np.allclose(lags['lag_ratio'], 0.02)
+    results = asynchrony_results(lags)
+    assert results['a']['all'] == results['a']['2/4'] == pytest.approx([0.02] * 4)
+    # no middle voice
+    assert len(beat_asynchronies(voice_streams(interleaved()), upper='middle')) == 0